@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Build all carbon-source media from a single specification.
+
+Every file in media/ is the same minimal base (base_medium.json) plus one
+carbon source taken up at CARBON_UPTAKE_RATE. This script regenerates the
+whole set in one pass from:
+  - base_medium.json                      (base nutrients and bounds)
+  - results/carbon_source_mapping.csv     (carbon source -> ModelSEED ID)
+  - Manual_review_media_cpds.csv          (manual corrections not yet applied)
+
+Every compound is validated against the ModelSEED template before anything
+is written, and the new set is compared against media/ to produce a diff
+report. Only files whose content changed are rewritten.
+
+Usage:
+    python build_media.py                      # validate, diff, write changes
+    python build_media.py --dry-run            # validate and diff only
+    python build_media.py --prune              # also delete stale media files
+    python build_media.py --no-validate        # skip template validation
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import load_template_json
+
+# Paths
+BASE_MEDIUM_FILE = Path('base_medium.json')
+MAPPING_FILE = Path('results/carbon_source_mapping.csv')
+MANUAL_REVIEW_FILE = Path('Manual_review_media_cpds.csv')
+TEMPLATE_PATH = Path('../references/build_metabolic_model/GramNegModelTemplateV6.json')
+MEDIA_DIR = Path('media')
+DIFF_REPORT_FILE = Path('results/media_diff_report.csv')
+
+# Carbon source uptake rate (negative = uptake)
+CARBON_UPTAKE_RATE = -5
+CARBON_UPPER_BOUND = 100
+
+UNMAPPED = 'UNMAPPED'
+
+
+def safe_media_filename(carbon_source):
+    """Media filename for a carbon source (same rule as notebook 01)"""
+    safe_filename = carbon_source.replace('/', '_').replace(' ', '_').replace(',', '')
+    safe_filename = safe_filename.replace('(', '').replace(')', '')
+    return f"{safe_filename}.json"
+
+
+def load_media_file(media_path):
+    """Load one media JSON as {cpd_id: [lower_bound, upper_bound]}"""
+    with open(media_path) as f:
+        return {cpd_id: list(bounds) for cpd_id, bounds in json.load(f).items()}
+
+
+def load_media_dir(media_dir=MEDIA_DIR):
+    """Load every media JSON in a directory, keyed by filename"""
+    return {path.name: load_media_file(path) for path in sorted(Path(media_dir).glob('*.json'))}
+
+
+def load_carbon_source_mapping(mapping_file=MAPPING_FILE, manual_review_file=MANUAL_REVIEW_FILE):
+    """
+    Load carbon source -> ModelSEED compound ID mapping.
+
+    A manual review row is only applied while the mapping still holds the
+    "Current (Wrong)" ID, so re-applying it to the corrected mapping table
+    written by notebook 01 is a no-op. A manual value of UNMAPPED removes
+    the carbon source. Unmapped sources are dropped.
+    """
+    mapping_df = pd.read_csv(mapping_file)
+    mapping = dict(zip(mapping_df['Carbon_Source_Original'], mapping_df['ModelSEED_ID']))
+
+    if manual_review_file is not None and Path(manual_review_file).exists():
+        manual_df = pd.read_csv(manual_review_file)
+        for _, row in manual_df.iterrows():
+            carbon_source = row['Carbon Source']
+            current_cpd = mapping.get(carbon_source)
+            if isinstance(current_cpd, str) and current_cpd.strip() == row['Current (Wrong)'].strip():
+                mapping[carbon_source] = row['Manual Review'].strip()
+
+    return {source: cpd_id for source, cpd_id in mapping.items()
+            if isinstance(cpd_id, str) and cpd_id != UNMAPPED}
+
+
+def load_template_compound_ids(template_path=TEMPLATE_PATH):
+    """Set of compound IDs (cpd#####) defined in a ModelSEED template"""
+    template = load_template_json(template_path)
+    return {compound['id'] for compound in template['compounds']}
+
+
+def validate_compounds(base_medium, mapping, template_compound_ids):
+    """Return a list of (source, cpd_id) pairs not found in the template"""
+    missing = []
+    for cpd_id in base_medium:
+        if cpd_id not in template_compound_ids:
+            missing.append(('base medium', cpd_id))
+    for carbon_source, cpd_id in mapping.items():
+        if cpd_id not in template_compound_ids:
+            missing.append((carbon_source, cpd_id))
+    return missing
+
+
+def build_media_set(base_medium, mapping, carbon_uptake_rate=CARBON_UPTAKE_RATE):
+    """
+    Build every carbon-source medium in memory.
+
+    Returns {media_filename: {cpd_id: [lower_bound, upper_bound]}} with the
+    base nutrients first and the carbon source last, matching media/.
+    """
+    media_set = {}
+    for carbon_source, cpd_id in mapping.items():
+        media_dict = {k: list(v) for k, v in base_medium.items()}
+        media_dict[cpd_id] = [carbon_uptake_rate, CARBON_UPPER_BOUND]
+        media_set[safe_media_filename(carbon_source)] = media_dict
+    return media_set
+
+
+def diff_media_sets(old_set, new_set):
+    """
+    Compare two media sets compound by compound.
+
+    Returns a list of dicts with columns media_filename, compound_id, change,
+    old_bounds, new_bounds. change is one of: new_file, removed_file,
+    added, removed, modified.
+    """
+    rows = []
+
+    for filename in sorted(set(old_set) | set(new_set)):
+        old_media = old_set.get(filename)
+        new_media = new_set.get(filename)
+
+        if old_media is None:
+            rows.append({'media_filename': filename, 'compound_id': '', 'change': 'new_file',
+                         'old_bounds': '', 'new_bounds': ''})
+            continue
+        if new_media is None:
+            rows.append({'media_filename': filename, 'compound_id': '', 'change': 'removed_file',
+                         'old_bounds': '', 'new_bounds': ''})
+            continue
+
+        for cpd_id in sorted(set(old_media) | set(new_media)):
+            old_bounds = old_media.get(cpd_id)
+            new_bounds = new_media.get(cpd_id)
+            if old_bounds == new_bounds:
+                continue
+            if old_bounds is None:
+                change = 'added'
+            elif new_bounds is None:
+                change = 'removed'
+            else:
+                change = 'modified'
+            rows.append({
+                'media_filename': filename,
+                'compound_id': cpd_id,
+                'change': change,
+                'old_bounds': '' if old_bounds is None else str(old_bounds),
+                'new_bounds': '' if new_bounds is None else str(new_bounds),
+            })
+
+    return rows
+
+
+def write_media_set(media_set, media_dir=MEDIA_DIR, filenames=None):
+    """Write media JSON files (only `filenames` if given)"""
+    media_dir = Path(media_dir)
+    media_dir.mkdir(parents=True, exist_ok=True)
+    for filename in (filenames if filenames is not None else media_set):
+        with open(media_dir / filename, 'w') as f:
+            json.dump(media_set[filename], f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build all carbon-source media from one specification')
+    parser.add_argument('--base', type=Path, default=BASE_MEDIUM_FILE, help='Base medium JSON')
+    parser.add_argument('--mapping', type=Path, default=MAPPING_FILE, help='Carbon source mapping CSV')
+    parser.add_argument('--manual-review', type=Path, default=MANUAL_REVIEW_FILE, help='Manual override CSV')
+    parser.add_argument('--template', type=Path, default=TEMPLATE_PATH, help='ModelSEED template JSON')
+    parser.add_argument('--media-dir', type=Path, default=MEDIA_DIR, help='Media output directory')
+    parser.add_argument('--report', type=Path, default=DIFF_REPORT_FILE, help='Diff report CSV')
+    parser.add_argument('--carbon-uptake', type=float, default=CARBON_UPTAKE_RATE,
+                        help='Carbon source lower bound (mmol/gDW/hr)')
+    parser.add_argument('--no-validate', action='store_true', help='Skip template validation')
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without writing')
+    parser.add_argument('--prune', action='store_true', help='Delete media files no longer generated')
+    args = parser.parse_args()
+
+    # Keep integer bounds as integers so regenerated files match the originals
+    carbon_uptake = float(args.carbon_uptake)
+    if carbon_uptake.is_integer():
+        carbon_uptake = int(carbon_uptake)
+
+    start_time = time.time()
+
+    base_medium = load_media_file(args.base)
+    mapping = load_carbon_source_mapping(args.mapping, args.manual_review)
+    print(f"Base medium: {len(base_medium)} compounds ({args.base})")
+    print(f"Mapped carbon sources: {len(mapping)}")
+
+    # Validate before building anything
+    if not args.no_validate:
+        if not args.template.exists():
+            print(f"ERROR: Template not found: {args.template}")
+            print("  Use --template to point at GramNegModelTemplateV6.json, or --no-validate")
+            sys.exit(1)
+        missing = validate_compounds(base_medium, mapping, load_template_compound_ids(args.template))
+        if missing:
+            print(f"ERROR: {len(missing)} compounds not found in template:")
+            for source, cpd_id in missing:
+                print(f"  - {cpd_id} ({source})")
+            sys.exit(1)
+        print(f"Template validation: all compounds found in {args.template.name}")
+
+    # Build the full set in memory and compare against what is on disk
+    media_set = build_media_set(base_medium, mapping, carbon_uptake)
+    existing_set = load_media_dir(args.media_dir)
+    diff_rows = diff_media_sets(existing_set, media_set)
+
+    changed_files = sorted({row['media_filename'] for row in diff_rows
+                            if row['change'] != 'removed_file'})
+    stale_files = sorted(row['media_filename'] for row in diff_rows
+                         if row['change'] == 'removed_file')
+
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(diff_rows, columns=['media_filename', 'compound_id', 'change',
+                                     'old_bounds', 'new_bounds']).to_csv(args.report, index=False)
+
+    if not args.dry_run:
+        write_media_set(media_set, args.media_dir, changed_files)
+        if args.prune:
+            for filename in stale_files:
+                (args.media_dir / filename).unlink()
+
+    elapsed = time.time() - start_time
+
+    print(f"\nMedia generated: {len(media_set)}")
+    print(f"  Changed or new files: {len(changed_files)}")
+    print(f"  Stale files (not generated): {len(stale_files)}" + (" - deleted" if args.prune and not args.dry_run else ""))
+    print(f"  Compound-level changes: {sum(1 for row in diff_rows if row['compound_id'])}")
+    print(f"  Diff report: {args.report}")
+    if args.dry_run:
+        print("  Dry run - no media files written")
+    print(f"Completed in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Cache of ATP correction results for build_models.py.
+
+MSATPCorrection tests every draft model against the 54 default ATP media and
+gap-fills the core network where ATP production is wrong. The result only
+depends on the draft network, the ATP media and the Core template, so it is
+stored per organism in results/atp_correction_cache/{orgId}.json:
+
+  - key:               SHA-256 over the draft network (reaction stoichiometry
+                       and bounds, not genes), the media definitions and the
+                       Core template/modelseedpy version
+  - added_reactions,
+    added_metabolites,
+    removed_reactions,
+    changed_bounds:    the difference ATP correction made to the model
+  - media:             per medium: ATP objective, minimum objective, whether
+                       it was selected, and the core gap-filling solution
+  - tests:             ATP tests returned by build_tests() (media, threshold)
+
+When the key matches, the stored difference is applied to the draft model and
+ATP correction is skipped entirely, e.g. when only the genome-scale
+gap-filling step changed.
+
+Usage:
+    python atp_correction_cache.py            # list cache entries
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import cobra
+
+CACHE_DIR = Path('results/atp_correction_cache')
+
+
+def network_sha256(model):
+    """SHA-256 of the reaction network (IDs, stoichiometry, bounds); genes are ignored"""
+    sha = hashlib.sha256()
+    for rxn in sorted(model.reactions, key=lambda r: r.id):
+        stoichiometry = sorted((met.id, coefficient) for met, coefficient in rxn.metabolites.items())
+        sha.update(repr((rxn.id, rxn.lower_bound, rxn.upper_bound, stoichiometry)).encode())
+    return sha.hexdigest()
+
+
+def media_sha256(atp_medias):
+    """SHA-256 of the ATP media definitions as (media, minimum objective) pairs"""
+    sha = hashlib.sha256()
+    for media, min_objective in atp_medias:
+        constraints = sorted((cpd, tuple(bounds)) for cpd, bounds in media.get_media_constraints().items())
+        sha.update(repr((media.id, min_objective, constraints)).encode())
+    return sha.hexdigest()
+
+
+def cache_key(model, atp_medias, core_template_sha256, library_version=''):
+    """Cache key for the ATP correction of `model` (call before correcting)"""
+    parts = [network_sha256(model), media_sha256(atp_medias), core_template_sha256, library_version]
+    return hashlib.sha256(':'.join(parts).encode()).hexdigest()
+
+
+def _reaction_to_dict(rxn):
+    return {
+        'id': rxn.id,
+        'name': rxn.name,
+        'metabolites': {met.id: coefficient for met, coefficient in rxn.metabolites.items()},
+        'lower_bound': rxn.lower_bound,
+        'upper_bound': rxn.upper_bound,
+        'gene_reaction_rule': rxn.gene_reaction_rule,
+        'subsystem': rxn.subsystem,
+    }
+
+
+def _metabolite_to_dict(met):
+    return {
+        'id': met.id,
+        'name': met.name,
+        'compartment': met.compartment,
+        'formula': met.formula,
+        'charge': met.charge,
+    }
+
+
+def snapshot_model(model):
+    """Reaction bounds and metabolite IDs, for diff_model() after correcting"""
+    return {
+        'bounds': {rxn.id: (rxn.lower_bound, rxn.upper_bound) for rxn in model.reactions},
+        'metabolites': {met.id for met in model.metabolites},
+    }
+
+
+def diff_model(snapshot, model):
+    """What changed in `model` since `snapshot` (JSON-serializable)"""
+    before = snapshot['bounds']
+    added = [rxn for rxn in model.reactions if rxn.id not in before]
+    return {
+        'added_reactions': [_reaction_to_dict(rxn) for rxn in added],
+        'added_metabolites': [_metabolite_to_dict(met) for met in model.metabolites
+                              if met.id not in snapshot['metabolites']],
+        'removed_reactions': [rxn_id for rxn_id in before if rxn_id not in model.reactions],
+        'changed_bounds': {rxn.id: [rxn.lower_bound, rxn.upper_bound] for rxn in model.reactions
+                           if rxn.id in before and before[rxn.id] != (rxn.lower_bound, rxn.upper_bound)},
+    }
+
+
+def apply_model_diff(model, diff):
+    """Replay a diff_model() result on a fresh draft model"""
+    new_metabolites = [cobra.Metabolite(m['id'], formula=m['formula'], name=m['name'],
+                                        charge=m['charge'], compartment=m['compartment'])
+                       for m in diff['added_metabolites'] if m['id'] not in model.metabolites]
+    model.add_metabolites(new_metabolites)
+
+    reactions = []
+    for r in diff['added_reactions']:
+        rxn = cobra.Reaction(r['id'], name=r['name'], subsystem=r['subsystem'],
+                             lower_bound=r['lower_bound'], upper_bound=r['upper_bound'])
+        reactions.append((rxn, r))
+    model.add_reactions([rxn for rxn, _ in reactions])
+    for rxn, r in reactions:
+        rxn.add_metabolites({model.metabolites.get_by_id(met_id): coefficient
+                             for met_id, coefficient in r['metabolites'].items()})
+        rxn.gene_reaction_rule = r['gene_reaction_rule']
+
+    model.remove_reactions([model.reactions.get_by_id(rxn_id) for rxn_id in diff['removed_reactions']
+                            if rxn_id in model.reactions])
+    for rxn_id, (lb, ub) in diff['changed_bounds'].items():
+        model.reactions.get_by_id(rxn_id).bounds = (lb, ub)
+
+
+def media_summary(atp_correction, evaluation):
+    """Per-medium ATP outcome from an MSATPCorrection after determine_growth_media()"""
+    stats = getattr(atp_correction, 'media_gapfill_stats', {}) or {}
+    selected = {media.id for media in getattr(atp_correction, 'selected_media', []) or []}
+    summary = []
+    for media, min_objective in atp_correction.atp_medias:
+        solution = stats.get(media) or {}
+        summary.append({
+            'media_id': media.id,
+            'min_objective': min_objective,
+            'atp_objective': evaluation.get(media.id),
+            'selected': media.id in selected,
+            'gapfill_new': solution.get('new', {}) if isinstance(solution, dict) else {},
+            'gapfill_reversed': solution.get('reversed', {}) if isinstance(solution, dict) else {},
+        })
+    return summary
+
+
+def tests_summary(tests):
+    """JSON-serializable form of MSATPCorrection.build_tests()"""
+    return [{
+        'media_id': test['media'].id,
+        'threshold': test.get('threshold'),
+        'is_max_threshold': test.get('is_max_threshold'),
+        'objective': test.get('objective'),
+    } for test in tests or []]
+
+
+def cache_file(organism_id):
+    return CACHE_DIR / f"{organism_id}.json"
+
+
+def load_cached(organism_id, key):
+    """Cache entry for an organism if it was computed with the same key, else None"""
+    path = cache_file(organism_id)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        entry = json.load(f)
+    return entry if entry.get('key') == key else None
+
+
+def save_cached(organism_id, entry):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(cache_file(organism_id), 'w') as f:
+        json.dump(entry, f, indent=1, default=str)
+
+
+def main():
+    entries = sorted(CACHE_DIR.glob('*.json')) if CACHE_DIR.exists() else []
+    print(f"ATP correction cache: {CACHE_DIR} ({len(entries)} organisms)")
+    for path in entries:
+        with open(path) as f:
+            entry = json.load(f)
+        selected = sum(1 for m in entry.get('media', []) if m['selected'])
+        print(f"  {path.stem}: +{len(entry['added_reactions'])} reactions, "
+              f"-{len(entry['removed_reactions'])} removed, {len(entry['changed_bounds'])} bounds changed, "
+              f"{selected}/{len(entry.get('media', []))} media selected "
+              f"({entry.get('elapsed_seconds', 0):.0f} s, {time.strftime('%Y-%m-%d', time.localtime(path.stat().st_mtime))})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Build the locus index linking model GPR genes to Fitness Browser loci.
+
+Model gene IDs come from the protein FASTA headers used for RAST annotation:
+
+    >ANA3:7022746 Shewana3_0001 16S rRNA methyltransferase GidB (RefSeq)
+     orgId:locusId sysName      description
+
+so every model gene is `{orgId}:{locusId}` with the feba.db Gene.locusId.
+This script reads all headers once and writes one table with a row per
+protein-coding locus:
+
+    results/locus_index.csv.gz
+        orgId, locusId, gene_id (model gene ID), sysName,
+        in_draft, in_gapfilled (gene appears in that model's GPRs),
+        n_reactions_draft, n_reactions_gapfilled, in_feba (only with --db)
+
+Descriptions are left in the FASTA files / Gene table to keep the index small.
+With --db, loci are checked against feba.db Gene and sysName is taken from
+there. LocusIndex loads the table and joins DataFrames in either direction
+with merges on (orgId, locusId) / gene_id / (orgId, sysName).
+
+Usage:
+    python build_locus_index.py
+    python build_locus_index.py --db ../data/source/feba.db
+
+From other scripts:
+    sys.path.insert(0, '../CDMSCI-198-build-models')
+    from build_locus_index import LocusIndex
+    index = LocusIndex()
+    fitness = index.add_model_genes(fitness)            # orgId, locusId -> gene_id
+    knockouts = index.add_loci(knockouts)               # gene_id -> orgId, locusId, sysName
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import time
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+
+# Resolved from this file so LocusIndex can be imported from other stages
+STAGE_DIR = Path(__file__).resolve().parent
+FASTA_DIR = STAGE_DIR.parent / 'data' / 'raw' / 'protein_sequences'
+MODELS_DIR = STAGE_DIR / 'models'
+INDEX_FILE = STAGE_DIR / 'results' / 'locus_index.csv.gz'
+VARIANTS = ['draft', 'gapfilled']
+
+_GENE_TOKEN = re.compile(r'[^\s()]+')
+
+
+def read_fasta_headers(fasta_file):
+    """(orgId, locusId, sysName) for every header of a protein FASTA"""
+    rows = []
+    with open(fasta_file) as f:
+        for line in f:
+            if not line.startswith('>'):
+                continue
+            fields = line[1:].split(maxsplit=2)
+            org_id, locus_id = fields[0].split(':', 1)
+            rows.append((org_id, locus_id, fields[1] if len(fields) > 1 else ''))
+    return rows
+
+
+def model_gene_reaction_counts(model_path):
+    """{gene_id: number of reactions whose GPR mentions it}"""
+    with open(model_path) as f:
+        reactions = json.load(f)['reactions']
+    counts = Counter()
+    for rxn in reactions:
+        genes = {token for token in _GENE_TOKEN.findall(rxn.get('gene_reaction_rule', ''))
+                 if token.lower() not in ('and', 'or')}
+        counts.update(genes)
+    return counts
+
+
+def load_feba_genes(db_path):
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return pd.read_sql_query("SELECT orgId, locusId, sysName FROM Gene", conn)
+    finally:
+        conn.close()
+
+
+def build_index(fasta_dir=FASTA_DIR, models_dir=MODELS_DIR, db_path=None):
+    """Locus index DataFrame plus the model genes that have no FASTA locus"""
+    rows = []
+    for fasta_file in sorted(Path(fasta_dir).glob('*_proteins.fasta')):
+        rows.extend(read_fasta_headers(fasta_file))
+    index = pd.DataFrame(rows, columns=['orgId', 'locusId', 'sysName'])
+    index.insert(2, 'gene_id', index['orgId'] + ':' + index['locusId'])
+
+    unmatched = []
+    known = set(index['gene_id'])
+    for variant in VARIANTS:
+        counts = {}
+        for model_path in sorted(Path(models_dir).glob(f'*_{variant}.json')):
+            model_counts = model_gene_reaction_counts(model_path)
+            counts.update(model_counts)
+            unmatched.extend((model_path.name, gene_id) for gene_id in model_counts if gene_id not in known)
+        n_reactions = index['gene_id'].map(counts).fillna(0).astype(int)
+        index[f'in_{variant}'] = n_reactions > 0
+        index[f'n_reactions_{variant}'] = n_reactions
+
+    if db_path:
+        feba = load_feba_genes(db_path)
+        index = index.merge(feba, on=['orgId', 'locusId'], how='left', suffixes=('', '_feba'), indicator=True)
+        index['in_feba'] = index.pop('_merge') == 'both'
+        index['sysName'] = index.pop('sysName_feba').fillna(index['sysName'])
+
+    return index, unmatched
+
+
+class LocusIndex:
+    """Vectorized joins between (orgId, locusId) and model gene IDs"""
+
+    def __init__(self, path=INDEX_FILE):
+        self.table = pd.read_csv(path, dtype={'orgId': 'category', 'locusId': str, 'sysName': str})
+
+    def add_model_genes(self, df, org_column='orgId', locus_column='locusId'):
+        """Add gene_id (and model membership columns) to rows keyed by orgId/locusId"""
+        columns = ['orgId', 'locusId', 'gene_id'] + [c for c in self.table.columns if c.startswith('in_')]
+        right = self.table[columns].rename(columns={'orgId': org_column, 'locusId': locus_column})
+        left = df.astype({org_column: str, locus_column: str})
+        return left.merge(right.astype({org_column: str}), on=[org_column, locus_column], how='left')
+
+    def add_loci(self, df, gene_column='gene_id'):
+        """Add orgId, locusId and sysName to rows keyed by model gene ID"""
+        right = self.table[['gene_id', 'orgId', 'locusId', 'sysName']].rename(columns={'gene_id': gene_column})
+        return df.merge(right.astype({'orgId': str}), on=gene_column, how='left')
+
+    def from_sysnames(self, org_id, sysnames):
+        """Rows of the index for these sysNames of one organism (input order, NaN where unknown)"""
+        table = self.table[self.table['orgId'] == org_id]
+        return pd.DataFrame({'sysName': list(sysnames)}).merge(table, on='sysName', how='left')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the model gene <-> feba.db locus index')
+    parser.add_argument('--db', help='feba.db to validate loci and take sysName from')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    index, unmatched = build_index(db_path=args.db)
+    INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+    index.to_csv(INDEX_FILE, index=False)
+
+    print(f"Loci: {len(index):,} in {index['orgId'].nunique()} organisms")
+    for variant in VARIANTS:
+        print(f"  in {variant} models: {index[f'in_{variant}'].sum():,}")
+    if 'in_feba' in index:
+        print(f"  in feba.db Gene: {index['in_feba'].sum():,}")
+    if unmatched:
+        print(f"WARNING: {len(unmatched)} model genes have no FASTA locus, e.g. {unmatched[:3]}")
+    print(f"Saved: {INDEX_FILE}")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Build and gap-fill models for all organisms in parallel.
+
+Scripted version of notebook 02 (same ModelSEEDpy protocol and outputs):
+  1. Build base model with GramNegModelTemplateV6 (MSBuilder)
+  2. Add ATPM and run ATP correction with Core-V5.2 (MSATPCorrection)
+  3. Gap-fill for biomass on pyruvate minimal media (MSGapfill)
+  4. Save models/{orgId}_draft.json and models/{orgId}_gapfilled.json
+
+The templates and the ATP correction media are loaded once in the parent
+process. Workers are forked from it (one fresh process per organism), so
+they share the templates copy-on-write instead of each re-parsing them.
+
+Per organism:
+  - results/build_logs/{orgId}.log          everything the build printed/logged
+  - results/build_logs/{orgId}.status.json  statistics, status and the hashes
+                                            of the genome and templates used
+
+ATP correction results are cached per organism (atp_correction_cache.py) and
+replayed when the draft network, ATP media and Core template are unchanged,
+so changes to the genome-scale gap-filling step skip ATP correction.
+
+On rerun, organisms whose status file reports success for the same genome
+and template hashes are skipped, so an interrupted run resumes where it
+stopped and a template update rebuilds everything. model_statistics.csv and
+gapfill_report.csv are regenerated from all status files at the end.
+
+Usage:
+    python build_models.py                         # 44 organisms with carbon source data
+    python build_models.py --workers 8 --timeout 1800
+    python build_models.py --organisms ANA3 Keio --force
+    python build_models.py --all-genomes           # every genome in results/genomes/
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import math
+import multiprocessing
+import pickle
+import signal
+import sys
+import time
+import traceback
+from pathlib import Path
+
+import pandas as pd
+from cobra.io import save_json_model
+
+import modelseedpy
+from modelseedpy import MSBuilder, MSMedia, MSGapfill, MSATPCorrection
+from modelseedpy.core.msmodel import get_reaction_constraints_from_direction
+from modelseedpy.core.msatpcorrection import load_default_medias
+
+from atp_correction_cache import (apply_model_diff, cache_key, diff_model, load_cached, media_summary, save_cached,
+                                  snapshot_model, tests_summary)
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import file_sha256, load_template
+
+# Paths
+GENOME_DIR = Path('results/genomes')
+CORE_TEMPLATE_PATH = Path('../references/build_metabolic_model/Core-V5.2.json')
+GRAMNEG_TEMPLATE_PATH = Path('../references/build_metabolic_model/GramNegModelTemplateV6.json')
+MODEL_DIR = Path('models')
+RESULTS_DIR = Path('results')
+LOG_DIR = RESULTS_DIR / 'build_logs'
+STATS_FILE = RESULTS_DIR / 'model_statistics.csv'
+GAPFILL_REPORT = RESULTS_DIR / 'gapfill_report.csv'
+FILTERED_MATRIX_FILE = Path('../CDMSCI-196-carbon-sources/results/combined_growth_matrix_filtered.csv')
+ORGANISM_METADATA_FILE = Path('../CDMSCI-196-carbon-sources/results/organism_metadata.csv')
+
+GROWTH_THRESHOLD = 0.001
+DEFAULT_TIMEOUT = 3600  # seconds per organism
+
+# Pyruvate minimal media (same as notebook 02)
+PYRUVATE_MEDIA_DICT = {
+    'cpd00020': (-5, 100),     # Pyruvate (carbon source)
+    'cpd00007': (-10, 100),    # O2
+    'cpd00001': (-100, 100),   # H2O
+    'cpd00009': (-100, 100),   # Phosphate
+    'cpd00013': (-100, 100),   # NH3 (nitrogen source)
+    'cpd00048': (-100, 100),   # Sulfate
+    'cpd00099': (-100, 100),   # Cl-
+    'cpd00067': (-100, 100),   # H+
+    'cpd00205': (-100, 100),   # K+
+    'cpd00254': (-100, 100),   # Mg2+
+    'cpd00971': (-100, 100),   # Na+
+    'cpd00149': (-100, 100),   # Co2+
+    'cpd00063': (-100, 100),   # Ca2+
+    'cpd00058': (-100, 100),   # Cu2+
+    'cpd00034': (-100, 100),   # Zn2+
+    'cpd00030': (-100, 100),   # Mn2+
+    'cpd10515': (-100, 100),   # Fe2+
+    'cpd10516': (-100, 100),   # Fe3+
+    'cpd11574': (-100, 100),   # Molybdate
+    'cpd00244': (-100, 100),   # Ni2+
+}
+
+# Shared state, set in the parent before the pool forks
+TEMPLATE_CORE = None
+TEMPLATE_GRAMNEG = None
+DEFAULT_MEDIAS = None
+PYRUVATE_MEDIA = None
+TEMPLATE_HASHES = None
+
+# ATP correction options (set from the command line before the pool forks)
+USE_ATP_CACHE = True
+
+
+def load_templates():
+    """Load both templates (built once, then from the template cache) and the ATP correction media"""
+    global TEMPLATE_CORE, TEMPLATE_GRAMNEG, DEFAULT_MEDIAS, PYRUVATE_MEDIA, TEMPLATE_HASHES
+
+    TEMPLATE_CORE = load_template(CORE_TEMPLATE_PATH)
+    TEMPLATE_GRAMNEG = load_template(GRAMNEG_TEMPLATE_PATH)
+
+    DEFAULT_MEDIAS = load_default_medias()
+    PYRUVATE_MEDIA = MSMedia.from_dict(PYRUVATE_MEDIA_DICT)
+    TEMPLATE_HASHES = {
+        'core_template_sha256': file_sha256(CORE_TEMPLATE_PATH),
+        'gramneg_template_sha256': file_sha256(GRAMNEG_TEMPLATE_PATH),
+    }
+
+
+def integrate_gapfill_solution(template_gramneg, model, gapfill_result):
+    """
+    Integrate gapfill solution by adding reactions from template to model.
+    Returns (added reactions, added exchanges).
+    """
+    gap_sol = {}
+    for rxn_id, direction in gapfill_result.get('new', {}).items():
+        # Skip exchange reactions (EX_*) - they'll be added automatically
+        if rxn_id.startswith('EX_'):
+            continue
+        # Gapfill returns rxn#####_c0, template reactions are rxn#####_c
+        template_rxn_id = rxn_id[:-1] if rxn_id.endswith('0') else rxn_id
+        if template_rxn_id in template_gramneg.reactions:
+            gap_sol[template_rxn_id] = get_reaction_constraints_from_direction(direction)
+
+    added_reactions = []
+    for rxn_id, (lb, ub) in gap_sol.items():
+        model_reaction = template_gramneg.reactions.get_by_id(rxn_id).to_reaction(model)
+        model_reaction.lower_bound = lb
+        model_reaction.upper_bound = ub
+        added_reactions.append(model_reaction)
+
+    model.add_reactions(added_reactions)
+    add_exchanges = MSBuilder.add_exchanges_to_model(model)
+
+    return added_reactions, add_exchanges
+
+
+def apply_media_to_model(media, model, prefix='EX_'):
+    """Medium dict for model.medium from an MSMedia"""
+    medium = {}
+    for cpd, (lb, ub) in media.get_media_constraints().items():
+        rxn_exchange = f'{prefix}{cpd}'
+        if rxn_exchange in model.reactions:
+            medium[rxn_exchange] = math.fabs(lb)
+    return medium
+
+
+def run_atp_correction(model_base, organism_id):
+    """ATP correction with Core-V5.2, replayed from the cache if the draft is unchanged"""
+    key = cache_key(model_base, DEFAULT_MEDIAS, TEMPLATE_HASHES['core_template_sha256'],
+                    getattr(modelseedpy, '__version__', ''))
+    cached = load_cached(organism_id, key) if USE_ATP_CACHE else None
+    if cached is not None:
+        apply_model_diff(model_base, cached)
+        print(f"ATP correction replayed from cache: +{len(cached['added_reactions'])} reactions, "
+              f"{len(cached['changed_bounds'])} bounds changed")
+        return
+
+    print("ATP correction with Core-V5.2...")
+    start_time = time.time()
+    snapshot = snapshot_model(model_base)
+    atp_correction = MSATPCorrection(
+        model_base,
+        TEMPLATE_CORE,
+        DEFAULT_MEDIAS,
+        compartment='c0',
+        atp_hydrolysis_id='ATPM_c0',
+        load_default_medias=False
+    )
+    evaluation = atp_correction.evaluate_growth_media()
+    atp_correction.determine_growth_media()
+    atp_correction.apply_growth_media_gapfilling()
+    atp_correction.expand_model_to_genome_scale()
+    tests = atp_correction.build_tests()
+
+    save_cached(organism_id, {
+        'key': key,
+        'organism_id': organism_id,
+        **diff_model(snapshot, model_base),
+        'media': media_summary(atp_correction, evaluation),
+        'tests': tests_summary(tests),
+        'elapsed_seconds': round(time.time() - start_time, 1),
+    })
+
+
+def build_organism_model(organism_id, genome_file):
+    """Notebook 02 protocol for one organism; returns the statistics dict"""
+    with open(genome_file, 'rb') as f:
+        genome = pickle.load(f)
+    print(f"Loaded genome: {len(genome.features)} features")
+
+    builder = MSBuilder(genome, TEMPLATE_GRAMNEG, organism_id)
+    model_base = builder.build_base_model(organism_id, annotate_with_rast=False)
+    builder.add_atpm(model_base)
+
+    draft_reactions_before_atp = len(model_base.reactions)
+    draft_metabolites = len(model_base.metabolites)
+    draft_genes = len(model_base.genes)
+
+    run_atp_correction(model_base, organism_id)
+
+    draft_reactions = len(model_base.reactions)
+    atp_reactions_added = draft_reactions - draft_reactions_before_atp
+    print(f"Reactions after ATP correction: {draft_reactions} (+{atp_reactions_added})")
+
+    model_base.medium = apply_media_to_model(PYRUVATE_MEDIA, model_base)
+    model_base.objective = 'bio1'
+    draft_growth = model_base.optimize().objective_value
+    print(f"Draft model growth: {draft_growth:.4f}")
+
+    save_json_model(model_base, str(MODEL_DIR / f"{organism_id}_draft.json"))
+
+    num_gapfilled = 0
+    gapfilled_growth = draft_growth
+    model_gapfilled = model_base.copy()
+
+    if draft_growth < GROWTH_THRESHOLD:
+        print("Gap-filling...")
+        gapfiller = MSGapfill(model_base, default_gapfill_templates=[TEMPLATE_GRAMNEG], default_target='bio1')
+        gapfill_result = gapfiller.run_gapfilling(PYRUVATE_MEDIA)
+        num_gapfilled = len(gapfill_result.get('new', {}))
+        print(f"Found {num_gapfilled} reactions to add")
+
+        if num_gapfilled > 0:
+            added_rxns, added_exch = integrate_gapfill_solution(TEMPLATE_GRAMNEG, model_gapfilled, gapfill_result)
+            print(f"Integrated {len(added_rxns)} reactions, {len(added_exch)} exchanges")
+            model_gapfilled.medium = apply_media_to_model(PYRUVATE_MEDIA, model_gapfilled)
+            model_gapfilled.objective = 'bio1'
+            gapfilled_growth = model_gapfilled.optimize().objective_value
+            print(f"Gap-filled growth: {gapfilled_growth:.4f}")
+        else:
+            print("No gapfill solution found")
+    else:
+        print("No gap-filling needed (draft grows)")
+
+    save_json_model(model_gapfilled, str(MODEL_DIR / f"{organism_id}_gapfilled.json"))
+
+    return {
+        'Organism_ID': organism_id,
+        'Draft_Reactions': draft_reactions,
+        'Draft_Metabolites': draft_metabolites,
+        'Draft_Genes': draft_genes,
+        'Draft_Growth': draft_growth,
+        'ATP_Reactions_Added': atp_reactions_added,
+        'Gapfilled_Reactions_Added': num_gapfilled,
+        'Gapfilled_Growth': gapfilled_growth,
+        'Status': 'Success',
+    }
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError('build timed out')
+
+
+@contextlib.contextmanager
+def _root_logging_to(stream):
+    """
+    Send root logging to stream, then restore the previous handlers.
+
+    With --workers 1 builds run in the parent; logging.basicConfig(force=True)
+    would leave the root logger writing to the closed organism log.
+    """
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+    try:
+        yield
+    finally:
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        handler.close()
+
+
+def build_worker(task):
+    """
+    Pool entry point: build one organism with its output in a log file.
+
+    task is (organism_id, genome_file, genome_sha256, timeout).
+    The timeout is enforced with SIGALRM in the worker, so it interrupts the
+    build the next time control returns to Python.
+    """
+    organism_id, genome_file, genome_sha256, timeout = task
+    start_time = time.time()
+    log_path = LOG_DIR / f"{organism_id}.log"
+
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log), \
+            _root_logging_to(log):
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+        try:
+            stats = build_organism_model(organism_id, genome_file)
+        except Exception as e:
+            traceback.print_exc()
+            stats = {
+                'Organism_ID': organism_id,
+                'Draft_Reactions': 0,
+                'Draft_Metabolites': 0,
+                'Draft_Genes': 0,
+                'Draft_Growth': 0,
+                'Gapfilled_Reactions_Added': 0,
+                'Gapfilled_Growth': 0,
+                'Status': f'Failed: {str(e)[:50]}',
+            }
+        finally:
+            signal.alarm(0)
+
+    status = {
+        'stats': stats,
+        'genome_sha256': genome_sha256,
+        **TEMPLATE_HASHES,
+        'elapsed_seconds': round(time.time() - start_time, 1),
+    }
+    with open(LOG_DIR / f"{organism_id}.status.json", 'w') as f:
+        json.dump(status, f, indent=1)
+    return organism_id, status
+
+
+def load_status(organism_id):
+    """Status dict written by a previous build of this organism, or None"""
+    status_path = LOG_DIR / f"{organism_id}.status.json"
+    if not status_path.exists():
+        return None
+    with open(status_path) as f:
+        return json.load(f)
+
+
+def is_up_to_date(organism_id, genome_sha256):
+    """True if the last build succeeded with the same genome and templates"""
+    status = load_status(organism_id)
+    return (status is not None
+            and status['stats']['Status'] == 'Success'
+            and status.get('genome_sha256') == genome_sha256
+            and all(status.get(k) == v for k, v in TEMPLATE_HASHES.items())
+            and (MODEL_DIR / f"{organism_id}_draft.json").exists()
+            and (MODEL_DIR / f"{organism_id}_gapfilled.json").exists())
+
+
+def filtered_organism_ids():
+    """orgIds of the organisms with carbon source data (CDMSCI-196)"""
+    filtered_organism_names = pd.read_csv(FILTERED_MATRIX_FILE, index_col=0, nrows=0).columns.tolist()
+    metadata = pd.read_csv(ORGANISM_METADATA_FILE)
+    name_to_orgid = dict(zip(metadata['Species_Name'], metadata['orgId']))
+
+    org_ids = []
+    for name in filtered_organism_names:
+        if name in name_to_orgid:
+            org_ids.append(name_to_orgid[name])
+        else:
+            print(f"WARNING: Could not find orgId for '{name}'")
+    return org_ids
+
+
+def write_reports(organism_ids):
+    """Regenerate model_statistics.csv and gapfill_report.csv from the status files"""
+    model_stats = []
+    gapfill_results = []
+    for organism_id in organism_ids:
+        status = load_status(organism_id)
+        if status is None:
+            continue
+        stats = status['stats']
+        model_stats.append(stats)
+        if stats['Status'] == 'Success':
+            gapfill_results.append({
+                'Organism_ID': organism_id,
+                'Gap_Filling_Needed': stats['Draft_Growth'] < GROWTH_THRESHOLD,
+                'Reactions_Added': stats['Gapfilled_Reactions_Added'],
+                'Draft_Growth': stats['Draft_Growth'],
+                'ATP_Reactions_Added': stats['ATP_Reactions_Added'],
+                'Gapfilled_Growth': stats['Gapfilled_Growth'],
+            })
+
+    pd.DataFrame(model_stats).to_csv(STATS_FILE, index=False)
+    pd.DataFrame(gapfill_results).to_csv(GAPFILL_REPORT, index=False)
+    return model_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and gap-fill models for all organisms in parallel')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel workers (default: CPU count)')
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT,
+                        help=f'Seconds per organism before the build is aborted (default: {DEFAULT_TIMEOUT})')
+    parser.add_argument('--organisms', nargs='+', help='Only build these orgIds')
+    parser.add_argument('--all-genomes', action='store_true',
+                        help='Build every genome in results/genomes/, not only organisms with carbon source data')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the last build is up to date')
+    parser.add_argument('--no-atp-cache', action='store_true', help='Always rerun ATP correction')
+    args = parser.parse_args()
+
+    global USE_ATP_CACHE
+    USE_ATP_CACHE = not args.no_atp_cache
+
+    MODEL_DIR.mkdir(exist_ok=True)
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+    start_time = time.time()
+    print("Loading ModelSEED templates...")
+    load_templates()
+    print(f"  Core-V5.2: {len(TEMPLATE_CORE.reactions):,} reactions")
+    print(f"  GramNegModelTemplateV6: {len(TEMPLATE_GRAMNEG.reactions):,} reactions")
+    print(f"  ATP correction medias: {len(DEFAULT_MEDIAS)}")
+    print(f"  Loaded in {time.time() - start_time:.1f} s")
+
+    genome_files = {gf.stem.replace('_genome', ''): gf for gf in sorted(GENOME_DIR.glob('*_genome.pkl'))}
+    if args.organisms:
+        organism_ids = args.organisms
+    elif args.all_genomes:
+        organism_ids = list(genome_files)
+    else:
+        organism_ids = filtered_organism_ids()
+
+    missing = [org_id for org_id in organism_ids if org_id not in genome_files]
+    for org_id in missing:
+        print(f"WARNING: Genome not found for {org_id}")
+    organism_ids = [org_id for org_id in organism_ids if org_id in genome_files]
+
+    genome_hashes = {org_id: file_sha256(genome_files[org_id]) for org_id in organism_ids}
+    to_build = [org_id for org_id in organism_ids
+                if args.force or not is_up_to_date(org_id, genome_hashes[org_id])]
+
+    print(f"\nOrganisms: {len(organism_ids)}")
+    print(f"  Up to date (skipped): {len(organism_ids) - len(to_build)}")
+    print(f"  To build: {len(to_build)}")
+    print(f"  Logs: {LOG_DIR}/")
+    print()
+
+    # Fork so workers inherit the templates; maxtasksperchild=1 gives every
+    # organism a fresh fork of the parent, so memory does not build up.
+    # With --workers 1 organisms are built in this process instead, which
+    # lets the ATP media tests use their own worker processes.
+    tasks = [(org_id, genome_files[org_id], genome_hashes[org_id], args.timeout) for org_id in to_build]
+    with contextlib.ExitStack() as stack:
+        if args.workers == 1:
+            statuses = map(build_worker, tasks)
+        else:
+            pool = stack.enter_context(multiprocessing.get_context('fork').Pool(processes=args.workers,
+                                                                                maxtasksperchild=1))
+            statuses = pool.imap_unordered(build_worker, tasks)
+        for i, (org_id, status) in enumerate(statuses, 1):
+            stats = status['stats']
+            print(f"[{i}/{len(to_build)}] {org_id}: {stats['Status']} "
+                  f"(draft {stats['Draft_Growth']:.4f}, gap-filled {stats['Gapfilled_Growth']:.4f}, "
+                  f"{status['elapsed_seconds']:.0f} s)")
+
+    model_stats = write_reports(organism_ids)
+    failed = [s['Organism_ID'] for s in model_stats if s['Status'] != 'Success']
+
+    elapsed = time.time() - start_time
+    print(f"\nCompleted in {elapsed:.1f} seconds ({elapsed/60:.1f} minutes)")
+    print(f"  Successful: {len(model_stats) - len(failed)}")
+    print(f"  Failed: {len(failed)}" + (f" ({', '.join(failed)})" if failed else ""))
+    print(f"  Statistics: {STATS_FILE}")
+    print(f"  Gap-fill report: {GAPFILL_REPORT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Columnar store for the RAST-annotated genomes
+
+results/genomes/{orgId}_genome.pkl holds one pickled MSGenome per organism,
+so any question about annotations ("which genes carry role X?") means
+unpickling all 57 genomes (~1 s each). This module copies them once into
+results/genome_store.sqlite, one partition (organism_id) per genome:
+
+    organisms       organism_id, source_file, source_sha256, n_features,
+                    n_annotated, imported_at
+    features        organism_id, feature_id, position, description, seq, aliases
+    ontology_terms  organism_id, feature_id, ontology, term   (e.g. RAST functions)
+    roles           organism_id, feature_id, role, search_role
+                    (functions split into single roles on " / ", " @ ", "; ";
+                     search_role is lowercase with non-alphanumerics removed)
+
+Re-importing only touches genomes whose pickle changed (SHA-256). Queries
+run directly on the tables; load_genome() rebuilds an MSGenome for one
+organism when a ModelSEEDpy object is needed.
+
+Usage from other scripts:
+    from genome_store import GenomeStore
+    store = GenomeStore()
+    hits = store.genes_with_role('Pyruvate kinase (EC 2.7.1.40)')
+    genome = store.load_genome('ANA3')
+
+Command line:
+    python genome_store.py --import                           # build / update the store
+    python genome_store.py --role "Pyruvate kinase (EC 2.7.1.40)"
+    python genome_store.py --search "pyruvate kinase"         # substring of the role
+    python genome_store.py --info
+"""
+
+import argparse
+import json
+import pickle
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import file_sha256
+
+GENOME_DIR = Path('results/genomes')
+STORE_PATH = Path('results/genome_store.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS organisms (
+    organism_id   TEXT PRIMARY KEY,
+    source_file   TEXT,
+    source_sha256 TEXT,
+    n_features    INTEGER,
+    n_annotated   INTEGER,
+    imported_at   TEXT
+);
+CREATE TABLE IF NOT EXISTS features (
+    organism_id TEXT NOT NULL,
+    feature_id  TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    description TEXT,
+    seq         TEXT,
+    aliases     TEXT,
+    PRIMARY KEY (organism_id, feature_id)
+);
+CREATE TABLE IF NOT EXISTS ontology_terms (
+    organism_id TEXT NOT NULL,
+    feature_id  TEXT NOT NULL,
+    ontology    TEXT NOT NULL,
+    term        TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS roles (
+    organism_id TEXT NOT NULL,
+    feature_id  TEXT NOT NULL,
+    role        TEXT NOT NULL,
+    search_role TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_terms_feature ON ontology_terms (organism_id, feature_id);
+CREATE INDEX IF NOT EXISTS idx_roles_feature ON roles (organism_id, feature_id);
+CREATE INDEX IF NOT EXISTS idx_roles_search ON roles (search_role);
+"""
+
+ROLE_SEPARATORS = re.compile(r'\s+/\s+|\s+@\s+|;\s+')
+
+
+def split_roles(function):
+    """Single roles of a RAST function ("A / B", "A @ B" and "A; B" are multi-role)"""
+    # Trailing comments such as "# frameshift" are not part of the role
+    function = function.split(' # ')[0]
+    return [role.strip() for role in ROLE_SEPARATORS.split(function) if role.strip()]
+
+
+def normalize_role(role):
+    """Role search key: lowercase with non-alphanumeric characters removed"""
+    return re.sub(r'[\W_]+', '', role.lower())
+
+
+class _Record:
+    """Attribute holder for modelseedpy objects unpickled without modelseedpy"""
+
+    def __setstate__(self, state):
+        self.__dict__.update(state if isinstance(state, dict) else {'_state': state})
+
+
+class _GenomeUnpickler(pickle.Unpickler):
+    """Reads MSGenome pickles into _Record objects when modelseedpy is not installed"""
+
+    def find_class(self, module, name):
+        if module.startswith('modelseedpy'):
+            return type(name, (_Record,), {})
+        return super().find_class(module, name)
+
+
+def read_genome_pickle(genome_file):
+    """Unpickle an annotated genome; falls back to plain records without modelseedpy"""
+    with open(genome_file, 'rb') as f:
+        try:
+            return pickle.load(f)
+        except ModuleNotFoundError:
+            f.seek(0)
+            return _GenomeUnpickler(f).load()
+
+
+class GenomeStore:
+    """SQLite-backed genome annotations, one partition per organism"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # Import
+
+    def imported_hashes(self):
+        return dict(self.conn.execute("SELECT organism_id, source_sha256 FROM organisms"))
+
+    def delete_organism(self, organism_id):
+        for table in ['roles', 'ontology_terms', 'features', 'organisms']:
+            self.conn.execute(f"DELETE FROM {table} WHERE organism_id = ?", (organism_id,))
+
+    def import_genome(self, organism_id, genome, source_file=None, source_sha256=None):
+        """Replace the partition of `organism_id` with the features of `genome`"""
+        features, terms, roles = [], [], []
+        n_annotated = 0
+        for position, feature in enumerate(genome.features):
+            aliases = getattr(feature, 'aliases', None)
+            features.append((organism_id, feature.id, position, getattr(feature, 'description', None),
+                             str(feature.seq) if getattr(feature, 'seq', None) is not None else None,
+                             json.dumps(aliases) if aliases else None))
+            ontology_terms = getattr(feature, 'ontology_terms', None) or {}
+            n_annotated += bool(ontology_terms)
+            for ontology, values in ontology_terms.items():
+                for term in values:
+                    terms.append((organism_id, feature.id, ontology, term))
+                    if ontology == 'RAST':
+                        roles.extend((organism_id, feature.id, role, normalize_role(role))
+                                     for role in split_roles(term))
+
+        with self.conn:
+            self.delete_organism(organism_id)
+            self.conn.execute("INSERT INTO organisms VALUES (?, ?, ?, ?, ?, ?)",
+                              (organism_id, str(source_file) if source_file else None, source_sha256,
+                               len(features), n_annotated, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            self.conn.executemany("INSERT INTO features VALUES (?, ?, ?, ?, ?, ?)", features)
+            self.conn.executemany("INSERT INTO ontology_terms VALUES (?, ?, ?, ?)", terms)
+            self.conn.executemany("INSERT INTO roles VALUES (?, ?, ?, ?)", roles)
+        return len(features), n_annotated
+
+    def import_directory(self, genome_dir=GENOME_DIR, force=False):
+        """Import every {orgId}_genome.pkl that is new or changed; returns imported organism IDs"""
+        known = self.imported_hashes()
+        imported = []
+        for genome_file in sorted(Path(genome_dir).glob('*_genome.pkl')):
+            organism_id = genome_file.stem.replace('_genome', '')
+            sha256 = file_sha256(genome_file)
+            if not force and known.get(organism_id) == sha256:
+                continue
+            start_time = time.time()
+            genome = read_genome_pickle(genome_file)
+            n_features, n_annotated = self.import_genome(organism_id, genome, genome_file, sha256)
+            print(f"  {organism_id}: {n_features} features, {n_annotated} annotated "
+                  f"({time.time() - start_time:.1f} s)")
+            imported.append(organism_id)
+        return imported
+
+    # Queries
+
+    def organisms(self):
+        return pd.read_sql_query("SELECT * FROM organisms ORDER BY organism_id", self.conn)
+
+    def features(self, organism_id):
+        """Features of one organism (DataFrame, genome order), without rebuilding an MSGenome"""
+        return pd.read_sql_query("SELECT feature_id, description, seq, aliases FROM features "
+                                 "WHERE organism_id = ? ORDER BY position", self.conn, params=(organism_id,))
+
+    def genes_with_role(self, role, organisms=None):
+        """Genes whose RAST function includes `role` (matched on the normalized role)"""
+        return self._role_query("r.search_role = ?", [normalize_role(role)], organisms)
+
+    def search_roles(self, text, organisms=None):
+        """Genes with a role containing `text` (case-insensitive)"""
+        return self._role_query("r.search_role LIKE ?", [f"%{normalize_role(text)}%"], organisms)
+
+    def _role_query(self, condition, params, organisms):
+        query = ("SELECT r.organism_id, r.feature_id, r.role, f.description "
+                 "FROM roles r JOIN features f USING (organism_id, feature_id) "
+                 f"WHERE {condition}")
+        if organisms:
+            query += f" AND r.organism_id IN ({', '.join('?' * len(organisms))})"
+            params = params + list(organisms)
+        return pd.read_sql_query(query + " ORDER BY r.organism_id, f.position", self.conn, params=params)
+
+    def role_counts(self, organisms=None):
+        """Gene count per (role, organism) as a role x organism matrix"""
+        query = "SELECT role, organism_id, COUNT(DISTINCT feature_id) AS n_genes FROM roles"
+        params = []
+        if organisms:
+            query += f" WHERE organism_id IN ({', '.join('?' * len(organisms))})"
+            params = list(organisms)
+        counts = pd.read_sql_query(query + " GROUP BY role, organism_id", self.conn, params=params)
+        return counts.pivot(index='role', columns='organism_id', values='n_genes').fillna(0).astype(int)
+
+    # MSGenome reconstruction
+
+    def load_genome(self, organism_id):
+        """Rebuild the MSGenome of one organism (features, descriptions and ontology terms)"""
+        from modelseedpy import MSFeature, MSGenome
+
+        rows = self.conn.execute("SELECT feature_id, description, seq, aliases FROM features "
+                                 "WHERE organism_id = ? ORDER BY position", (organism_id,)).fetchall()
+        if not rows:
+            raise KeyError(f"Organism not in genome store: {organism_id}")
+
+        features = {}
+        for feature_id, description, seq, aliases in rows:
+            feature = MSFeature(feature_id, seq, description=description)
+            feature.aliases = json.loads(aliases) if aliases else feature.aliases
+            features[feature_id] = feature
+        for feature_id, ontology, term in self.conn.execute(
+                "SELECT feature_id, ontology, term FROM ontology_terms WHERE organism_id = ? ORDER BY rowid",
+                (organism_id,)):
+            features[feature_id].add_ontology_term(ontology, term)
+
+        genome = MSGenome()
+        genome.add_features(list(features.values()))
+        return genome
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar store for annotated genomes')
+    parser.add_argument('--import', dest='import_genomes', action='store_true',
+                        help=f'Import new or changed genomes from {GENOME_DIR}')
+    parser.add_argument('--force', action='store_true', help='Re-import every genome')
+    parser.add_argument('--role', help='Genes carrying this exact role, across all organisms')
+    parser.add_argument('--search', help='Genes with a role containing this text')
+    parser.add_argument('--organisms', nargs='+', help='Restrict queries to these organisms')
+    parser.add_argument('--output', help='Write query results to this CSV')
+    parser.add_argument('--info', action='store_true', help='List organisms in the store')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    store = GenomeStore()
+
+    if args.import_genomes:
+        print(f"Importing genomes from {GENOME_DIR} into {STORE_PATH}")
+        imported = store.import_directory(force=args.force)
+        print(f"Imported {len(imported)} genomes")
+
+    if args.role or args.search:
+        hits = store.genes_with_role(args.role, args.organisms) if args.role else \
+            store.search_roles(args.search, args.organisms)
+        print(f"\n{len(hits)} genes in {hits['organism_id'].nunique()} organisms")
+        if len(hits):
+            print(hits.groupby('organism_id').size().to_string())
+        if args.output:
+            hits.to_csv(args.output, index=False)
+            print(f"Saved: {args.output}")
+
+    if args.info or not (args.import_genomes or args.role or args.search):
+        organisms = store.organisms()
+        print(f"Genome store: {STORE_PATH} ({len(organisms)} organisms, "
+              f"{organisms['n_features'].sum():,} features)")
+        for _, row in organisms.iterrows():
+            print(f"  {row['organism_id']:<26} {row['n_features']:>6} features  {row['n_annotated']:>6} annotated")
+
+    store.close()
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
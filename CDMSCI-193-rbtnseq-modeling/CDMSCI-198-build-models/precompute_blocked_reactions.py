@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Precompute blocked reactions and dead-end metabolites for every model.
+
+For each model in models/ this stores a cache file next to it:
+    models/{orgId}_{variant}.blocked.json
+
+containing
+  - blocked_reactions:    reactions that carry no flux in flux variability
+                          analysis with every exchange opened (cobra
+                          find_blocked_reactions, open_exchanges=True)
+  - dead_end_metabolites: metabolites that can only be produced or only be
+                          consumed given reaction directions (topological)
+  - model_sha256:         hash of the model file the cache was computed from
+
+A reaction blocked with all exchanges open is blocked under every medium, so
+FBA runners can remove these reactions up front without changing any growth
+prediction. Gap-filling must NOT prune the draft this way: reactions added by
+gap-filling can unblock them.
+
+Caches whose model_sha256 still matches are skipped unless --force is given.
+
+Usage:
+    python precompute_blocked_reactions.py                    # draft + gapfilled
+    python precompute_blocked_reactions.py --variant draft
+    python precompute_blocked_reactions.py --workers 8 --force
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import file_sha256
+
+# Paths
+MODEL_DIR = Path('models')
+SUMMARY_FILE = Path('results/blocked_reactions_summary.csv')
+
+VARIANTS = ['draft', 'gapfilled']
+CACHE_SUFFIX = '.blocked.json'
+
+
+def blocked_cache_path(model_path):
+    """models/ANA3_draft.json -> models/ANA3_draft.blocked.json"""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + CACHE_SUFFIX)
+
+
+def load_blocked_cache(model_path):
+    """Return the cache dict for a model, or None if missing or stale"""
+    cache_path = blocked_cache_path(model_path)
+    if not cache_path.exists():
+        return None
+    with open(cache_path) as f:
+        cache = json.load(f)
+    if cache.get('model_sha256') != file_sha256(model_path):
+        return None
+    return cache
+
+
+def find_dead_end_metabolites(model_json):
+    """
+    Metabolites that cannot be both produced and consumed.
+
+    Works on the model JSON directly: for every reaction the direction(s) it
+    can run in follow from its bounds, and a metabolite is a dead end if no
+    reaction can produce it or no reaction can consume it.
+    """
+    produced = set()
+    consumed = set()
+
+    for rxn in model_json['reactions']:
+        forward = rxn.get('upper_bound', 0) > 0
+        reverse = rxn.get('lower_bound', 0) < 0
+        for met_id, coefficient in rxn['metabolites'].items():
+            if (coefficient > 0 and forward) or (coefficient < 0 and reverse):
+                produced.add(met_id)
+            if (coefficient < 0 and forward) or (coefficient > 0 and reverse):
+                consumed.add(met_id)
+
+    all_metabolites = [met['id'] for met in model_json['metabolites']]
+    return [met_id for met_id in all_metabolites
+            if met_id not in produced or met_id not in consumed]
+
+
+def precompute_model(model_path):
+    """Compute the blocked-reaction cache for one model and write it"""
+    import cobra
+    from cobra.flux_analysis import find_blocked_reactions
+
+    model_path = Path(model_path)
+    start_time = time.time()
+
+    with open(model_path) as f:
+        model_json = json.load(f)
+    dead_ends = find_dead_end_metabolites(model_json)
+
+    model = cobra.io.load_json_model(str(model_path))
+    # zero_cutoff defaults to the solver tolerance
+    blocked = find_blocked_reactions(model, open_exchanges=True, processes=1)
+
+    # Keep model order so the cache is stable across runs
+    blocked_set = set(blocked)
+    blocked_reactions = [rxn.id for rxn in model.reactions if rxn.id in blocked_set]
+
+    cache = {
+        'model_file': model_path.name,
+        'model_sha256': file_sha256(model_path),
+        'method': {
+            'blocked_reactions': 'cobra.flux_analysis.find_blocked_reactions(open_exchanges=True)',
+            'zero_cutoff': model.tolerance,
+            'dead_end_metabolites': 'topological (bounds-aware producibility/consumability)',
+        },
+        'n_reactions': len(model.reactions),
+        'n_metabolites': len(model.metabolites),
+        'blocked_reactions': blocked_reactions,
+        'dead_end_metabolites': dead_ends,
+        'elapsed_seconds': round(time.time() - start_time, 2),
+    }
+
+    with open(blocked_cache_path(model_path), 'w') as f:
+        json.dump(cache, f, indent=1)
+
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute blocked reactions and dead-end metabolites per model')
+    parser.add_argument('--variant', choices=VARIANTS, action='append',
+                        help='Model variant(s) to process (default: draft and gapfilled)')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel workers (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Recompute even if the cache is up to date')
+    args = parser.parse_args()
+
+    variants = args.variant or VARIANTS
+
+    model_paths = []
+    for variant in variants:
+        model_paths.extend(sorted(MODEL_DIR.glob(f'*_{variant}.json')))
+
+    to_compute = [p for p in model_paths if args.force or load_blocked_cache(p) is None]
+    print(f"Models found: {len(model_paths)}")
+    print(f"  Up to date (skipped): {len(model_paths) - len(to_compute)}")
+    print(f"  To compute: {len(to_compute)}")
+    print()
+
+    start_time = time.time()
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(precompute_model, p): p for p in to_compute}
+        for i, future in enumerate(as_completed(futures), 1):
+            model_path = futures[future]
+            try:
+                cache = future.result()
+                print(f"[{i}/{len(to_compute)}] {model_path.name}: "
+                      f"{len(cache['blocked_reactions'])}/{cache['n_reactions']} blocked, "
+                      f"{len(cache['dead_end_metabolites'])} dead ends ({cache['elapsed_seconds']:.1f} s)")
+            except Exception as e:
+                print(f"[{i}/{len(to_compute)}] {model_path.name}: ERROR {e}")
+                failed.append(model_path.name)
+
+    # Summary over every model that has a valid cache
+    summary = []
+    for model_path in model_paths:
+        cache = load_blocked_cache(model_path)
+        if cache is None:
+            continue
+        org_id, variant = model_path.stem.rsplit('_', 1)
+        summary.append({
+            'Organism_ID': org_id,
+            'Variant': variant,
+            'Reactions': cache['n_reactions'],
+            'Blocked_Reactions': len(cache['blocked_reactions']),
+            'Blocked_Fraction': len(cache['blocked_reactions']) / cache['n_reactions'],
+            'Metabolites': cache['n_metabolites'],
+            'Dead_End_Metabolites': len(cache['dead_end_metabolites']),
+        })
+
+    summary_df = pd.DataFrame(summary)
+    SUMMARY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    summary_df.to_csv(SUMMARY_FILE, index=False)
+
+    elapsed = time.time() - start_time
+    print(f"\nCompleted in {elapsed:.1f} seconds ({elapsed/60:.1f} minutes)")
+    print(f"  Computed: {len(to_compute) - len(failed)}")
+    print(f"  Failed: {len(failed)}")
+    print(f"  Summary: {SUMMARY_FILE}")
+    if len(summary_df) > 0:
+        print(f"\nMean blocked fraction by variant:")
+        print(summary_df.groupby('Variant')['Blocked_Fraction'].mean().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Concurrent RAST annotation scheduler
+
+Scripted version of notebook 01. RastClient annotates one genome per call and
+each call takes hours, almost all of it waiting on the RAST service, so the
+notebook needs 114-228 hours for 57 genomes. This script keeps several
+genomes in flight at once (threads, since the work is network-bound) and
+records every job in a small SQLite database:
+
+    results/rast_jobs.sqlite   table jobs:
+        organism_id, fasta_file, state (pending/submitted/done/failed),
+        attempts, created_at, submitted_at, finished_at, elapsed_seconds,
+        n_features, n_annotated, error
+
+A job is saved as soon as its annotation returns, with the same outputs as
+the notebook:
+    results/genomes/{organism_id}_genome.pkl
+    results/fasta_annotated/{organism_id}_RAST.fasta
+    results/rast_annotation_log.txt
+
+Failed jobs are retried up to --max-attempts times with an increasing delay.
+On a rerun, jobs left 'submitted' by an interrupted run go back to 'pending'
+(RAST calls are synchronous, so there is nothing to reattach to), and jobs
+marked 'done' whose outputs are missing are annotated again.
+
+--fake replaces RAST with a local fake service (configurable latency and
+failure rate, placeholder roles) and writes to results/rast_fake/, so the
+scheduling, retry and resume logic can be exercised without network access.
+
+Usage:
+    python rast_scheduler.py                        # annotate all pending genomes, 4 at a time
+    python rast_scheduler.py --concurrency 8 --max-attempts 5
+    python rast_scheduler.py --organisms ANA3 Keio
+    python rast_scheduler.py --status               # print job table and exit
+    python rast_scheduler.py --retry-failed         # re-queue jobs that used up their attempts
+    python rast_scheduler.py --fake --fake-latency 0.5 --fake-failure-rate 0.2
+"""
+
+import argparse
+import hashlib
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+FASTA_DIR = Path('../data/raw/protein_sequences')
+RESULTS_DIR = Path('results')
+FAKE_RESULTS_DIR = Path('results/rast_fake')
+
+STATES = ('pending', 'submitted', 'done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    organism_id     TEXT PRIMARY KEY,
+    fasta_file      TEXT NOT NULL,
+    state           TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    created_at      TEXT,
+    submitted_at    TEXT,
+    finished_at     TEXT,
+    elapsed_seconds REAL,
+    n_features      INTEGER,
+    n_annotated     INTEGER,
+    error           TEXT
+)
+"""
+
+
+def now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def get_organism_id(fasta_filename):
+    """Extract organism ID from FASTA filename"""
+    return fasta_filename.replace('_proteins.fasta', '')
+
+
+class AnnotationLog:
+    """Timestamped log to console and rast_annotation_log.txt (thread-safe)"""
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.lock = threading.Lock()
+
+    def __call__(self, message):
+        log_msg = f"[{now()}] {message}"
+        with self.lock:
+            print(log_msg, flush=True)
+            with open(self.log_file, 'a') as f:
+                f.write(log_msg + '\n')
+
+
+class JobStore:
+    """Job state in SQLite; only used from the scheduler thread"""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def add_jobs(self, fasta_files):
+        """Insert a pending job for every FASTA file not yet in the table"""
+        rows = [(get_organism_id(p.name), str(p), now()) for p in fasta_files]
+        cursor = self.conn.executemany(
+            "INSERT OR IGNORE INTO jobs (organism_id, fasta_file, created_at) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+        return cursor.rowcount
+
+    def update(self, organism_id, **fields):
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        self.conn.execute(f"UPDATE jobs SET {assignments} WHERE organism_id = ?",
+                          [*fields.values(), organism_id])
+        self.conn.commit()
+
+    def jobs(self, state=None, organism_ids=None):
+        query = "SELECT * FROM jobs"
+        conditions, params = [], []
+        if state:
+            conditions.append("state = ?")
+            params.append(state)
+        if organism_ids:
+            conditions.append(f"organism_id IN ({', '.join('?' * len(organism_ids))})")
+            params.extend(organism_ids)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return [dict(row) for row in self.conn.execute(query + " ORDER BY organism_id", params)]
+
+    def counts(self):
+        rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(dict(rows.fetchall()))
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+# Annotation services
+
+class RastService:
+    """RAST annotation through modelseedpy's RastClient"""
+
+    def __init__(self):
+        from modelseedpy import RastClient
+        self.rast = RastClient()
+
+    def load_genome(self, fasta_file):
+        from modelseedpy import MSGenome
+        return MSGenome.from_fasta(str(fasta_file))
+
+    def annotate(self, genome):
+        self.rast.annotate_genome(genome)
+
+
+class FastaFeature:
+    """Protein feature with the attributes the scheduler reads from MSFeature"""
+
+    def __init__(self, feature_id, seq, description=''):
+        self.id = feature_id
+        self.seq = seq
+        self.description = description
+        self.ontology_terms = {}
+
+    def add_ontology_term(self, ontology, term):
+        self.ontology_terms.setdefault(ontology, []).append(term)
+
+
+class FastaGenome:
+    """Minimal genome read from a protein FASTA (fake mode only, no modelseedpy)"""
+
+    def __init__(self, features):
+        self.features = features
+
+    @classmethod
+    def from_fasta(cls, fasta_file):
+        features = []
+        header, seq = None, []
+        with open(fasta_file) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('>'):
+                    if header is not None:
+                        features.append(FastaFeature(header[0], ''.join(seq), header[1]))
+                    fields = line[1:].split(maxsplit=1)
+                    header, seq = (fields[0], fields[1] if len(fields) > 1 else ''), []
+                elif line:
+                    seq.append(line)
+        if header is not None:
+            features.append(FastaFeature(header[0], ''.join(seq), header[1]))
+        return cls(features)
+
+
+class FakeRastService:
+    """
+    Local stand-in for RAST.
+
+    Each annotate() call sleeps for `latency` seconds (+/- `jitter`), fails
+    with probability `failure_rate`, and otherwise assigns a placeholder role
+    to `annotated_fraction` of the features. Roles are derived from the
+    feature ID, so repeated runs give the same annotation.
+    """
+
+    def __init__(self, latency=1.0, jitter=0.5, failure_rate=0.0, annotated_fraction=0.8, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.annotated_fraction = annotated_fraction
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def load_genome(self, fasta_file):
+        try:
+            from modelseedpy import MSGenome
+        except ImportError:
+            return FastaGenome.from_fasta(fasta_file)
+        return MSGenome.from_fasta(str(fasta_file))
+
+    def annotate(self, genome):
+        with self.lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"fake RAST service error after {delay:.1f} s")
+        for feature in genome.features:
+            digest = int(hashlib.md5(feature.id.encode()).hexdigest()[:8], 16)
+            if digest % 1000 < self.annotated_fraction * 1000:
+                feature.add_ontology_term('RAST', f"Fake role {digest % 5000:04d}")
+
+
+# Outputs (same files as notebook 01)
+
+def genome_output_file(output_dir, organism_id):
+    return output_dir / 'genomes' / f"{organism_id}_genome.pkl"
+
+
+def fasta_output_file(output_dir, organism_id):
+    return output_dir / 'fasta_annotated' / f"{organism_id}_RAST.fasta"
+
+
+def outputs_exist(output_dir, organism_id):
+    return (genome_output_file(output_dir, organism_id).exists()
+            and fasta_output_file(output_dir, organism_id).exists())
+
+
+def _write_atomic(path, write, mode):
+    """Write through a temporary file so a crash never leaves a truncated output"""
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, mode) as f:
+        write(f)
+    tmp_path.replace(path)
+
+
+def save_genome(genome, output_dir, organism_id):
+    """Save annotated genome as pickle file"""
+    path = genome_output_file(output_dir, organism_id)
+    _write_atomic(path, lambda f: pickle.dump(genome, f), 'wb')
+    return path
+
+
+def save_genome_as_fasta(genome, output_dir, organism_id):
+    """Save annotated genome as FASTA file with functional annotations"""
+    def write(f):
+        for feature in genome.features:
+            header = f">{feature.id}"
+            if getattr(feature, 'ontology_terms', None):
+                roles = "; ".join(str(r) for r in list(feature.ontology_terms)[:3])
+                header += f" | {roles}"
+            else:
+                header += " | Hypothetical protein"
+            f.write(header + '\n')
+            f.write((str(feature.seq) if hasattr(feature, 'seq') else '') + '\n')
+
+    path = fasta_output_file(output_dir, organism_id)
+    _write_atomic(path, write, 'w')
+    return path
+
+
+def annotate_job(service, job, output_dir):
+    """Worker: load, annotate and save one genome; returns job statistics"""
+    start_time = time.time()
+    genome = service.load_genome(job['fasta_file'])
+    service.annotate(genome)
+    save_genome(genome, output_dir, job['organism_id'])
+    save_genome_as_fasta(genome, output_dir, job['organism_id'])
+    return {
+        'n_features': len(genome.features),
+        'n_annotated': sum(1 for f in genome.features if f.ontology_terms),
+        'elapsed_seconds': time.time() - start_time,
+    }
+
+
+# Scheduler
+
+def recover_jobs(store, output_dir, log):
+    """Reset jobs an interrupted run left 'submitted' and 'done' jobs with missing outputs"""
+    for job in store.jobs('submitted'):
+        store.update(job['organism_id'], state='pending', error='interrupted while submitted')
+        log(f"{job['organism_id']}: was submitted when the last run stopped, re-queued")
+    for job in store.jobs('done'):
+        if not outputs_exist(output_dir, job['organism_id']):
+            store.update(job['organism_id'], state='pending', attempts=0)
+            log(f"{job['organism_id']}: outputs missing, re-queued")
+    # Annotated by the notebook before the scheduler existed
+    for job in store.jobs('pending'):
+        if job['attempts'] == 0 and outputs_exist(output_dir, job['organism_id']):
+            store.update(job['organism_id'], state='done', finished_at=now(), error='outputs already present')
+
+
+def run_scheduler(store, service, pending, output_dir, log, concurrency=4, max_attempts=3, retry_delay=60.0):
+    """Annotate `pending` jobs with up to `concurrency` in flight, retrying failures"""
+    queue = [(0.0, job['organism_id']) for job in pending]  # (not before, organism_id)
+    jobs = {job['organism_id']: job for job in pending}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while queue or running:
+            current = time.time()
+            ready = [item for item in queue if item[0] <= current]
+            while ready and len(running) < concurrency:
+                item = ready.pop(0)
+                queue.remove(item)
+                organism_id = item[1]
+                job = jobs[organism_id]
+                job['attempts'] += 1
+                store.update(organism_id, state='submitted', attempts=job['attempts'],
+                             submitted_at=now(), error=None)
+                log(f"{organism_id}: submitted (attempt {job['attempts']}/{max_attempts})")
+                running[executor.submit(annotate_job, service, job, output_dir)] = organism_id
+
+            if not running:
+                time.sleep(max(0.0, min(t for t, _ in queue) - time.time()))
+                continue
+
+            timeout = None
+            if queue and len(running) < concurrency:
+                timeout = max(0.0, min(t for t, _ in queue) - time.time())
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                organism_id = running.pop(future)
+                job = jobs[organism_id]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    if job['attempts'] < max_attempts:
+                        delay = retry_delay * job['attempts']
+                        store.update(organism_id, state='pending', error=error)
+                        queue.append((time.time() + delay, organism_id))
+                        log(f"{organism_id}: attempt {job['attempts']} failed ({error}), retrying in {delay:.0f} s")
+                    else:
+                        store.update(organism_id, state='failed', finished_at=now(), error=error)
+                        log(f"{organism_id}: FAILED after {job['attempts']} attempts ({error})")
+                    continue
+
+                store.update(organism_id, state='done', finished_at=now(), error=None, **stats)
+                log(f"{organism_id}: done - {stats['n_annotated']}/{stats['n_features']} features annotated "
+                    f"({stats['elapsed_seconds']:.1f} s)")
+
+
+def print_status(store):
+    counts = store.counts()
+    print(f"Jobs: {sum(counts.values())} "
+          f"({', '.join(f'{counts[state]} {state}' for state in STATES)})")
+    print(f"\n{'Organism':<22} {'State':<10} {'Tries':>5} {'Annotated':>12} {'Finished':<20} Error")
+    for job in store.jobs():
+        annotated = f"{job['n_annotated']}/{job['n_features']}" if job['n_features'] else ''
+        print(f"{job['organism_id']:<22} {job['state']:<10} {job['attempts']:>5} {annotated:>12} "
+              f"{job['finished_at'] or '':<20} {job['error'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Annotate protein FASTA files with RAST, several genomes at a time')
+    parser.add_argument('--concurrency', type=int, default=4, help='Genomes annotated at the same time (default: 4)')
+    parser.add_argument('--max-attempts', type=int, default=3, help='Attempts per genome before it is marked failed')
+    parser.add_argument('--retry-delay', type=float, default=60.0,
+                        help='Seconds before a retry, multiplied by the attempt number (default: 60)')
+    parser.add_argument('--organisms', nargs='+', help='Only these organism IDs')
+    parser.add_argument('--status', action='store_true', help='Print the job table and exit')
+    parser.add_argument('--retry-failed', action='store_true', help='Re-queue failed jobs with fresh attempts')
+    parser.add_argument('--fake', action='store_true', help='Use the local fake annotation service')
+    parser.add_argument('--fake-latency', type=float, default=1.0, help='Fake service: seconds per genome')
+    parser.add_argument('--fake-failure-rate', type=float, default=0.0, help='Fake service: probability a call fails')
+    parser.add_argument('--seed', type=int, default=None, help='Fake service: random seed')
+    args = parser.parse_args()
+
+    output_dir = FAKE_RESULTS_DIR if args.fake else RESULTS_DIR
+    (output_dir / 'genomes').mkdir(parents=True, exist_ok=True)
+    (output_dir / 'fasta_annotated').mkdir(parents=True, exist_ok=True)
+
+    store = JobStore(output_dir / 'rast_jobs.sqlite')
+    if args.status:
+        print_status(store)
+        store.close()
+        return
+
+    log = AnnotationLog(output_dir / 'rast_annotation_log.txt')
+    start_time = time.time()
+
+    fasta_files = sorted(FASTA_DIR.glob('*_proteins.fasta'))
+    added = store.add_jobs(fasta_files)
+    if added:
+        print(f"Added {added} new jobs from {FASTA_DIR}")
+
+    recover_jobs(store, output_dir, log)
+    if args.retry_failed:
+        for job in store.jobs('failed', args.organisms):
+            store.update(job['organism_id'], state='pending', attempts=0)
+
+    pending = store.jobs('pending', args.organisms)
+    counts = store.counts()
+    print(f"Jobs: {counts['done']} done, {counts['failed']} failed, {len(pending)} to annotate")
+    if not pending:
+        store.close()
+        return
+
+    if args.fake:
+        service = FakeRastService(latency=args.fake_latency, jitter=args.fake_latency / 2,
+                                  failure_rate=args.fake_failure_rate, seed=args.seed)
+    else:
+        service = RastService()
+
+    log("=" * 80)
+    log(f"STARTING RAST ANNOTATION: {len(pending)} genomes, concurrency {args.concurrency}"
+        f"{' (fake service)' if args.fake else ''}")
+    log("=" * 80)
+    try:
+        run_scheduler(store, service, pending, output_dir, log, concurrency=args.concurrency,
+                      max_attempts=args.max_attempts, retry_delay=args.retry_delay)
+    except KeyboardInterrupt:
+        log("Interrupted - submitted jobs will be re-queued on the next run")
+        raise
+    finally:
+        counts = store.counts()
+        store.close()
+
+    log(f"Finished: {counts['done']} done, {counts['failed']} failed, {counts['pending']} pending")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
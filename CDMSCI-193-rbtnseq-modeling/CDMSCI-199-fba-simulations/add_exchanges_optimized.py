@@ -5,7 +5,6 @@ Uses direct JSON manipulation instead of COBRA save (which is very slow).
 """
 
 import pandas as pd
-import cobra
 import json
 from pathlib import Path
 import time
@@ -67,7 +66,7 @@ for i, org_id in enumerate(organisms_to_correct, 1):
     for idx, row in missing_for_org.iterrows():
         cpd_id = row['compound_id']
         cpd_name = row['compound_name']
-        exchange_rxn_id = exchange_reaction_ids[cpd_id]
+        exchange_rxn_id = exchange_reaction_ids.get(cpd_id, f'EX_{cpd_id}_e0')
 
         # Check if exchange already exists
         if any(rxn['id'] == exchange_rxn_id for rxn in model_json['reactions']):
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Audit exchange reactions in all models against every medium.
+
+Replaces the cobra-based loop in notebook 03 (section 2). Exchange reaction
+sets are read straight from the model JSON files in parallel (no cobra
+parsing), stacked into a boolean organism x compound presence matrix, and
+checked against every medium in CDMSCI-197-media-formulations/media/ at once.
+
+Outputs (results/):
+  - missing_exchanges_details.csv   - base-medium compounds (present in every
+                                      medium) without an exchange; same format
+                                      as notebook 03, consumed by
+                                      add_exchanges_optimized.py
+  - missing_exchanges_by_medium.csv - every organism x medium x compound whose
+                                      exchange is missing
+  - exchange_audit_matrix.csv       - organism x compound presence matrix for
+                                      all media compounds
+
+Usage:
+    python audit_exchange_reactions.py
+    python audit_exchange_reactions.py --variant draft
+    python audit_exchange_reactions.py --models-dir models_missing_exchanges --variant gapfilled_corrected
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Paths
+models_dir = Path('../CDMSCI-198-build-models/models')
+media_dir = Path('../CDMSCI-197-media-formulations/media')
+organism_metadata_file = Path('results/organism_metadata.csv')
+mapping_file = Path('../CDMSCI-197-media-formulations/results/carbon_source_mapping.csv')
+output_file = Path('results/missing_exchanges_details.csv')
+by_medium_file = Path('results/missing_exchanges_by_medium.csv')
+matrix_file = Path('results/exchange_audit_matrix.csv')
+
+EXCHANGE_PREFIX = 'EX_'
+EXTRACELLULAR = 'e0'
+
+
+def compound_id_from_metabolite(met_id):
+    """cpd00027_e0 -> cpd00027"""
+    return met_id.rsplit('_', 1)[0]
+
+
+def extract_exchange_compounds(model_path):
+    """
+    Read exchange compounds from a model JSON without building a cobra model.
+
+    Returns (compound_ids, compound_names) where compound_names maps each
+    extracellular compound to its name without the compartment suffix.
+    """
+    with open(model_path) as f:
+        model_json = json.load(f)
+
+    compound_ids = set()
+    for rxn in model_json['reactions']:
+        if rxn['id'].startswith(EXCHANGE_PREFIX):
+            compound_ids.update(compound_id_from_metabolite(met_id) for met_id in rxn['metabolites'])
+
+    compound_names = {}
+    for met in model_json['metabolites']:
+        if met.get('compartment') == EXTRACELLULAR:
+            name = met.get('name', '').replace(f' [{EXTRACELLULAR}]', '')
+            compound_names[compound_id_from_metabolite(met['id'])] = name
+
+    return compound_ids, compound_names
+
+
+def load_media(media_dir=media_dir):
+    """Load all media files as {media_filename: set of compounds with uptake allowed}"""
+    media = {}
+    for media_path in sorted(Path(media_dir).glob('*.json')):
+        with open(media_path) as f:
+            media_dict = json.load(f)
+        media[media_path.name] = {cpd_id for cpd_id, (lb, ub) in media_dict.items() if lb < 0}
+    return media
+
+
+def build_presence_matrix(exchange_sets, compound_ids):
+    """Boolean (organism x compound) matrix: True if the model has an exchange"""
+    cpd_index = {cpd_id: j for j, cpd_id in enumerate(compound_ids)}
+    presence = np.zeros((len(exchange_sets), len(compound_ids)), dtype=bool)
+    for i, exchanges in enumerate(exchange_sets):
+        cols = [cpd_index[cpd_id] for cpd_id in exchanges if cpd_id in cpd_index]
+        presence[i, cols] = True
+    return presence
+
+
+def build_requirement_matrix(media, compound_ids):
+    """Boolean (medium x compound) matrix: True if the medium supplies the compound"""
+    cpd_index = {cpd_id: j for j, cpd_id in enumerate(compound_ids)}
+    required = np.zeros((len(media), len(compound_ids)), dtype=bool)
+    for i, compounds in enumerate(media.values()):
+        required[i, [cpd_index[cpd_id] for cpd_id in compounds]] = True
+    return required
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Audit exchange reactions in all models against every medium')
+    parser.add_argument('--models-dir', type=Path, default=models_dir, help='Directory with model JSON files')
+    parser.add_argument('--variant', default='gapfilled',
+                        help='Model file suffix: {orgId}_{variant}.json (default: gapfilled)')
+    parser.add_argument('--media-dir', type=Path, default=media_dir, help='Directory with media JSON files')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel workers (default: CPU count)')
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    organism_metadata = pd.read_csv(organism_metadata_file)
+    orgid_to_name = dict(zip(organism_metadata['orgId'], organism_metadata['organism']))
+
+    # Models present for the organisms being simulated
+    model_paths = {}
+    for org_id in organism_metadata['orgId']:
+        model_path = args.models_dir / f"{org_id}_{args.variant}.json"
+        if model_path.exists():
+            model_paths[org_id] = model_path
+        else:
+            print(f"WARNING: Model not found for {org_id}: {model_path}")
+    org_ids = sorted(model_paths)
+
+    # Extract exchange sets from all models in parallel
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        extracted = list(executor.map(extract_exchange_compounds, [model_paths[org_id] for org_id in org_ids]))
+    exchange_sets = [compound_ids for compound_ids, _ in extracted]
+    print(f"Extracted exchange reactions from {len(org_ids)} models ({time.time() - start_time:.1f} s)")
+
+    # Compound names: model metabolites first, then the carbon source mapping
+    compound_names = {}
+    if mapping_file.exists():
+        mapping = pd.read_csv(mapping_file)
+        mapping = mapping[mapping['ModelSEED_ID'] != 'UNMAPPED']
+        compound_names.update(zip(mapping['ModelSEED_ID'], mapping['ModelSEED_Name']))
+    for _, names in extracted:
+        compound_names.update(names)
+
+    # Compound axis: every compound supplied by any medium, base compounds first
+    media = load_media(args.media_dir)
+    media_names = list(media)
+    base_compounds = set.intersection(*media.values()) if media else set()
+    compound_ids = sorted(base_compounds) + sorted(set().union(*media.values()) - base_compounds)
+    print(f"Media: {len(media_names)} ({len(base_compounds)} base compounds, {len(compound_ids)} compounds total)")
+
+    presence = build_presence_matrix(exchange_sets, compound_ids)      # organism x compound
+    required = build_requirement_matrix(media, compound_ids)          # medium x compound
+    missing = required[np.newaxis, :, :] & ~presence[:, np.newaxis, :]  # organism x medium x compound
+
+    # Base-medium details (notebook 03 format)
+    base_mask = np.isin(np.array(compound_ids), list(base_compounds))
+    org_idx, cpd_idx = np.nonzero(~presence & base_mask[np.newaxis, :])
+    details_df = pd.DataFrame({
+        'orgId': [org_ids[i] for i in org_idx],
+        'organism': [orgid_to_name[org_ids[i]] for i in org_idx],
+        'compound_id': [compound_ids[j] for j in cpd_idx],
+        'compound_name': [compound_names.get(compound_ids[j], compound_ids[j]) for j in cpd_idx],
+    })
+
+    # Every organism x medium x compound gap
+    org_idx, media_idx, cpd_idx = np.nonzero(missing)
+    by_medium_df = pd.DataFrame({
+        'orgId': [org_ids[i] for i in org_idx],
+        'organism': [orgid_to_name[org_ids[i]] for i in org_idx],
+        'media_filename': [media_names[m] for m in media_idx],
+        'compound_id': [compound_ids[j] for j in cpd_idx],
+        'compound_name': [compound_names.get(compound_ids[j], compound_ids[j]) for j in cpd_idx],
+        'is_base_compound': base_mask[cpd_idx],
+    })
+
+    matrix_df = pd.DataFrame(presence, columns=compound_ids)
+    matrix_df.insert(0, 'organism', [orgid_to_name[org_id] for org_id in org_ids])
+    matrix_df.insert(0, 'orgId', org_ids)
+
+    details_df.to_csv(output_file, index=False)
+    by_medium_df.to_csv(by_medium_file, index=False)
+    matrix_df.to_csv(matrix_file, index=False)
+
+    elapsed = time.time() - start_time
+
+    print(f"\nCompleted audit in {elapsed:.1f} seconds")
+    print(f"  Missing base-medium exchanges: {len(details_df)} ({details_df['orgId'].nunique()} organisms)")
+    print(f"  Organism x medium pairs with any missing exchange: {int(missing.any(axis=2).sum()):,}"
+          f" / {missing.shape[0] * missing.shape[1]:,}")
+    print(f"  Organism x medium pairs missing the carbon source exchange only: "
+          f"{int((missing.any(axis=2) & ~missing[:, :, base_mask].any(axis=2)).sum()):,}")
+    print(f"Saved: {output_file}")
+    print(f"Saved: {by_medium_file}")
+    print(f"Saved: {matrix_file}")
+
+    if len(details_df) > 0:
+        print("\nMissing base-medium exchanges by compound:")
+        summary = details_df.groupby(['compound_id', 'compound_name']).size().sort_values(ascending=False)
+        print(summary.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot paths of the FBA, gap-filling and exchange-correction scripts.
+
+Runs fully offline on synthetic ModelSEED-style models (synthetic_models.py)
+at fixed sizes, so results are comparable between machines and commits:
+
+  json_load        cobra.io.load_json_model             (both runners)
+  json_load_raw    json.load of the model file          (add_exchanges_optimized.py)
+  medium           cpd media -> EX_ bounds, model.medium (both runners)
+  fba              model.optimize()
+  fba_slim         model.slim_optimize()
+  sweep            load + medium + optimize for every model x medium
+  gapfill          cobra.flux_analysis.gapfill          (run_condition_specific_gapfilling.py)
+  json_save        cobra.io.save_json_model
+  json_save_raw    json.dump(indent=1)                  (add_exchanges_optimized.py)
+
+Each run is appended to benchmark_history.csv and compared with the previous
+run of the same benchmark and size.
+
+Usage:
+    python run_benchmarks.py                         # sizes 300 and 1500
+    python run_benchmarks.py --sizes 300 1500 5000 --repeats 10
+    python run_benchmarks.py --only fba medium
+    python run_benchmarks.py --no-history            # do not record this run
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cobra
+import pandas as pd
+from cobra.flux_analysis import gapfill
+
+from synthetic_models import make_gapfill_problem, make_media, make_synthetic_model
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from media_format import convert_media_to_model_format
+
+HISTORY_FILE = Path(__file__).resolve().parent / 'benchmark_history.csv'
+
+BENCHMARKS = ['json_load', 'json_load_raw', 'medium', 'fba', 'fba_slim',
+              'sweep', 'gapfill', 'json_save', 'json_save_raw']
+SWEEP_MODELS = 3
+
+# A benchmark this much slower than the previous run is flagged
+REGRESSION_RATIO = 1.2
+
+
+def time_calls(func, repeats):
+    """Run func() `repeats` times, return the list of durations in seconds"""
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def benchmark_size(n_reactions, benchmarks, repeats, workdir):
+    """Time the selected benchmarks for one model size; returns {name: durations}"""
+    model, _ = make_synthetic_model(n_reactions)
+    media = list(make_media().values())
+    model_path = workdir / f'synthetic_{n_reactions}.json'
+    cobra.io.save_json_model(model, str(model_path))
+    with open(model_path) as f:
+        model_json = json.load(f)
+
+    state = {'i': 0}
+
+    def apply_next_medium():
+        media_dict = media[state['i'] % len(media)]
+        state['i'] += 1
+        model.medium = convert_media_to_model_format(media_dict, model)[0]
+
+    def sweep():
+        for path in sweep_paths:
+            sweep_model = cobra.io.load_json_model(str(path))
+            for media_dict in media:
+                sweep_model.medium = convert_media_to_model_format(media_dict, sweep_model)[0]
+                sweep_model.optimize()
+
+    def run_gapfill():
+        draft, universal, media_dict = gapfill_problem
+        with draft:
+            draft.medium = convert_media_to_model_format(media_dict, draft)[0]
+            gapfill(draft, universal, demand_reactions=False)
+
+    def load_raw():
+        with open(model_path) as f:
+            return json.load(f)
+
+    def save_raw():
+        with open(workdir / 'raw_out.json', 'w') as f:
+            json.dump(model_json, f, indent=1)
+
+    if 'sweep' in benchmarks:
+        sweep_paths = []
+        for seed in range(SWEEP_MODELS):
+            path = workdir / f'sweep_{n_reactions}_{seed}.json'
+            cobra.io.save_json_model(make_synthetic_model(n_reactions, seed=seed, org_id=f'SYN{seed}')[0], str(path))
+            sweep_paths.append(path)
+    if 'gapfill' in benchmarks:
+        gapfill_problem = make_gapfill_problem(n_reactions)
+
+    model.medium = convert_media_to_model_format(media[0], model)[0]
+    calls = {
+        'json_load': lambda: cobra.io.load_json_model(str(model_path)),
+        'json_load_raw': load_raw,
+        'medium': apply_next_medium,
+        'fba': model.optimize,
+        'fba_slim': model.slim_optimize,
+        'sweep': sweep,
+        'gapfill': run_gapfill,
+        'json_save': lambda: cobra.io.save_json_model(model, str(workdir / 'cobra_out.json')),
+        'json_save_raw': save_raw,
+    }
+
+    results = {}
+    for name in benchmarks:
+        # The sweep and gap-filling are slow; a few repeats are enough
+        n = max(1, repeats // 5) if name in ('sweep', 'gapfill') else repeats
+        calls[name]()  # warm-up (imports, solver setup)
+        results[name] = time_calls(calls[name], n)
+    return results
+
+
+def git_commit():
+    """Short commit hash of the working tree, '' outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=Path(__file__).parent, check=True).stdout.strip()
+    except Exception:
+        return ''
+
+
+def compare_with_history(run_df, history_df):
+    """Add previous_median_s and ratio columns from the last earlier run of each benchmark"""
+    run_df = run_df.copy()
+    run_df['previous_median_s'] = float('nan')
+    if history_df is not None and len(history_df) > 0:
+        previous = (history_df.sort_values('run_id')
+                    .groupby(['benchmark', 'n_reactions']).tail(1)
+                    .set_index(['benchmark', 'n_reactions'])['median_s'])
+        keys = list(zip(run_df['benchmark'], run_df['n_reactions']))
+        run_df['previous_median_s'] = [previous.get(key, float('nan')) for key in keys]
+    run_df['ratio'] = run_df['median_s'] / run_df['previous_median_s']
+    return run_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark model loading, media, FBA and gap-filling hot paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 1500],
+                        help='Synthetic model sizes in reactions (default: 300 1500)')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed repeats per benchmark')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help='Run only these benchmarks')
+    parser.add_argument('--history', type=Path, default=HISTORY_FILE, help='History CSV')
+    parser.add_argument('--no-history', action='store_true', help='Do not append this run to the history')
+    args = parser.parse_args()
+
+    benchmarks = args.only or BENCHMARKS
+    run_id = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+    environment = {
+        'run_id': run_id,
+        'git_commit': git_commit(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'cobra': cobra.__version__,
+        'solver': cobra.Configuration().solver.__name__.split('.')[-1].replace('_interface', ''),
+    }
+    print(f"Benchmark run {run_id} (commit {environment['git_commit'] or 'unknown'}, "
+          f"cobra {environment['cobra']}, solver {environment['solver']})")
+
+    start_time = time.time()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_reactions in args.sizes:
+            print(f"  {n_reactions} reactions...")
+            results = benchmark_size(n_reactions, benchmarks, args.repeats, Path(tmp))
+            for name, durations in results.items():
+                rows.append({
+                    **environment,
+                    'benchmark': name,
+                    'n_reactions': n_reactions,
+                    'repeats': len(durations),
+                    'min_s': min(durations),
+                    'median_s': statistics.median(durations),
+                    'mean_s': statistics.mean(durations),
+                })
+
+    run_df = pd.DataFrame(rows)
+    history_df = pd.read_csv(args.history) if args.history.exists() else None
+    report = compare_with_history(run_df, history_df)
+
+    print()
+    print(report[['benchmark', 'n_reactions', 'repeats', 'min_s', 'median_s', 'previous_median_s', 'ratio']]
+          .to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+
+    regressions = report[report['ratio'] > REGRESSION_RATIO]
+    if len(regressions) > 0:
+        print(f"\nWARNING: {len(regressions)} benchmark(s) more than {REGRESSION_RATIO:.1f}x slower than the previous run:")
+        for _, row in regressions.iterrows():
+            print(f"  {row['benchmark']} ({row['n_reactions']} reactions): {row['ratio']:.2f}x")
+
+    if not args.no_history:
+        history_df = run_df if history_df is None else pd.concat([history_df, run_df], ignore_index=True)
+        history_df.to_csv(args.history, index=False)
+        print(f"\nHistory: {args.history} ({history_df['run_id'].nunique()} runs)")
+
+    print(f"Completed in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Synthetic ModelSEED-style models and media for benchmarking.
+
+Models look like the ones in ../CDMSCI-198-build-models/models/ as far as the
+runners are concerned: compounds cpd#####_c0/_e0, exchanges EX_cpd#####_e0,
+reactions rxn#####_c0, objective bio1 producing cpd11416_c0 with a sink,
+GPRs over orgId:locusId genes, and media in the {cpd_id: [lb, ub]} format
+of ../CDMSCI-197-media-formulations/media/.
+
+Network (generated deterministically from a seed):
+  - base medium compounds from base_medium.json with exchange + transport
+  - carbon sources, each a linear pathway into a central hub compound;
+    about a third of the pathways are broken so those media do not grow
+  - biomass precursors made from the hub (plus NH3 and phosphate)
+  - filler reactions up to the requested reaction count: 1:1 and 2:2
+    conversions between filler compounds, irreversible drains from pathway
+    intermediates into the filler pool, and a few demand reactions. Filler
+    never produces a pathway compound, so it adds LP size without changing
+    which media grow
+
+Usage:
+    python synthetic_models.py --reactions 1500 --output /tmp/synthetic.json
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+
+import cobra
+
+BASE_MEDIUM_FILE = Path(__file__).resolve().parents[2] / 'CDMSCI-197-media-formulations' / 'base_medium.json'
+
+CARBON_UPTAKE_RATE = -5
+CARBON_UPPER_BOUND = 100
+
+HUB = 'cpd70000'
+BIOMASS = 'cpd11416'
+NH3 = 'cpd00013'
+PHOSPHATE = 'cpd00009'
+
+
+def load_base_medium(base_medium_file=BASE_MEDIUM_FILE):
+    """Base medium as {cpd_id: [lb, ub]}"""
+    with open(base_medium_file) as f:
+        return json.load(f)
+
+
+class _Builder:
+    """Keeps ID counters while the synthetic model is assembled"""
+
+    def __init__(self, org_id, seed):
+        self.model = cobra.Model(f'{org_id}_synthetic')
+        self.org_id = org_id
+        self.rng = random.Random(seed)
+        self.next_rxn = 90000
+        self.next_gene = 1
+        self.metabolites = {}
+
+    def met(self, cpd_id, compartment='c0'):
+        met_id = f'{cpd_id}_{compartment}'
+        if met_id not in self.metabolites:
+            self.metabolites[met_id] = cobra.Metabolite(
+                met_id, name=f'{cpd_id} [{compartment}]', compartment=compartment)
+        return self.metabolites[met_id]
+
+    def gpr(self):
+        genes = [f'{self.org_id}:{self.next_gene + i}' for i in range(self.rng.randint(1, 3))]
+        self.next_gene += len(genes)
+        joiner = ' or ' if self.rng.random() < 0.7 else ' and '
+        return joiner.join(genes)
+
+    def reaction(self, stoichiometry, reversible=False, rxn_id=None):
+        if rxn_id is None:
+            rxn_id = f'rxn{self.next_rxn:05d}_c0'
+            self.next_rxn += 1
+        rxn = cobra.Reaction(rxn_id, name=rxn_id,
+                             lower_bound=-1000 if reversible else 0, upper_bound=1000)
+        rxn.add_metabolites(stoichiometry)
+        if not rxn_id.startswith(('EX_', 'SK_', 'DM_', 'bio')):
+            rxn.gene_reaction_rule = self.gpr()
+        return rxn
+
+    def exchange(self, cpd_id):
+        """Exchange + transport for an extracellular compound"""
+        return [
+            self.reaction({self.met(cpd_id, 'e0'): -1}, reversible=True, rxn_id=f'EX_{cpd_id}_e0'),
+            self.reaction({self.met(cpd_id, 'e0'): -1, self.met(cpd_id, 'c0'): 1}, reversible=True),
+        ]
+
+
+def carbon_source_ids(n_carbon_sources):
+    """Compound IDs used for the synthetic carbon sources"""
+    return [f'cpd8{i:04d}' for i in range(n_carbon_sources)]
+
+
+def make_synthetic_model(n_reactions=1500, n_carbon_sources=20, n_precursors=10,
+                         seed=0, org_id='SYN0', base_medium=None):
+    """
+    Build a synthetic model with about n_reactions reactions.
+
+    Returns (model, pathways) where pathways maps each carbon source
+    compound ID to the reaction IDs of its pathway into the hub.
+    """
+    if base_medium is None:
+        base_medium = load_base_medium()
+    b = _Builder(org_id, seed)
+    reactions = []
+    intermediates = []
+
+    for cpd_id in base_medium:
+        reactions.extend(b.exchange(cpd_id))
+
+    # Carbon source pathways into the hub; every third one is broken
+    pathways = {}
+    next_cpd = 71000
+    for i, cpd_id in enumerate(carbon_source_ids(n_carbon_sources)):
+        reactions.extend(b.exchange(cpd_id))
+        previous = b.met(cpd_id)
+        pathway = []
+        for step in range(b.rng.randint(2, 6)):
+            current = b.met(f'cpd{next_cpd:05d}')
+            next_cpd += 1
+            intermediates.append(current)
+            rxn = b.reaction({previous: -1, current: 1})
+            reactions.append(rxn)
+            pathway.append(rxn.id)
+            previous = current
+        if i % 3 != 2:
+            rxn = b.reaction({previous: -1, b.met(HUB): 1})
+            reactions.append(rxn)
+            pathway.append(rxn.id)
+        pathways[cpd_id] = pathway
+
+    # Biomass precursors from the hub
+    precursors = []
+    for i in range(n_precursors):
+        precursor = b.met(f'cpd{75000 + i:05d}')
+        extra = {b.met(NH3): -1} if i % 2 == 0 else {b.met(PHOSPHATE): -1}
+        reactions.append(b.reaction({b.met(HUB): -1, **extra, precursor: 1}))
+        precursors.append(precursor)
+
+    biomass = {precursor: -1 for precursor in precursors}
+    biomass[b.met(BIOMASS)] = 1
+    reactions.append(b.reaction(biomass, rxn_id='bio1'))
+    reactions.append(b.reaction({b.met(BIOMASS): -1}, rxn_id=f'SK_{BIOMASS}_c0'))
+
+    # Filler reactions up to the requested size
+    n_filler = max(0, n_reactions - len(reactions))
+    fillers = [b.met(f'cpd{60000 + i:05d}') for i in range(max(10, n_filler // 2))]
+    for filler in fillers[:5]:
+        reactions.append(b.reaction({filler: -1}, rxn_id=f'DM_{filler.id}'))
+    for _ in range(n_filler - 5):
+        draw = b.rng.random()
+        if draw < 0.1:
+            stoichiometry = {b.rng.choice(intermediates): -1, b.rng.choice(fillers): 1}
+            reactions.append(b.reaction(stoichiometry))
+            continue
+        if draw < 0.7:
+            a, c = b.rng.sample(fillers, 2)
+            stoichiometry = {a: -1, c: 1}
+        else:
+            a, a2, c, c2 = b.rng.sample(fillers, 4)
+            stoichiometry = {a: -1, a2: -1, c: 1, c2: 1}
+        reactions.append(b.reaction(stoichiometry, reversible=b.rng.random() < 0.5))
+
+    b.model.add_reactions(reactions)
+    b.model.objective = 'bio1'
+    return b.model, pathways
+
+
+def make_media(n_carbon_sources=20, base_medium=None):
+    """Media set {media_filename: {cpd_id: [lb, ub]}}, one per synthetic carbon source"""
+    if base_medium is None:
+        base_medium = load_base_medium()
+    media = {}
+    for cpd_id in carbon_source_ids(n_carbon_sources):
+        media_dict = {k: list(v) for k, v in base_medium.items()}
+        media_dict[cpd_id] = [CARBON_UPTAKE_RATE, CARBON_UPPER_BOUND]
+        media[f'synthetic_{cpd_id}.json'] = media_dict
+    return media
+
+
+def make_gapfill_problem(n_reactions=1500, n_gaps=2, n_decoys=200, seed=0):
+    """
+    Draft model with a gap, universal model that can fill it, and the medium.
+
+    The draft is a synthetic model with the first n_gaps reactions of a
+    growing carbon source pathway removed. The universal model holds the
+    removed reactions plus n_decoys random reactions.
+    Returns (draft, universal, media_dict).
+    """
+    base_medium = load_base_medium()
+    model, pathways = make_synthetic_model(n_reactions=n_reactions, seed=seed, base_medium=base_medium)
+    carbon_cpd = carbon_source_ids(1)[0]
+    gap_ids = pathways[carbon_cpd][:n_gaps]
+
+    universal = cobra.Model('synthetic_universal')
+    universal.add_reactions([model.reactions.get_by_id(r).copy() for r in gap_ids])
+
+    decoy_source, _ = make_synthetic_model(n_reactions=n_reactions, seed=seed + 1, base_medium=base_medium)
+    rng = random.Random(seed)
+    candidates = [r for r in decoy_source.reactions
+                  if not r.id.startswith(('EX_', 'SK_', 'DM_', 'bio')) and r.id not in universal.reactions]
+    decoys = []
+    for i, rxn in enumerate(rng.sample(candidates, min(n_decoys, len(candidates)))):
+        decoy = rxn.copy()
+        decoy.id = f'rxn{50000 + i:05d}_c0'
+        decoys.append(decoy)
+    universal.add_reactions(decoys)
+
+    model.remove_reactions(gap_ids)
+    media_dict = make_media(1, base_medium)[f'synthetic_{carbon_cpd}.json']
+    return model, universal, media_dict
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic ModelSEED-style model as JSON')
+    parser.add_argument('--reactions', type=int, default=1500, help='Approximate number of reactions')
+    parser.add_argument('--carbon-sources', type=int, default=20, help='Number of carbon source pathways')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', type=Path, required=True, help='Output model JSON')
+    args = parser.parse_args()
+
+    model, _ = make_synthetic_model(args.reactions, args.carbon_sources, seed=args.seed)
+    cobra.io.save_json_model(model, str(args.output))
+    print(f"Saved {args.output}: {len(model.reactions)} reactions, "
+          f"{len(model.metabolites)} metabolites, {len(model.genes)} genes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Compare LP/MILP solvers on a representative subset of the runners' jobs.
+
+Every solver in --solvers (default: all installed) runs the same jobs, with
+the other settings of solver_config.py (tolerances, time limit, threads,
+presolve) shared:
+
+  fba      --organisms organisms x --media carbon sources of the --variant
+           models, simulated as in run_incremental_fba.py; one slim_optimize
+           per cell, timed
+  gapfill  --gapfill false negatives from results/false_negatives.csv,
+           gap-filled on the draft model as in run_condition_specific_gapfilling.py;
+           the gapfill() call is timed. The universal model is built from
+           --template (default GramNegModelTemplateV6.json); without it the
+           jobs are synthetic gap-filling problems from
+           benchmarks/synthetic_models.py instead
+
+Organisms, carbon sources and false negatives are spread evenly over the
+input tables, so the subset is the same on every run. Model loading (which
+builds the problem in the solver) is timed separately from solving.
+
+Every solver is compared with the reference solver (--solver, default the
+one in solver_config.json):
+  fba      same status, |biomass flux difference| <= --flux-tolerance and
+           the same growth call (GROWTH_THRESHOLD)
+  gapfill  same success, the same number of reactions added (both minimal)
+           and the identical reaction set. An infeasible gap-filling problem
+           is a result (no reactions), not an error; jobs that fail on both
+           solvers with the same status count as agreeing
+The recommended solver is the fastest one that agrees with the reference on
+every growth call and every gap-filling size.
+
+Output:
+    results/solver_comparison_jobs.csv   one row per solver x job
+    results/solver_comparison.csv        one row per solver: times and agreement
+
+Usage:
+    python compare_solvers.py
+    python compare_solvers.py --solvers glpk hybrid gurobi --organisms 10 --media 40 --gapfill 10
+    python compare_solvers.py --solver-timeout 300 --gapfill 20 --fba-only
+    python compare_solvers.py --synthetic-gapfill            # even if the template is available
+    python compare_solvers.py --template ../references/build_metabolic_model/Core-V5.2.json
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cobra.exceptions import Infeasible
+
+from media_format import convert_media_to_model_format
+from run_incremental_fba import MEDIA_DIR, ORGANISM_METADATA_FILE, SIMULATABLE_FILE, model_path_for
+from solver_config import SolverConfig, add_solver_arguments, available_solvers
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import GRAMNEG_TEMPLATE_PATH, load_universal_model
+
+# Paths
+FALSE_NEGATIVES_FILE = Path('results/false_negatives.csv')
+BENCHMARKS_DIR = Path('benchmarks')
+JOBS_FILE = Path('results/solver_comparison_jobs.csv')
+SUMMARY_FILE = Path('results/solver_comparison.csv')
+
+GROWTH_THRESHOLD = 0.001  # h^-1
+FLUX_TOLERANCE = 1e-6
+
+# Size of the synthetic gap-filling problems (see benchmarks/synthetic_models.py)
+SYNTHETIC_REACTIONS = 1500
+SYNTHETIC_GAPS = 3
+
+KEYS = ['task', 'orgId', 'carbon_source']
+
+
+def spread(df, n):
+    """n rows spread evenly over df (all rows if n >= len(df))"""
+    if n >= len(df):
+        return df
+    return df.iloc[np.linspace(0, len(df) - 1, n).round().astype(int)]
+
+
+def select_fba_cells(variant, n_organisms, n_media):
+    """[(orgId, model path, [(carbon_source, media_filename, media dict)])]"""
+    organisms = spread(pd.read_csv(ORGANISM_METADATA_FILE), n_organisms)
+    simulatable = spread(pd.read_csv(SIMULATABLE_FILE), n_media)
+    media = []
+    for _, cs_row in simulatable.iterrows():
+        with open(MEDIA_DIR / cs_row['media_filename']) as f:
+            media.append((cs_row['experimental_name'], cs_row['media_filename'], json.load(f)))
+    cells = []
+    for _, org_row in organisms.iterrows():
+        model_path = model_path_for(org_row['genome_id'], variant)
+        if model_path is None:
+            print(f"  WARNING: No {variant} model for {org_row['orgId']}")
+            continue
+        cells.append((org_row['orgId'], model_path, media))
+    return cells
+
+
+def select_gapfill_jobs(n_jobs):
+    """[(orgId, draft model path, carbon_source, media dict)] of false negatives"""
+    organisms = pd.read_csv(ORGANISM_METADATA_FILE)
+    simulatable = pd.read_csv(SIMULATABLE_FILE).rename(columns={'experimental_name': 'carbon_source'})
+    fn = pd.read_csv(FALSE_NEGATIVES_FILE)[['organism', 'carbon_source']]
+    fn = fn.merge(organisms[['organism', 'orgId', 'genome_id']], on='organism')
+    fn = fn.merge(simulatable[['carbon_source', 'media_filename']], on='carbon_source')
+    jobs = []
+    for _, row in spread(fn, n_jobs).iterrows():
+        model_path = model_path_for(row['genome_id'], 'draft')
+        if model_path is None:
+            continue
+        with open(MEDIA_DIR / row['media_filename']) as f:
+            jobs.append((row['orgId'], model_path, row['carbon_source'], json.load(f)))
+    return jobs
+
+
+def run_fba(config, cells):
+    """Rows of one solver on the FBA cells"""
+    rows = []
+    for org_id, model_path, media in cells:
+        start = time.perf_counter()
+        model = config.load_model(model_path)
+        load_seconds = time.perf_counter() - start
+        for carbon_source, media_filename, media_dict in media:
+            model_media, _ = convert_media_to_model_format(media_dict, model)
+            model.medium = model_media
+            start = time.perf_counter()
+            flux = model.slim_optimize(error_value=math.nan)
+            rows.append({
+                'task': 'fba', 'orgId': org_id, 'carbon_source': carbon_source,
+                'seconds': time.perf_counter() - start, 'load_seconds': load_seconds,
+                'status': model.solver.status, 'objective': flux,
+                'growth': bool(flux > GROWTH_THRESHOLD), 'reactions_added': None,
+            })
+            load_seconds = 0.0
+    return rows
+
+
+def gapfill_row(config, org_id, carbon_source, model, universal, load_seconds):
+    """Gap-fill one model (medium already set) and time it"""
+    row = {'task': 'gapfill', 'orgId': org_id, 'carbon_source': carbon_source, 'load_seconds': load_seconds}
+    start = time.perf_counter()
+    try:
+        solutions = config.gapfill(model, universal, demand_reactions=False)
+    except Infeasible:
+        # The universal model cannot make the model grow on this medium
+        return {**row, 'seconds': time.perf_counter() - start, 'status': 'infeasible', 'objective': 0.0,
+                'growth': False, 'reactions_added': ''}
+    except Exception as e:
+        return {**row, 'seconds': time.perf_counter() - start, 'status': f'error: {type(e).__name__}: {e}',
+                'objective': math.nan, 'growth': False, 'reactions_added': None}
+    row['seconds'] = time.perf_counter() - start
+    added = sorted(solutions[0], key=lambda r: r.id) if solutions else []
+    flux, status = 0.0, 'no_solution'
+    if added:
+        model.add_reactions([reaction.copy() for reaction in added])
+        flux = model.slim_optimize(error_value=0.0)
+        status = model.solver.status
+    return {**row, 'status': status, 'objective': flux, 'growth': bool(flux > GROWTH_THRESHOLD),
+            'reactions_added': ';'.join(r.id for r in added)}
+
+
+def run_gapfill(config, jobs, template_path):
+    """Rows of one solver on the false-negative gap-filling jobs"""
+    universal = load_universal_model(template_path)
+    rows = []
+    for org_id, model_path, carbon_source, media_dict in jobs:
+        start = time.perf_counter()
+        model = config.load_model(model_path)
+        model.medium = convert_media_to_model_format(media_dict, model)[0]
+        rows.append(gapfill_row(config, org_id, carbon_source, model, universal, time.perf_counter() - start))
+    return rows
+
+
+def run_synthetic_gapfill(config, n_jobs):
+    """Rows of one solver on synthetic gap-filling problems (seeds 0..n_jobs-1)"""
+    sys.path.insert(0, str(BENCHMARKS_DIR))
+    from synthetic_models import make_gapfill_problem
+    config.apply_global()
+    rows = []
+    for seed in range(n_jobs):
+        start = time.perf_counter()
+        model, universal, media_dict = make_gapfill_problem(SYNTHETIC_REACTIONS, SYNTHETIC_GAPS, seed=seed)
+        config.apply(model)
+        model.medium = convert_media_to_model_format(media_dict, model)[0]
+        rows.append(gapfill_row(config, f'synthetic{seed}', 'synthetic', model, universal,
+                                time.perf_counter() - start))
+    return rows
+
+
+def agreement(jobs, reference, flux_tolerance):
+    """Per-job agreement of every solver with the reference solver"""
+    ref = jobs[jobs['solver'] == reference][KEYS + ['status', 'objective', 'growth', 'reactions_added']]
+    merged = jobs.merge(ref, on=KEYS, how='left', suffixes=('', '_ref'))
+    both_nan = merged['objective'].isna() & merged['objective_ref'].isna()
+    merged['status_agrees'] = merged['status'] == merged['status_ref']
+    merged['flux_agrees'] = ((merged['objective'] - merged['objective_ref']).abs() <= flux_tolerance) | both_nan
+    merged['growth_agrees'] = merged['growth'] == merged['growth_ref']
+    n_added = merged['reactions_added'].str.count(';') + (merged['reactions_added'] != '')
+    n_added_ref = merged['reactions_added_ref'].str.count(';') + (merged['reactions_added_ref'] != '')
+    both_failed = merged['reactions_added'].isna() & merged['reactions_added_ref'].isna() & merged['status_agrees']
+    merged['size_agrees'] = (n_added == n_added_ref) | both_failed
+    merged['set_agrees'] = (merged['reactions_added'] == merged['reactions_added_ref']) | both_failed
+    return merged.drop(columns=['status_ref', 'objective_ref', 'growth_ref', 'reactions_added_ref'])
+
+
+def summarize(jobs, reference):
+    """One row per solver: time and agreement with the reference"""
+    rows = []
+    for solver, group in jobs.groupby('solver', sort=False):
+        fba = group[group['task'] == 'fba']
+        gf = group[group['task'] == 'gapfill']
+        row = {
+            'solver': solver,
+            'load_seconds': group['load_seconds'].sum(),
+            'fba_jobs': len(fba),
+            'fba_seconds': fba['seconds'].sum(),
+            'fba_median_ms': 1000 * fba['seconds'].median(),
+            'fba_not_optimal': int((fba['status'] != 'optimal').sum()),
+            'fba_status_agreement': fba['status_agrees'].mean(),
+            'fba_flux_agreement': fba['flux_agrees'].mean(),
+            'fba_growth_agreement': fba['growth_agrees'].mean(),
+            'gapfill_jobs': len(gf),
+            'gapfill_seconds': gf['seconds'].sum(),
+            'gapfill_median_seconds': gf['seconds'].median(),
+            'gapfill_errors': int(gf['status'].str.startswith('error').sum()),
+            'gapfill_success': int(gf['growth'].sum()),
+            'gapfill_success_agreement': gf['growth_agrees'].mean(),
+            'gapfill_size_agreement': gf['size_agrees'].mean(),
+            'gapfill_set_agreement': gf['set_agrees'].mean(),
+        }
+        row['solve_seconds'] = row['fba_seconds'] + row['gapfill_seconds']
+        row['correct'] = all(pd.isna(row[c]) or row[c] == 1.0
+                             for c in ['fba_growth_agreement', 'gapfill_size_agreement'])
+        rows.append(row)
+    summary = pd.DataFrame(rows)
+    ref_seconds = summary.loc[summary['solver'] == reference, 'solve_seconds'].iloc[0]
+    summary['speedup'] = ref_seconds / summary['solve_seconds']
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare LP/MILP solvers on a subset of FBA and gap-filling jobs')
+    parser.add_argument('--solvers', nargs='+', help='Solvers to compare (default: all installed)')
+    parser.add_argument('--variant', choices=['draft', 'gapfilled', 'corrected'], default='gapfilled',
+                        help='Models for the FBA jobs')
+    parser.add_argument('--organisms', type=int, default=5, help='Organisms in the FBA jobs')
+    parser.add_argument('--media', type=int, default=20, help='Carbon sources per organism in the FBA jobs')
+    parser.add_argument('--gapfill', type=int, default=5, help='Gap-filling jobs (false negatives)')
+    parser.add_argument('--fba-only', action='store_true', help='Skip gap-filling')
+    parser.add_argument('--synthetic-gapfill', action='store_true', help='Use synthetic gap-filling problems')
+    parser.add_argument('--template', type=Path, default=GRAMNEG_TEMPLATE_PATH,
+                        help='ModelSEED template of the gap-filling universal model')
+    parser.add_argument('--flux-tolerance', type=float, default=FLUX_TOLERANCE,
+                        help='Largest biomass flux difference counted as agreement')
+    add_solver_arguments(parser)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    base_config = SolverConfig.from_args(args)
+    reference = args.solver or base_config.solver or available_solvers()[0]
+    solvers = [reference] + [s for s in (args.solvers or available_solvers()) if s != reference]
+    missing = [s for s in solvers if s not in available_solvers()]
+    if missing:
+        print(f"ERROR: Not installed: {missing} (available: {available_solvers()})")
+        sys.exit(1)
+
+    cells = select_fba_cells(args.variant, args.organisms, args.media)
+    synthetic = args.synthetic_gapfill or not args.template.exists()
+    if args.fba_only:
+        gapfill_jobs = []
+    elif synthetic:
+        if not args.synthetic_gapfill:
+            print(f"WARNING: {args.template} not found, gap-filling synthetic problems instead")
+        gapfill_jobs = list(range(args.gapfill))
+    else:
+        gapfill_jobs = select_gapfill_jobs(args.gapfill)
+    print(f"Solvers: {', '.join(solvers)} (reference: {reference})")
+    settings = {name: value for name, value in base_config.as_dict().items() if name != 'solver' and value is not None}
+    print(f"Shared settings: {settings or 'solver defaults'}")
+    print(f"FBA jobs: {sum(len(media) for _, _, media in cells):,} ({len(cells)} {args.variant} models)")
+    print(f"Gap-filling jobs: {len(gapfill_jobs)}{' (synthetic)' if synthetic and gapfill_jobs else ''}")
+
+    rows = []
+    for solver in solvers:
+        config = base_config.replace(solver=solver)
+        print(f"\n{solver}:")
+        solver_start = time.time()
+        solver_rows = run_fba(config, cells)
+        if gapfill_jobs:
+            if synthetic:
+                solver_rows += run_synthetic_gapfill(config, len(gapfill_jobs))
+            else:
+                solver_rows += run_gapfill(config, gapfill_jobs, args.template)
+        rows += [{'solver': solver, **row} for row in solver_rows]
+        print(f"  {len(solver_rows)} jobs in {time.time() - solver_start:.1f} seconds")
+
+    jobs = agreement(pd.DataFrame(rows), reference, args.flux_tolerance)
+    summary = summarize(jobs, reference)
+    JOBS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    jobs.to_csv(JOBS_FILE, index=False)
+    summary.to_csv(SUMMARY_FILE, index=False)
+
+    columns = ['solver', 'fba_seconds', 'fba_median_ms', 'fba_growth_agreement', 'fba_flux_agreement',
+               'gapfill_seconds', 'gapfill_size_agreement', 'gapfill_set_agreement', 'gapfill_errors', 'speedup',
+               'correct']
+    print(f"\n{summary[columns].to_string(index=False, float_format=lambda x: f'{x:.3f}')}")
+    correct = summary[summary['correct']].sort_values('solve_seconds')
+    if len(correct):
+        print(f"\nFastest solver agreeing with {reference}: {correct['solver'].iloc[0]}")
+    disagreeing = summary.loc[~summary['correct'], 'solver'].tolist()
+    if disagreeing:
+        print(f"Disagrees with {reference} (see {JOBS_FILE}): {', '.join(disagreeing)}")
+    print(f"Saved: {JOBS_FILE}")
+    print(f"Saved: {SUMMARY_FILE}")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Compiled gene-reaction rules for batch knockout and expression queries.
+
+All gene_reaction_rule strings of a model are parsed once into one AND/OR
+tree over integer indices. Genes are positions 0..n_genes-1 of a value
+vector and every AND/OR node gets the next position. Nested operators of
+the same kind are flattened, so "a and (b and c)" is one AND node. Nodes
+are grouped by height, and each (height, operator) group is stored as flat
+arrays (CSR style): the node positions, the concatenated child positions,
+and each node's offset into them.
+
+Evaluating a batch of knockout sets (boolean matrix, sets x genes) fills
+the gene columns with "gene present", then computes each group with a
+single np.logical_and.reduceat / np.logical_or.reduceat over its children.
+A reaction is disabled when the value at its rule root is False.
+Continuous expression values use the same layout with min (AND) and max
+(OR).
+
+Trees are used instead of DNF because the transporter rules of some models
+(AND over long OR lists of subunits) expand to thousands of clauses.
+Reactions without a GPR are never disabled.
+
+Usage:
+    from gpr_compiler import CompiledGPR
+    gpr = CompiledGPR.from_model_json('../CDMSCI-198-build-models/models/ANA3_gapfilled.json')
+    gpr.disabled_reactions(['ANA3:7023802'])          # reaction IDs
+    targets = gpr.single_gene_targets()               # {gene_id: [reaction IDs]}
+    disabled = gpr.disabled_matrix(knockout_sets)     # sets x reactions (bool)
+
+Command line (compile every model and compare with cobra):
+    python gpr_compiler.py --verify
+"""
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+MODELS_DIR = Path('../CDMSCI-198-build-models/models')
+
+_TOKEN = re.compile(r'\(|\)|[^\s()]+')
+
+
+def _parse_or(tokens, pos):
+    terms = []
+    while True:
+        term, pos = _parse_and(tokens, pos)
+        terms.append(term)
+        if pos < len(tokens) and tokens[pos].lower() == 'or':
+            pos += 1
+        else:
+            break
+    return (terms[0] if len(terms) == 1 else ('or', terms)), pos
+
+
+def _parse_and(tokens, pos):
+    factors = []
+    while True:
+        factor, pos = _parse_atom(tokens, pos)
+        factors.append(factor)
+        if pos < len(tokens) and tokens[pos].lower() == 'and':
+            pos += 1
+        else:
+            break
+    return (factors[0] if len(factors) == 1 else ('and', factors)), pos
+
+
+def _parse_atom(tokens, pos):
+    if pos >= len(tokens):
+        raise ValueError("GPR ends unexpectedly")
+    if tokens[pos] == '(':
+        tree, pos = _parse_or(tokens, pos + 1)
+        if pos >= len(tokens) or tokens[pos] != ')':
+            raise ValueError("Unbalanced parentheses in GPR")
+        return tree, pos + 1
+    if tokens[pos] == ')' or tokens[pos].lower() in ('and', 'or'):
+        raise ValueError(f"Unexpected token in GPR: {tokens[pos]}")
+    return tokens[pos], pos + 1
+
+
+def _flatten(tree):
+    """Merge nested operators of the same kind: ('and', [a, ('and', [b, c])]) -> ('and', [a, b, c])"""
+    if isinstance(tree, str):
+        return tree
+    op, children = tree
+    flat = []
+    for child in map(_flatten, children):
+        if not isinstance(child, str) and child[0] == op:
+            flat.extend(child[1])
+        else:
+            flat.append(child)
+    return op, flat
+
+
+def parse_rule(rule):
+    """AND/OR tree of a gene_reaction_rule string: gene ID, (op, [children]), or None without GPR"""
+    tokens = _TOKEN.findall(rule or '')
+    if not tokens:
+        return None
+    tree, pos = _parse_or(tokens, 0)
+    if pos != len(tokens):
+        raise ValueError(f"Unexpected token in GPR: {tokens[pos]}")
+    return _flatten(tree)
+
+
+def _essential_genes(tree):
+    """Genes whose deletion alone makes the tree False: AND = union, OR = intersection"""
+    if isinstance(tree, str):
+        return frozenset([tree])
+    op, children = tree
+    sets = [_essential_genes(child) for child in children]
+    return frozenset.union(*sets) if op == 'and' else frozenset.intersection(*sets)
+
+
+def _genes(tree):
+    if isinstance(tree, str):
+        yield tree
+    else:
+        for child in tree[1]:
+            yield from _genes(child)
+
+
+class CompiledGPR:
+    """All GPRs of a model as one integer-indexed AND/OR tree"""
+
+    def __init__(self, reaction_ids, rules):
+        self.reaction_ids = list(reaction_ids)
+        trees = []
+        for r, rule in enumerate(rules):
+            tree = parse_rule(rule)
+            if tree is not None:
+                trees.append((r, tree))
+
+        self.gene_index = {}
+        for _, tree in trees:
+            for gene_id in _genes(tree):
+                self.gene_index.setdefault(gene_id, len(self.gene_index))
+        self.gene_ids = list(self.gene_index)
+
+        # (height, op) -> [(node position, [child positions])]
+        groups = {}
+        n_values = [len(self.gene_ids)]
+
+        def compile_node(tree):
+            if isinstance(tree, str):
+                return self.gene_index[tree], 0
+            op, children = tree
+            compiled = [compile_node(child) for child in children]
+            position = n_values[0]
+            n_values[0] += 1
+            height = 1 + max(h for _, h in compiled)
+            groups.setdefault((height, op), []).append((position, [p for p, _ in compiled]))
+            return position, height
+
+        self.rule_reactions = np.array([r for r, _ in trees], dtype=np.int64)
+        self.essential_genes = [_essential_genes(tree) for _, tree in trees]
+        self.rule_roots = np.array([compile_node(tree)[0] for _, tree in trees], dtype=np.int64)
+        self.n_values = n_values[0]
+
+        self.levels = []
+        for height, op in sorted(groups):
+            nodes = groups[(height, op)]
+            children = [p for _, child_positions in nodes for p in child_positions]
+            starts = np.cumsum([0] + [len(c) for _, c in nodes[:-1]])
+            self.levels.append((op, np.array([p for p, _ in nodes], dtype=np.int64),
+                                np.array(children, dtype=np.int64), starts.astype(np.int64)))
+
+    @classmethod
+    def from_model_json(cls, model_path):
+        """Compile from a cobra JSON model file without loading it into cobra"""
+        with open(model_path) as f:
+            reactions = json.load(f)['reactions']
+        return cls([r['id'] for r in reactions], [r.get('gene_reaction_rule', '') for r in reactions])
+
+    @classmethod
+    def from_cobra(cls, model):
+        return cls([r.id for r in model.reactions], [r.gene_reaction_rule for r in model.reactions])
+
+    @property
+    def n_nodes(self):
+        return self.n_values - len(self.gene_ids)
+
+    def knockout_matrix(self, knockout_sets):
+        """Boolean matrix (sets x genes) from an iterable of gene ID collections"""
+        knockout_sets = list(knockout_sets)
+        matrix = np.zeros((len(knockout_sets), len(self.gene_ids)), dtype=bool)
+        for i, genes in enumerate(knockout_sets):
+            matrix[i, [self.gene_index[g] for g in genes if g in self.gene_index]] = True
+        return matrix
+
+    def _evaluate(self, gene_values, and_op, or_op):
+        """Values at every rule root (sets x rules)"""
+        values = np.empty((len(gene_values), self.n_values), dtype=gene_values.dtype)
+        values[:, :len(self.gene_ids)] = gene_values
+        for op, nodes, children, starts in self.levels:
+            reduce = and_op if op == 'and' else or_op
+            values[:, nodes] = reduce.reduceat(values[:, children], starts, axis=1)
+        return values[:, self.rule_roots]
+
+    def disabled_rules(self, knockouts, chunk_size=1024):
+        """(sets x rules) bool: the rule evaluates to False with the knocked-out genes absent"""
+        knockouts = np.asarray(knockouts, dtype=bool)
+        disabled = np.empty((len(knockouts), len(self.rule_roots)), dtype=bool)
+        for start in range(0, len(knockouts), chunk_size):
+            present = ~knockouts[start:start + chunk_size]
+            disabled[start:start + chunk_size] = ~self._evaluate(present, np.logical_and, np.logical_or)
+        return disabled
+
+    def disabled_matrix(self, knockout_sets):
+        """(sets x reactions) bool for gene ID collections or a (sets x genes) bool matrix"""
+        knockouts = knockout_sets if isinstance(knockout_sets, np.ndarray) else self.knockout_matrix(knockout_sets)
+        disabled = np.zeros((len(knockouts), len(self.reaction_ids)), dtype=bool)
+        disabled[:, self.rule_reactions] = self.disabled_rules(knockouts)
+        return disabled
+
+    def disabled_reactions(self, knockouts):
+        """Reaction IDs disabled by deleting the genes in `knockouts`"""
+        row = self.disabled_matrix([knockouts])[0]
+        return [self.reaction_ids[r] for r in np.flatnonzero(row)]
+
+    def single_gene_targets(self):
+        """{gene_id: [reaction IDs disabled by deleting only that gene]} for every gene"""
+        # Read off the per-rule essential gene sets computed at compile time
+        targets = {gene_id: [] for gene_id in self.gene_ids}
+        for r, genes in zip(self.rule_reactions, self.essential_genes):
+            for gene_id in genes:
+                targets[gene_id].append(self.reaction_ids[r])
+        return targets
+
+    def reaction_expression(self, values, missing=np.nan):
+        """
+        Reaction-level values from gene values (sets x genes, or one vector):
+        min over AND, max over OR. Reactions without a GPR get `missing`.
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        result = np.full((len(values), len(self.reaction_ids)), missing, dtype=float)
+        result[:, self.rule_reactions] = self._evaluate(values, np.minimum, np.maximum)
+        return result
+
+
+def verify_model(model_path, n_random=200, seed=0):
+    """Compare single and random multi-gene knockouts with cobra's GPR.eval; returns stats"""
+    import cobra
+
+    start_time = time.time()
+    gpr = CompiledGPR.from_model_json(model_path)
+    compile_seconds = time.time() - start_time
+
+    start_time = time.time()
+    targets = gpr.single_gene_targets()
+    compiled_seconds = time.time() - start_time
+
+    model = cobra.io.load_json_model(str(model_path))
+    start_time = time.time()
+    expected = {gene.id: sorted(rxn.id for rxn in gene.reactions if not rxn.gpr.eval({gene.id}))
+                for gene in model.genes}
+    cobra_seconds = time.time() - start_time
+    mismatches = sum(sorted(targets.get(g, [])) != rxns for g, rxns in expected.items())
+
+    rng = np.random.default_rng(seed)
+    gene_ids = np.array(gpr.gene_ids)
+    sets = [set(rng.choice(gene_ids, size=min(len(gene_ids), 20), replace=False)) for _ in range(n_random)]
+    start_time = time.time()
+    disabled = gpr.disabled_matrix(sets)
+    batch_compiled_seconds = time.time() - start_time
+    start_time = time.time()
+    expected_sets = [{rxn.id for rxn in model.reactions if rxn.gene_reaction_rule and not rxn.gpr.eval(knockouts)}
+                     for knockouts in sets]
+    batch_cobra_seconds = time.time() - start_time
+    for row, expected_set in zip(disabled, expected_sets):
+        mismatches += expected_set != {gpr.reaction_ids[r] for r in np.flatnonzero(row)}
+
+    return {
+        'model': Path(model_path).name,
+        'genes': len(gpr.gene_ids),
+        'rules': len(gpr.rule_roots),
+        'nodes': gpr.n_nodes,
+        'compile_seconds': compile_seconds,
+        'single_gene_compiled_seconds': compiled_seconds,
+        'single_gene_cobra_seconds': cobra_seconds,
+        'batch_compiled_seconds': batch_compiled_seconds,
+        'batch_cobra_seconds': batch_cobra_seconds,
+        'mismatches': mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile model GPRs and check them against cobra')
+    parser.add_argument('--verify', action='store_true', help='Compare knockouts with cobra for every model')
+    parser.add_argument('--variant', default='gapfilled', help='Model variant (default: gapfilled)')
+    args = parser.parse_args()
+
+    model_paths = sorted(MODELS_DIR.glob(f'*_{args.variant}.json'))
+    start_time = time.time()
+    rows = []
+    for model_path in model_paths:
+        if args.verify:
+            rows.append(verify_model(model_path))
+        else:
+            gpr = CompiledGPR.from_model_json(model_path)
+            rows.append({'model': model_path.name, 'genes': len(gpr.gene_ids),
+                         'rules': len(gpr.rule_roots), 'nodes': gpr.n_nodes})
+
+    for row in rows:
+        line = f"  {row['model']:<40} {row['genes']:>5} genes {row['rules']:>5} rules {row['nodes']:>5} nodes"
+        if args.verify:
+            line += (f"  single-gene: {row['single_gene_compiled_seconds'] * 1000:.1f} ms vs cobra "
+                     f"{row['single_gene_cobra_seconds'] * 1000:.0f} ms; 200 x 20-gene sets: "
+                     f"{row['batch_compiled_seconds'] * 1000:.1f} ms vs cobra {row['batch_cobra_seconds'] * 1000:.0f} ms; "
+                     f"{row['mismatches']} mismatches")
+        print(line)
+    if args.verify:
+        print(f"\nModels: {len(rows)}; mismatches: {sum(r['mismatches'] for r in rows)}")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+ModelSEED media files -> cobra model.medium, shared by the FBA, gap-filling,
+knockout and benchmark scripts.
+
+Media files map compound IDs to uptake bounds, {'cpd00007': [-10, 100], ...};
+model.medium maps exchange reactions to uptake rates, {'EX_cpd00007_e0': 10, ...}.
+
+Usage:
+    from media_format import convert_media_to_model_format
+
+    model_media, missing = convert_media_to_model_format(media_dict, model)
+    model.medium = model_media
+"""
+
+
+def convert_media_to_model_format(media_dict, model):
+    """
+    Convert media from ModelSEED compound IDs to model exchange reactions.
+
+    Media files have format: {'cpd00007': [-10, 100], ...}
+    model.medium needs format: {'EX_cpd00007_e0': 10, ...}
+
+    Returns (model_media dict, list of compound IDs without an exchange)
+    """
+    model_media = {}
+    missing_exchanges = []
+
+    for cpd_id, bounds in media_dict.items():
+        ex_id = f"EX_{cpd_id}_e0"
+        if ex_id in model.reactions:
+            model_media[ex_id] = abs(bounds[0])
+        else:
+            missing_exchanges.append(cpd_id)
+
+    return model_media, missing_exchanges
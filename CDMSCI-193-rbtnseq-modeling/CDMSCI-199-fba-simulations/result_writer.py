@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Batched CSV writer for runner results.
+
+The runners used to keep every result row in a list and write one DataFrame
+at the end, so memory grew with the run and an interrupted run left nothing
+on disk. ResultWriter appends rows to the CSV in batches instead: a batch is
+written every `batch_size` rows or when `flush_seconds` have passed since
+the last write (slow jobs such as gap-filling still reach disk), so at most
+one batch is held in memory and the file is always a valid CSV of the
+finished rows.
+
+Signals:
+  - SIGUSR1: flush every open writer and continue (check progress of a
+    running job with `kill -USR1 <pid>`)
+  - SIGTERM: flush every open writer, then exit
+Open writers are also flushed at interpreter exit (including Ctrl-C).
+
+The file is created on the first flush. A writer that never receives a row
+still replaces an existing file when it is closed, so a rerun never leaves
+an earlier run's rows behind: with `columns` the file becomes a header-only
+CSV, without them it is removed. Writers with append=True leave it as is.
+
+Usage:
+    from result_writer import ResultWriter
+
+    with ResultWriter('results/draft_model_fba_results.csv') as writer:
+        for ...:
+            writer.write({'orgId': org_id, 'carbon_source': cs, 'biomass_flux': flux})
+    print(f"{len(writer)} rows")
+
+    writer = ResultWriter(path, append=True)     # continue an existing file
+"""
+
+import atexit
+import csv
+import signal
+import threading
+import time
+import weakref
+from pathlib import Path
+
+BATCH_SIZE = 1000
+FLUSH_SECONDS = 30
+
+_open_writers = weakref.WeakSet()
+_handlers_installed = False
+_flushing = 0
+_exit_signal = None
+_exiting = False
+
+
+def flush_all():
+    """Flush every open ResultWriter"""
+    for writer in list(_open_writers):
+        writer.flush()
+
+
+def _exit_after_flush():
+    global _exiting
+    if _exiting:
+        return
+    _exiting = True
+    flush_all()
+    raise SystemExit(128 + _exit_signal)
+
+
+def _on_signal(signum, frame):
+    global _exit_signal
+    if signum == signal.SIGTERM:
+        _exit_signal = signum
+    if _flushing:
+        # A writer is in the middle of a batch; it finishes (and exits if asked) itself
+        return
+    if _exit_signal is not None:
+        _exit_after_flush()
+    flush_all()
+
+
+def _install_handlers():
+    global _handlers_installed
+    if _handlers_installed or threading.current_thread() is not threading.main_thread():
+        return
+    atexit.register(flush_all)
+    for name in ['SIGTERM', 'SIGUSR1']:
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), _on_signal)
+    _handlers_installed = True
+
+
+class ResultWriter:
+    """Appends dict rows to a CSV file in batches"""
+
+    def __init__(self, path, columns=None, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS, append=False):
+        self.path = Path(path)
+        self.columns = list(columns) if columns else None
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.append = append
+        self.count = 0
+        self._rows = []
+        self._file = None
+        self._writer = None
+        self._last_flush = time.time()
+        _open_writers.add(self)
+        _install_handlers()
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, row):
+        self._rows.append(row)
+        self.count += 1
+        if len(self._rows) >= self.batch_size or time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        resume = self.append and self.path.exists() and self.path.stat().st_size > 0
+        if resume and self.columns is None:
+            with open(self.path, newline='') as f:
+                self.columns = next(csv.reader(f))
+        self.columns = self.columns or list(self._rows[0])
+        self._file = open(self.path, 'a' if resume else 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns)
+        if not resume:
+            self._writer.writeheader()
+        # Reopening after close() must not truncate what was written
+        self.append = True
+
+    def flush(self):
+        """Write buffered rows to disk"""
+        global _flushing
+        self._last_flush = time.time()
+        if not self._rows:
+            return
+        _flushing += 1
+        try:
+            if self._file is None:
+                self._open()
+            batch, self._rows = self._rows, []
+            self._writer.writerows(batch)
+            self._file.flush()
+        finally:
+            _flushing -= 1
+        if _exit_signal is not None and not _flushing:
+            _exit_after_flush()
+
+    def close(self):
+        self.flush()
+        if self._file is None and not self.append:
+            # No rows this run: do not leave the previous run's file behind
+            if self.columns:
+                self._open()
+            else:
+                self.path.unlink(missing_ok=True)
+                self.append = True
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        _open_writers.discard(self)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+SQLite warehouse for FBA and gap-filling results from every run.
+
+The runners still write their CSVs (overwritten on each run); they also
+append every row to results/results_store.sqlite tagged with a run ID, so
+earlier runs are kept and can be compared with indexed queries:
+
+    runs                one row per run: run_id, kind (fba/gapfilling),
+                        variant (draft/gapfilled/corrected), parameters (JSON),
+                        source, created_at, n_results, n_errors
+    fba_results         run_id, orgId, organism, carbon_source, media_filename,
+                        biomass_flux, status, prediction, missing_compounds,
+                        num_missing, screened
+    gapfilling_results  run_id, orgId, organism, carbon_source, media_filename,
+                        pre_gapfill_flux, post_gapfill_flux, gapfill_success,
+                        num_reactions_added, reactions_added,
+                        gapfill_solutions_count
+    errors              run_id, orgId, organism, carbon_source, error
+
+Result tables have (run_id, orgId, carbon_source) as primary key plus an
+(orgId, carbon_source) index, so a slice of one run and the same cells
+across runs are both index lookups.
+
+Usage:
+    from results_store import ResultsStore
+
+    store = ResultsStore()
+    run_id = store.start_run('fba', 'draft', parameters={'growth_threshold': 0.001})
+    store.append(run_id, results_df)
+    store.append_errors(run_id, errors_df)
+
+    store.results(run_ids=[run_id], org_ids=['ANA3'], carbon_sources=['D-Glucose'])
+    store.compare(run_a, run_b)              # cells where the prediction changed
+
+    python results_store.py --import-existing    # load the existing results/*.csv once
+    python results_store.py --runs
+    python results_store.py --compare RUN_A RUN_B
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# Resolved from this file so the runners can use the store from any directory
+STORE_FILE = Path(__file__).resolve().parent / 'results' / 'results_store.sqlite'
+
+KINDS = ['fba', 'gapfilling']
+VARIANTS = ['draft', 'gapfilled', 'corrected']
+
+KEY_COLUMNS = ['orgId', 'organism', 'carbon_source']
+RESULT_COLUMNS = {
+    'fba': {
+        'media_filename': 'TEXT', 'biomass_flux': 'REAL', 'status': 'TEXT', 'prediction': 'INTEGER',
+        'missing_compounds': 'TEXT', 'num_missing': 'INTEGER', 'screened': 'INTEGER',
+    },
+    'gapfilling': {
+        'media_filename': 'TEXT', 'pre_gapfill_flux': 'REAL', 'post_gapfill_flux': 'REAL',
+        'gapfill_success': 'INTEGER', 'num_reactions_added': 'INTEGER', 'reactions_added': 'TEXT',
+        'gapfill_solutions_count': 'INTEGER',
+    },
+}
+COMPARE_COLUMN = {'fba': 'prediction', 'gapfilling': 'gapfill_success'}
+
+# Existing CSVs for --import-existing: (file, kind, variant, errors file)
+EXISTING_RESULTS = [
+    ('fba_simulation_results.csv', 'fba', 'gapfilled', None),
+    ('fba_simulation_results_corrected.csv', 'fba', 'corrected', None),
+    ('draft_model_fba_results.csv', 'fba', 'draft', 'draft_model_fba_errors.csv'),
+    ('condition_specific_gapfilling_results.csv', 'gapfilling', 'draft', 'condition_specific_gapfilling_errors.csv'),
+]
+
+
+def _table(kind):
+    if kind not in RESULT_COLUMNS:
+        raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+    return f"{kind}_results"
+
+
+class ResultsStore:
+    """Append-only store of runner outputs keyed by run ID"""
+
+    def __init__(self, path=STORE_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        statements = ["""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                parameters TEXT,
+                source TEXT,
+                created_at TEXT NOT NULL,
+                n_results INTEGER DEFAULT 0,
+                n_errors INTEGER DEFAULT 0
+            )""", """
+            CREATE TABLE IF NOT EXISTS errors (
+                run_id TEXT NOT NULL REFERENCES runs(run_id),
+                orgId TEXT, organism TEXT, carbon_source TEXT, error TEXT
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_errors_run ON errors (run_id)",
+        ]
+        for kind, columns in RESULT_COLUMNS.items():
+            table = _table(kind)
+            definitions = ', '.join(f"{name} {sql_type}" for name, sql_type in columns.items())
+            statements += [
+                f"""CREATE TABLE IF NOT EXISTS {table} (
+                    run_id TEXT NOT NULL REFERENCES runs(run_id),
+                    orgId TEXT NOT NULL, organism TEXT, carbon_source TEXT NOT NULL,
+                    {definitions},
+                    PRIMARY KEY (run_id, orgId, carbon_source)
+                )""",
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_cell ON {table} (orgId, carbon_source)",
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_carbon ON {table} (carbon_source)",
+            ]
+        with self.conn:
+            for statement in statements:
+                self.conn.execute(statement)
+
+    def close(self):
+        self.conn.close()
+
+    def start_run(self, kind, variant, parameters=None, run_id=None, source=None):
+        """Register a run and return its ID (default: {kind}-{variant}-{timestamp})"""
+        _table(kind)
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown variant {variant!r}, expected one of {VARIANTS}")
+        now = datetime.now()
+        created_at = now.isoformat(timespec='seconds')
+        # Microseconds keep IDs unique (and in order) for runs started within the same second
+        run_id = run_id or f"{kind}-{variant}-{now:%Y%m%d-%H%M%S-%f}"
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO runs (run_id, kind, variant, parameters, source, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, kind, variant, json.dumps(parameters or {}, sort_keys=True, default=str), source,
+                 created_at))
+        return run_id
+
+    def run(self, run_id):
+        """The runs row of one run as a dict"""
+        row = self.runs(run_ids=[run_id])
+        if row.empty:
+            raise KeyError(f"No run {run_id!r} in {self.path}")
+        return row.iloc[0].to_dict()
+
+    def append(self, run_id, results):
+        """Add result rows (DataFrame or list of dicts) to a run; a repeated cell replaces the earlier row"""
+        kind = self.run(run_id)['kind']
+        columns = KEY_COLUMNS + list(RESULT_COLUMNS[kind])
+        df = pd.DataFrame(results).reindex(columns=columns)
+        if df.empty:
+            return 0
+        df = df.astype(object).where(df.notna(), None)
+        for column, sql_type in RESULT_COLUMNS[kind].items():
+            if sql_type == 'INTEGER':
+                df[column] = [None if v is None else int(v) for v in df[column]]
+        placeholders = ', '.join('?' * (len(columns) + 1))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {_table(kind)} (run_id, {', '.join(columns)}) VALUES ({placeholders})",
+                ((run_id, *row) for row in df.itertuples(index=False, name=None)))
+            self.conn.execute(f"UPDATE runs SET n_results = (SELECT COUNT(*) FROM {_table(kind)} WHERE run_id = ?) "
+                              "WHERE run_id = ?", (run_id, run_id))
+        return len(df)
+
+    def append_errors(self, run_id, errors):
+        """Add error rows (orgId, organism, carbon_source, error) to a run"""
+        df = pd.DataFrame(errors).reindex(columns=KEY_COLUMNS + ['error'])
+        if df.empty:
+            return 0
+        df = df.astype(object).where(df.notna(), None)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO errors (run_id, orgId, organism, carbon_source, error) VALUES (?, ?, ?, ?, ?)",
+                ((run_id, *row) for row in df.itertuples(index=False, name=None)))
+            self.conn.execute("UPDATE runs SET n_errors = (SELECT COUNT(*) FROM errors WHERE run_id = ?) "
+                              "WHERE run_id = ?", (run_id, run_id))
+        return len(df)
+
+    def delete_run(self, run_id):
+        with self.conn:
+            for kind in KINDS:
+                self.conn.execute(f"DELETE FROM {_table(kind)} WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM errors WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def runs(self, kind=None, variant=None, run_ids=None):
+        """Registered runs, newest first"""
+        conditions, params = _filters([('kind', kind and [kind]), ('variant', variant and [variant]),
+                                       ('run_id', run_ids)])
+        df = pd.read_sql_query(f"SELECT * FROM runs{conditions} ORDER BY created_at DESC, run_id DESC",
+                               self.conn, params=params)
+        return df
+
+    def latest_run(self, kind, variant):
+        """ID of the newest run of this kind and variant, or None"""
+        runs = self.runs(kind, variant)
+        return runs['run_id'].iloc[0] if len(runs) else None
+
+    def results(self, run_ids=None, org_ids=None, carbon_sources=None, kind='fba', columns=None):
+        """Result rows for any run x organism x carbon source slice (None = all)"""
+        selected = ', '.join(['run_id'] + list(columns)) if columns else '*'
+        conditions, params = _filters([('run_id', run_ids), ('orgId', org_ids), ('carbon_source', carbon_sources)])
+        df = pd.read_sql_query(f"SELECT {selected} FROM {_table(kind)}{conditions}", self.conn, params=params)
+        return _with_bools(df, kind)
+
+    def errors(self, run_ids=None, org_ids=None):
+        conditions, params = _filters([('run_id', run_ids), ('orgId', org_ids)])
+        return pd.read_sql_query(f"SELECT * FROM errors{conditions}", self.conn, params=params)
+
+    def compare(self, run_a, run_b, column=None, changed_only=True):
+        """
+        Cells present in both runs with `column` from each run (prediction for
+        FBA runs, gapfill_success for gap-filling runs).
+        """
+        kind = self.run(run_a)['kind']
+        if self.run(run_b)['kind'] != kind:
+            raise ValueError(f"Runs {run_a!r} and {run_b!r} are of different kinds")
+        column = column or COMPARE_COLUMN[kind]
+        if column not in RESULT_COLUMNS[kind]:
+            raise ValueError(f"Unknown {kind} column {column!r}")
+        table = _table(kind)
+        query = f"""
+            SELECT a.orgId, a.organism, a.carbon_source, a.{column} AS {column}_a, b.{column} AS {column}_b
+            FROM {table} a JOIN {table} b ON a.orgId = b.orgId AND a.carbon_source = b.carbon_source
+            WHERE a.run_id = ? AND b.run_id = ?
+        """
+        if changed_only:
+            query += f" AND a.{column} IS NOT b.{column}"
+        return pd.read_sql_query(query + " ORDER BY a.orgId, a.carbon_source", self.conn, params=[run_a, run_b])
+
+    def import_csv(self, csv_file, kind, variant, errors_file=None, run_id=None, parameters=None):
+        """Load an existing results CSV (and its error CSV) as a new run"""
+        try:
+            df = pd.read_csv(csv_file)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame()
+        run_id = self.start_run(kind, variant, parameters, run_id=run_id or f"import-{Path(csv_file).stem}",
+                                source=str(csv_file))
+        self.append(run_id, df)
+        if errors_file and Path(errors_file).exists():
+            self.append_errors(run_id, pd.read_csv(errors_file))
+        return run_id
+
+
+def _filters(pairs):
+    """WHERE clause and parameters for (column, values) pairs; None values are not filtered"""
+    conditions, params = [], []
+    for column, values in pairs:
+        if values is None:
+            continue
+        values = list(values)
+        conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+
+def _with_bools(df, kind):
+    for column in ['screened', 'gapfill_success']:
+        if column in df and column in RESULT_COLUMNS[kind]:
+            df[column] = df[column].astype('boolean')
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query and maintain the results warehouse')
+    parser.add_argument('--store', default=str(STORE_FILE), help='SQLite store')
+    parser.add_argument('--import-existing', action='store_true',
+                        help='Import the existing results/*.csv files as runs (skips ones already imported)')
+    parser.add_argument('--runs', action='store_true', help='List runs')
+    parser.add_argument('--compare', nargs=2, metavar=('RUN_A', 'RUN_B'), help='Cells that differ between two runs')
+    parser.add_argument('--column', help='Column to compare (default: prediction / gapfill_success)')
+    parser.add_argument('--delete', metavar='RUN_ID', help='Remove a run and its rows')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    store = ResultsStore(args.store)
+
+    if args.import_existing:
+        imported = set(store.runs()['source'].dropna())
+        results_dir = Path('results')
+        for filename, kind, variant, errors_filename in EXISTING_RESULTS:
+            csv_file = results_dir / filename
+            if not csv_file.exists():
+                continue
+            if str(csv_file) in imported:
+                print(f"  {csv_file}: already imported")
+                continue
+            run_id = store.import_csv(csv_file, kind, variant,
+                                      results_dir / errors_filename if errors_filename else None)
+            run = store.run(run_id)
+            print(f"  {csv_file} -> {run_id} ({run['n_results']:,} results, {run['n_errors']:,} errors)")
+
+    if args.delete:
+        store.delete_run(args.delete)
+        print(f"Deleted run {args.delete}")
+
+    if args.compare:
+        run_a, run_b = args.compare
+        diff = store.compare(run_a, run_b, args.column)
+        print(f"{len(diff):,} cells differ between {run_a} and {run_b}")
+        if len(diff):
+            print(diff.to_string(index=False))
+
+    if args.runs or not (args.import_existing or args.compare or args.delete):
+        runs = store.runs()
+        print(runs.drop(columns=['source']).to_string(index=False) if len(runs) else f"No runs in {store.path}")
+
+    store.close()
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,31 +18,48 @@ This generates comprehensive data to answer:
   "Is condition-specific gap-filling adding meaningful biology or just overfitting?"
 """
 
-import cobra
-from cobra.flux_analysis import gapfill
 import pandas as pd
 import json
 from pathlib import Path
 from tqdm import tqdm
+import sys
 import time
 
+from media_format import convert_media_to_model_format
+from result_writer import ResultWriter
+from results_store import ResultsStore
+from solver_config import SolverConfig
+from timing import TimingRecorder
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import GRAMNEG_TEMPLATE_PATH, load_universal_model
+
 # Paths
 models_dir = Path('../CDMSCI-198-build-models/models')
 media_dir = Path('../CDMSCI-197-media-formulations/media')
 false_negatives_file = Path('results/false_negatives.csv')
-universal_model_path = Path('../CDMSCI-198-build-models/GramNegModelTemplateV6.json')
+organism_metadata_file = Path('results/organism_metadata.csv')
+simulatable_file = Path('results/simulatable_carbon_sources.csv')
+universal_template_path = GRAMNEG_TEMPLATE_PATH
 output_file = Path('results/condition_specific_gapfilling_results.csv')
 detailed_reactions_file = Path('results/condition_specific_gapfilling_reactions.csv')
+errors_file = Path('results/condition_specific_gapfilling_errors.csv')
+timings_prefix = Path('results/condition_specific_gapfilling_timings')
 
-# Load inputs
+# Load inputs; false_negatives.csv has organism names only, so orgId / genome_id
+# come from the organism metadata and the media file from the simulatable list
 fn_df = pd.read_csv(false_negatives_file)
+fn_df = fn_df.merge(pd.read_csv(organism_metadata_file)[['organism', 'orgId', 'genome_id']],
+                    on='organism', how='left')
+simulatable = pd.read_csv(simulatable_file).rename(columns={'experimental_name': 'carbon_source'})
+fn_df = fn_df.merge(simulatable[['carbon_source', 'media_filename']], on='carbon_source', how='left')
 print(f"Loaded {len(fn_df)} false negatives to gap-fill")
 print()
 
-# Load universal model (for gap-filling reactions)
+# Universal model (gap-filling candidates) built from the template, cached after the first run
 print("Loading universal model template...")
 try:
-    universal = cobra.io.load_json_model(str(universal_model_path))
+    universal = load_universal_model(universal_template_path)
     print(f"  Universal model loaded: {len(universal.reactions)} reactions")
 except Exception as e:
     print(f"  ERROR: Could not load universal model: {e}")
@@ -52,13 +69,20 @@ except Exception as e:
 # Growth threshold
 GROWTH_THRESHOLD = 0.001  # h^-1
 
-# Results storage
-results = []
-reaction_details = []
-errors = []
+# Solver and its settings (solver_config.json); gap-filling MILPs are very
+# sensitive to the solver, compare backends with compare_solvers.py
+solver_config = SolverConfig.load()
+print(f"Solver: {solver_config.describe()}")
 
-# Track timing
+# Results are written to disk in batches (at least every 30 s) as jobs finish
+results = ResultWriter(output_file)
+reaction_details = ResultWriter(detailed_reactions_file, columns=[
+    'organism', 'orgId', 'carbon_source', 'reaction_id', 'reaction_name', 'reaction_formula', 'subsystem'])
+errors = ResultWriter(errors_file, columns=['organism', 'orgId', 'carbon_source', 'error'])
+
+# Track timing (total and per phase of every gap-filling job)
 start_time = time.time()
+timings = TimingRecorder()
 
 print(f"\nStarting {len(fn_df)} gap-filling experiments...")
 print()
@@ -67,25 +91,24 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
     for idx, row in fn_df.iterrows():
         org_id = row.get('orgId')
         if pd.isna(org_id):
-            # Try to extract from organism name
+            # Organism name not found in the metadata
             organism = row['organism']
-            # This is fragile - ideally we'd have orgId in FN CSV
-            # For now, skip if missing
-            pbar.set_postfix_str(f"Skipping {organism} (no orgId)")
+            pbar.set_postfix_str(f"Skipping {organism} (not in {organism_metadata_file.name})")
             pbar.update(1)
             continue
 
         organism = row['organism']
         carbon_source = row['carbon_source']
-        media_filename = f"{carbon_source.replace(' ', '_').replace(',', '')}.json"
+        media_filename = row['media_filename']
 
         # Construct paths
-        draft_model_path = models_dir / f'{org_id}_draft.json'
-        media_path = media_dir / carbon_source.replace(' ', '_') + '.json'
+        draft_model_path = models_dir / f"{row['genome_id']}_draft.json"
+        media_path = media_dir / (media_filename if pd.notna(media_filename) else f"{carbon_source}.json")
+        job = timings.job(orgId=org_id, carbon_source=carbon_source)
 
         # Check if files exist
         if not draft_model_path.exists():
-            errors.append({
+            errors.write({
                 'organism': organism,
                 'orgId': org_id,
                 'carbon_source': carbon_source,
@@ -95,7 +118,7 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
             continue
 
         if not media_path.exists():
-            errors.append({
+            errors.write({
                 'organism': organism,
                 'orgId': org_id,
                 'carbon_source': carbon_source,
@@ -106,9 +129,10 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
 
         # Load draft model
         try:
-            model = cobra.io.load_json_model(str(draft_model_path))
+            with job.phase('load'):
+                model = solver_config.load_model(draft_model_path)
         except Exception as e:
-            errors.append({
+            errors.write({
                 'organism': organism,
                 'orgId': org_id,
                 'carbon_source': carbon_source,
@@ -119,10 +143,11 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
 
         # Load media
         try:
-            with open(media_path, 'r') as f:
-                media_dict = json.load(f)
+            with job.phase('media_load'):
+                with open(media_path, 'r') as f:
+                    media_dict = json.load(f)
         except Exception as e:
-            errors.append({
+            errors.write({
                 'organism': organism,
                 'orgId': org_id,
                 'carbon_source': carbon_source,
@@ -133,9 +158,10 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
 
         # Apply media
         try:
-            model.medium = media_dict
+            with job.phase('medium'):
+                model.medium = convert_media_to_model_format(media_dict, model)[0]
         except Exception as e:
-            errors.append({
+            errors.write({
                 'organism': organism,
                 'orgId': org_id,
                 'carbon_source': carbon_source,
@@ -146,14 +172,15 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
 
         # Test if model already grows (shouldn't happen for FNs, but check)
         try:
-            pre_gapfill_solution = model.optimize()
+            with job.phase('optimize', model):
+                pre_gapfill_solution = model.optimize()
             pre_gapfill_flux = pre_gapfill_solution.objective_value
         except:
             pre_gapfill_flux = 0.0
 
         if pre_gapfill_flux > GROWTH_THRESHOLD:
             # This shouldn't happen for a false negative!
-            errors.append({
+            errors.write({
                 'organism': organism,
                 'orgId': org_id,
                 'carbon_source': carbon_source,
@@ -165,7 +192,8 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
         # Run gap-filling
         try:
             # Get gap-filling solutions
-            solutions = gapfill(model, universal, demand_reactions=False)
+            with job.phase('gapfill'):
+                solutions = solver_config.gapfill(model, universal, demand_reactions=False)
 
             # solutions is a list of sets of reactions
             # Take the first solution (minimal set)
@@ -174,16 +202,18 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
                 num_reactions_added = len(gapfill_reactions)
 
                 # Add reactions to model
-                for reaction in gapfill_reactions:
-                    model.add_reactions([reaction.copy()])
+                with job.phase('add_reactions'):
+                    for reaction in gapfill_reactions:
+                        model.add_reactions([reaction.copy()])
 
                 # Re-optimize
-                post_gapfill_solution = model.optimize()
+                with job.phase('reoptimize', model):
+                    post_gapfill_solution = model.optimize()
                 post_gapfill_flux = post_gapfill_solution.objective_value
                 gapfill_success = post_gapfill_flux > GROWTH_THRESHOLD
 
                 # Record result
-                results.append({
+                results.write({
                     'organism': organism,
                     'orgId': org_id,
                     'carbon_source': carbon_source,
@@ -198,7 +228,7 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
 
                 # Record detailed reactions
                 for reaction in gapfill_reactions:
-                    reaction_details.append({
+                    reaction_details.write({
                         'organism': organism,
                         'orgId': org_id,
                         'carbon_source': carbon_source,
@@ -210,7 +240,7 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
 
             else:
                 # No gap-filling solution found
-                results.append({
+                results.write({
                     'organism': organism,
                     'orgId': org_id,
                     'carbon_source': carbon_source,
@@ -224,7 +254,7 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
                 })
 
         except Exception as e:
-            errors.append({
+            errors.write({
                 'organism': organism,
                 'orgId': org_id,
                 'carbon_source': carbon_source,
@@ -233,20 +263,33 @@ with tqdm(total=len(fn_df), desc="Gap-filling FNs") as pbar:
 
         pbar.update(1)
 
-# Save results
+# Finish the result files (rows are already on disk) and read them back for the summary
 print(f"\nSaving results...")
-results_df = pd.DataFrame(results)
-results_df.to_csv(output_file, index=False)
+for writer in [results, reaction_details, errors]:
+    writer.close()
+results_df = pd.read_csv(output_file) if len(results) else pd.DataFrame(
+    columns=['gapfill_success', 'num_reactions_added'])
+reactions_df = pd.read_csv(detailed_reactions_file) if len(reaction_details) else pd.DataFrame(
+    columns=['reaction_id'])
 print(f"  Main results: {output_file}")
-
-reactions_df = pd.DataFrame(reaction_details)
-reactions_df.to_csv(detailed_reactions_file, index=False)
 print(f"  Detailed reactions: {detailed_reactions_file}")
-
 if errors:
-    errors_df = pd.DataFrame(errors)
-    errors_df.to_csv('results/condition_specific_gapfilling_errors.csv', index=False)
-    print(f"  Errors: results/condition_specific_gapfilling_errors.csv")
+    print(f"  Errors: {errors_file}")
+
+store = ResultsStore()
+run_id = store.start_run('gapfilling', 'draft', source=str(output_file), parameters={
+    'growth_threshold': GROWTH_THRESHOLD,
+    'false_negatives_file': str(false_negatives_file),
+    'universal_template': str(universal_template_path),
+    'solver': solver_config.as_dict(),
+})
+store.append(run_id, results_df)
+store.append_errors(run_id, pd.read_csv(errors_file) if len(errors) else [])
+store.close()
+print(f"  Results store: run {run_id}")
+
+timings_csv, timings_jsonl = timings.write(timings_prefix)
+print(f"  Timings: {timings_csv}, {timings_jsonl}")
 
 # Summary statistics
 elapsed_time = time.time() - start_time
@@ -257,6 +300,11 @@ print(f"Failed gap-filling: {(~results_df['gapfill_success']).sum()}")
 print(f"Errors: {len(errors)}")
 print()
 
+if len(timings.jobs) > 0:
+    print("Time by phase:")
+    print(timings.summary().to_string(float_format=lambda x: f"{x:.3f}"))
+    print()
+
 if len(results) > 0:
     print("Reactions added statistics:")
     print(results_df['num_reactions_added'].describe())
@@ -5,23 +5,51 @@ Run FBA simulations on DRAFT models (pre-gap-filling) to compare vs gap-filled
 This helps answer: Does pyruvate gap-filling improve predictions even for other carbon sources?
 """
 
-import cobra
 import pandas as pd
 import json
+import os
+import sys
 from pathlib import Path
 from tqdm import tqdm
 
+from media_format import convert_media_to_model_format
+from result_writer import ResultWriter
+from results_store import ResultsStore
+from solver_config import SolverConfig
+from timing import TimingRecorder
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import file_sha256
+
 # Paths
 models_dir = Path('../CDMSCI-198-build-models/models')
 media_dir = Path('../CDMSCI-197-media-formulations/media')
 simulatable_file = Path('results/simulatable_carbon_sources.csv')
 organism_metadata_file = Path('results/organism_metadata.csv')
 output_file = Path('results/draft_model_fba_results.csv')
+error_file = Path('results/draft_model_fba_errors.csv')
+timings_prefix = Path('results/draft_model_fba_timings')
 
 # Load inputs
 simulatable = pd.read_csv(simulatable_file)
 organism_metadata = pd.read_csv(organism_metadata_file)
 
+# Partial rerun: ../run_pipeline.py sets PIPELINE_PARTITIONS to the media files
+# that changed since the last run. Only those media are simulated and their
+# rows replace the old ones in the existing results.
+previous_results = None
+previous_errors = None
+rerun_media = None
+if os.environ.get('PIPELINE_PARTITIONS') and output_file.exists() and output_file.stat().st_size > 1:
+    rerun_media = {Path(p).name for p in json.loads(os.environ['PIPELINE_PARTITIONS'])}
+    previous_results = pd.read_csv(output_file)
+    previous_results = previous_results[~previous_results['media_filename'].isin(rerun_media)]
+    simulatable = simulatable[simulatable['media_filename'].isin(rerun_media)]
+    if error_file.exists():
+        previous_errors = pd.read_csv(error_file)
+        previous_errors = previous_errors[~previous_errors['carbon_source'].isin(simulatable['experimental_name'])]
+    print(f"Partial rerun: {len(simulatable)} carbon sources with changed media")
+
 print(f"Carbon sources to simulate: {len(simulatable)}")
 print(f"Organisms to simulate: {len(organism_metadata)}")
 print(f"Total simulations: {len(simulatable) * len(organism_metadata):,}")
@@ -30,9 +58,54 @@ print()
 # Growth threshold
 GROWTH_THRESHOLD = 0.001  # h^-1
 
-# Run simulations
-results = []
-errors = []
+# Remove reactions that can never carry flux before simulating (cache from
+# ../CDMSCI-198-build-models/precompute_blocked_reactions.py). Predictions are
+# unchanged; the LP just gets smaller.
+PRUNE_BLOCKED_REACTIONS = True
+
+# Screening mode: only solve media that give the model a new LP. Exchanges the
+# model lacks, or that are blocked, cannot carry flux, so two media that agree
+# on every remaining exchange bound are the same LP and get the same result.
+# Most carbon sources without a usable exchange collapse onto the base medium
+# and are decided without calling the solver.
+SCREEN_MEDIA = True
+
+# Solver and its settings (solver_config.json)
+solver_config = SolverConfig.load()
+print(f"Solver: {solver_config.describe()}")
+
+
+def load_blocked_reactions(model_path):
+    """Blocked reaction IDs from the model's cache, or None if missing/stale"""
+    cache_path = model_path.with_name(model_path.stem + '.blocked.json')
+    if not cache_path.exists():
+        return None
+    with open(cache_path) as f:
+        cache = json.load(f)
+    if cache.get('model_sha256') != file_sha256(model_path):
+        return None
+    return cache['blocked_reactions']
+
+
+def effective_medium(model_media, blocked_exchanges):
+    """Hashable key of the exchange bounds that can actually carry flux"""
+    return tuple(sorted((ex_id, uptake) for ex_id, uptake in model_media.items()
+                        if ex_id not in blocked_exchanges))
+
+
+# Run simulations; rows are written to disk in batches as they are produced
+results = ResultWriter(output_file)
+errors = ResultWriter(error_file, columns=['organism', 'orgId', 'carbon_source', 'error'])
+n_kept_results = n_kept_errors = 0
+if previous_results is not None:
+    # Rows of unchanged media are carried over first
+    results.write_many(previous_results.to_dict('records'))
+    n_kept_results = len(results)
+    if previous_errors is not None:
+        errors.write_many(previous_errors.to_dict('records'))
+        n_kept_errors = len(errors)
+    previous_results = previous_errors = None
+timings = TimingRecorder()
 
 total_sims = len(simulatable) * len(organism_metadata)
 
@@ -49,21 +122,39 @@ with tqdm(total=total_sims, desc="Running draft model FBA") as pbar:
             pbar.update(len(simulatable))
             continue
 
+        model_job = timings.job(orgId=org_id, carbon_source=None)
         try:
-            model = cobra.io.load_json_model(str(draft_model_path))
+            with model_job.phase('load'):
+                model = solver_config.load_model(draft_model_path)
         except Exception as e:
             print(f"  ERROR loading draft model {org_id}: {e}")
             pbar.update(len(simulatable))
             continue
 
+        # Drop blocked reactions (exchanges are kept so media conversion is unaffected)
+        with model_job.phase('prune'):
+            blocked_ids = load_blocked_reactions(draft_model_path)
+            if blocked_ids is None:
+                pbar.write(f"  {org_id}: no up-to-date blocked-reaction cache, simulating full model")
+                blocked_ids = []
+            if PRUNE_BLOCKED_REACTIONS:
+                blocked = [model.reactions.get_by_id(r) for r in blocked_ids
+                           if not r.startswith('EX_') and r in model.reactions]
+                model.remove_reactions(blocked, remove_orphans=True)
+
+        # Screening: results per distinct effective medium for this model
+        blocked_exchanges = {r for r in blocked_ids if r.startswith('EX_')}
+        solved_media = {}
+
         # Simulate each carbon source
         for _, cs_row in simulatable.iterrows():
             carbon_source = cs_row['experimental_name']
             media_filename = cs_row['media_filename']
             media_path = media_dir / media_filename
+            job = timings.job(orgId=org_id, carbon_source=carbon_source)
 
             if not media_path.exists():
-                errors.append({
+                errors.write({
                     'organism': organism,
                     'orgId': org_id,
                     'carbon_source': carbon_source,
@@ -74,10 +165,11 @@ with tqdm(total=total_sims, desc="Running draft model FBA") as pbar:
 
             # Load media
             try:
-                with open(media_path, 'r') as f:
-                    media_dict = json.load(f)
+                with job.phase('media_load'):
+                    with open(media_path, 'r') as f:
+                        media_dict = json.load(f)
             except Exception as e:
-                errors.append({
+                errors.write({
                     'organism': organism,
                     'orgId': org_id,
                     'carbon_source': carbon_source,
@@ -88,25 +180,45 @@ with tqdm(total=total_sims, desc="Running draft model FBA") as pbar:
 
             # Apply media and run FBA
             try:
-                model.medium = media_dict
-                solution = model.optimize()
+                with job.phase('medium'):
+                    model_media, missing = convert_media_to_model_format(media_dict, model)
+                    medium_key = effective_medium(model_media, blocked_exchanges)
+                    screened = SCREEN_MEDIA and medium_key in solved_media
+                    if not screened:
+                        model.medium = model_media
 
-                biomass_flux = solution.objective_value
-                status = solution.status
-                prediction = 1 if biomass_flux > GROWTH_THRESHOLD else 0
+                if screened:
+                    biomass_flux, status = solved_media[medium_key]
+                elif SCREEN_MEDIA:
+                    # Only the objective value is needed, skip building fluxes
+                    with job.phase('optimize', model):
+                        biomass_flux = model.slim_optimize(error_value=float('nan'))
+                    status = model.solver.status
+                    solved_media[medium_key] = (biomass_flux, status)
+                else:
+                    with job.phase('optimize', model):
+                        solution = model.optimize()
+                    biomass_flux = solution.objective_value
+                    status = solution.status
 
-                results.append({
-                    'organism': organism,
-                    'orgId': org_id,
-                    'carbon_source': carbon_source,
-                    'media_filename': media_filename,
-                    'biomass_flux': biomass_flux,
-                    'status': status,
-                    'prediction': prediction
-                })
+                with job.phase('record'):
+                    prediction = 1 if biomass_flux > GROWTH_THRESHOLD else 0
+
+                    results.write({
+                        'organism': organism,
+                        'orgId': org_id,
+                        'carbon_source': carbon_source,
+                        'media_filename': media_filename,
+                        'biomass_flux': biomass_flux,
+                        'status': status,
+                        'prediction': prediction,
+                        'missing_compounds': ','.join(missing),
+                        'num_missing': len(missing),
+                        'screened': screened
+                    })
 
             except Exception as e:
-                errors.append({
+                errors.write({
                     'organism': organism,
                     'orgId': org_id,
                     'carbon_source': carbon_source,
@@ -115,18 +227,42 @@ with tqdm(total=total_sims, desc="Running draft model FBA") as pbar:
 
             pbar.update(1)
 
-# Save results
-df = pd.DataFrame(results)
-df.to_csv(output_file, index=False)
+# Finish the result files and read them back for the summary
+results.close()
+errors.close()
+if len(results) == 0:
+    print("ERROR: No simulation results")
+    exit(1)
+df = pd.read_csv(output_file)
+run_df = df.iloc[n_kept_results:]
+run_errors = pd.read_csv(error_file).iloc[n_kept_errors:] if len(errors) > n_kept_errors else []
 
-print(f"\nCompleted: {len(results):,} simulations")
-print(f"Errors: {len(errors)}")
+print(f"\nCompleted: {len(run_df):,} simulations")
+print(f"  Solved with LP: {(~run_df['screened']).sum():,}")
+print(f"  Decided by screening (no solver call): {run_df['screened'].sum():,}")
+print(f"Errors: {len(run_errors)}")
 print(f"Saved to: {output_file}")
+if len(errors):
+    print(f"Error log: {error_file}")
+
+# Keep this run next to earlier ones (the CSVs above are overwritten each run)
+store = ResultsStore()
+run_id = store.start_run('fba', 'draft', source=str(output_file), parameters={
+    'growth_threshold': GROWTH_THRESHOLD,
+    'prune_blocked_reactions': PRUNE_BLOCKED_REACTIONS,
+    'screen_media': SCREEN_MEDIA,
+    'solver': solver_config.as_dict(),
+    'media': sorted(rerun_media) if rerun_media is not None else 'all',
+})
+store.append(run_id, run_df)
+store.append_errors(run_id, run_errors)
+store.close()
+print(f"Results store: run {run_id}")
 
-if errors:
-    error_df = pd.DataFrame(errors)
-    error_df.to_csv('results/draft_model_fba_errors.csv', index=False)
-    print(f"Error log: results/draft_model_fba_errors.csv")
+timings_csv, timings_jsonl = timings.write(timings_prefix)
+print(f"Timings: {timings_csv}, {timings_jsonl}")
+print(f"\nTime by phase:")
+print(timings.summary().to_string(float_format=lambda x: f"{x:.3f}"))
 
 # Quick summary
 print(f"\nPrediction summary:")
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Single-gene deletion screens on the gap-filled models, compared with RB-TnSeq fitness.
+
+Every model gene is knocked out under every simulatable carbon-source medium.
+Organisms run in parallel, one per worker; each worker loads its model once
+and keeps the same solver for all media and genes. For each medium:
+
+  1. Wild-type FBA. If the wild type does not grow, the medium is skipped
+     (knockout growth NaN).
+  2. A knockout whose GPR disables only reactions that carry no flux in the
+     wild-type solution cannot change the optimum: that solution stays
+     feasible, and removing reactions cannot raise the objective. Its growth
+     is the wild-type growth without solving. Genes whose GPR never disables
+     a reaction (e.g. isozymes) are always decided this way.
+  3. Other knockouts set the disabled reactions to (0, 0), call
+     slim_optimize() from the current basis, and restore the bounds.
+
+Per organism, results/gene_knockouts/{orgId}.npz holds the gene x condition
+array:
+  genes, carbon_sources, wild_type_growth, knockout_growth (float32),
+  solved (bool; False where the value came from step 2), model_sha256,
+  solver_key (solver_config.py; results of another solver or tolerances
+  are re-run)
+
+With feba.db available, the knockouts are joined to GeneFitness (mean fit
+and t over the carbon-source experiments whose condition_1 is the carbon
+source) on orgId:locusId, the model gene ID format. A gene is called
+essential in the model when knockout growth <= GROWTH_THRESHOLD while the
+wild type grows, and important in the fitness data when fit < -2 and t < -4.
+Genes that are essential in every condition have no GeneFitness rows (no
+viable mutants), so they drop out of the comparison.
+
+Usage:
+    python run_gene_knockouts.py                          # all organisms, then compare
+    python run_gene_knockouts.py --workers 8 --organisms ANA3 Keio
+    python run_gene_knockouts.py --compare-only --fitness-db ../data/source/feba.db
+    python run_gene_knockouts.py --solver glpk_exact --force
+"""
+
+import argparse
+import json
+import math
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gpr_compiler import CompiledGPR
+from media_format import convert_media_to_model_format
+from solver_config import SolverConfig, add_solver_arguments
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import file_sha256
+
+# Paths
+MODELS_DIR = Path('../CDMSCI-198-build-models/models')
+MEDIA_DIR = Path('../CDMSCI-197-media-formulations/media')
+SIMULATABLE_FILE = Path('results/simulatable_carbon_sources.csv')
+ORGANISM_METADATA_FILE = Path('results/organism_metadata.csv')
+FITNESS_DB = Path('../data/source/feba.db')
+OUTPUT_DIR = Path('results/gene_knockouts')
+COMPARISON_FILE = Path('results/gene_knockout_vs_fitness.csv')
+AGREEMENT_FILE = Path('results/gene_knockout_fitness_agreement.csv')
+
+GROWTH_THRESHOLD = 0.001  # h^-1
+FLUX_TOLERANCE = 1e-9     # |flux| above this counts as active
+FITNESS_THRESHOLD = -2.0  # fit below this (and t below T_THRESHOLD) = important gene
+T_THRESHOLD = -4.0
+
+def load_media(simulatable):
+    """{carbon_source: media dict} for every simulatable carbon source with a media file"""
+    media = {}
+    for _, row in simulatable.iterrows():
+        media_path = MEDIA_DIR / row['media_filename']
+        if media_path.exists():
+            with open(media_path) as f:
+                media[row['experimental_name']] = json.load(f)
+    return media
+
+
+def knockout_targets(model):
+    """{gene_id: [reactions disabled by deleting the gene]} from the compiled GPRs"""
+    targets = CompiledGPR.from_cobra(model).single_gene_targets()
+    return {gene.id: [model.reactions.get_by_id(r) for r in targets.get(gene.id, [])] for gene in model.genes}
+
+
+def output_path(org_id):
+    return OUTPUT_DIR / f"{org_id}.npz"
+
+
+def is_up_to_date(org_id, model_path, carbon_sources, solver_config):
+    path = output_path(org_id)
+    if not path.exists():
+        return False
+    with np.load(path) as data:
+        return (str(data['model_sha256']) == file_sha256(model_path)
+                and 'solver_key' in data.files and str(data['solver_key']) == solver_config.key()
+                and list(data['carbon_sources']) == list(carbon_sources))
+
+
+def screen_organism(org_id, model_path, media, solver_config):
+    """Worker: knockout growth for every gene x medium of one model; writes the npz"""
+    start_time = time.time()
+    model = solver_config.load_model(model_path)
+    targets = knockout_targets(model)
+    genes = [gene.id for gene in model.genes]
+    carbon_sources = list(media)
+
+    wild_type = np.full(len(carbon_sources), np.nan)
+    knockout = np.full((len(genes), len(carbon_sources)), np.nan, dtype=np.float32)
+    solved = np.zeros((len(genes), len(carbon_sources)), dtype=bool)
+
+    for j, carbon_source in enumerate(carbon_sources):
+        model.medium = convert_media_to_model_format(media[carbon_source], model)[0]
+        solution = model.optimize()
+        if solution.status != 'optimal':
+            continue
+        wild_type[j] = solution.objective_value
+        if wild_type[j] <= GROWTH_THRESHOLD:
+            continue
+
+        fluxes = solution.fluxes
+        active = set(fluxes.index[fluxes.abs() > FLUX_TOLERANCE])
+        for i, gene_id in enumerate(genes):
+            disabled = targets[gene_id]
+            if not any(rxn.id in active for rxn in disabled):
+                knockout[i, j] = wild_type[j]
+                continue
+            saved_bounds = [rxn.bounds for rxn in disabled]
+            for rxn in disabled:
+                rxn.bounds = (0, 0)
+            growth = model.slim_optimize(error_value=math.nan)
+            for rxn, bounds in zip(disabled, saved_bounds):
+                rxn.bounds = bounds
+            knockout[i, j] = max(growth, 0.0) if not math.isnan(growth) else 0.0
+            solved[i, j] = True
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(output_path(org_id), genes=np.array(genes), carbon_sources=np.array(carbon_sources),
+                        wild_type_growth=wild_type, knockout_growth=knockout, solved=solved,
+                        model_sha256=np.array(file_sha256(model_path)), solver_key=np.array(solver_config.key()))
+
+    growing = ~np.isnan(wild_type) & (wild_type > GROWTH_THRESHOLD)
+    essential = (knockout <= GROWTH_THRESHOLD) & growing[None, :]
+    return {
+        'orgId': org_id,
+        'genes': len(genes),
+        'genes_without_effect': sum(1 for disabled in targets.values() if not disabled),
+        'media': len(carbon_sources),
+        'media_growing': int(growing.sum()),
+        'knockouts': int(growing.sum()) * len(genes),
+        'knockouts_solved': int(solved.sum()),
+        'essential_calls': int(essential.sum()),
+        'elapsed_seconds': round(time.time() - start_time, 1),
+    }
+
+
+def load_knockouts(org_id):
+    """Long table (gene x carbon source) for one organism, growing media only"""
+    with np.load(output_path(org_id)) as data:
+        genes, carbon_sources = data['genes'], data['carbon_sources']
+        wild_type, knockout, solved = data['wild_type_growth'], data['knockout_growth'], data['solved']
+    growing = np.flatnonzero(~np.isnan(wild_type) & (wild_type > GROWTH_THRESHOLD))
+    gene_index, media_index = np.meshgrid(np.arange(len(genes)), growing, indexing='ij')
+    df = pd.DataFrame({
+        'orgId': org_id,
+        'gene_id': genes[gene_index.ravel()],
+        'carbon_source': carbon_sources[media_index.ravel()],
+        'wild_type_growth': wild_type[media_index.ravel()],
+        'knockout_growth': knockout[gene_index.ravel(), media_index.ravel()],
+        'solved': solved[gene_index.ravel(), media_index.ravel()],
+    })
+    df['locusId'] = df['gene_id'].str.split(':', n=1).str[1]
+    df['growth_ratio'] = df['knockout_growth'] / df['wild_type_growth']
+    df['model_essential'] = df['knockout_growth'] <= GROWTH_THRESHOLD
+    return df
+
+
+def load_carbon_fitness(db_path, org_ids):
+    """Mean fit and t per (orgId, locusId, carbon source) over carbon-source experiments"""
+    placeholders = ', '.join('?' * len(org_ids))
+    query = f"""
+        SELECT gf.orgId, gf.locusId, e.condition_1 AS carbon_source,
+               AVG(gf.fit) AS fit, AVG(gf.t) AS t, COUNT(*) AS n_experiments
+        FROM GeneFitness gf
+        JOIN Experiment e ON gf.orgId = e.orgId AND gf.expName = e.expName
+        WHERE e.expGroup = 'carbon source' AND gf.orgId IN ({placeholders})
+        GROUP BY gf.orgId, gf.locusId, e.condition_1
+    """
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return pd.read_sql_query(query, conn, params=list(org_ids))
+    finally:
+        conn.close()
+
+
+def compare_with_fitness(org_ids, db_path):
+    """Join knockouts to GeneFitness; returns (joined rows, per-organism agreement)"""
+    knockouts = pd.concat([load_knockouts(org_id) for org_id in org_ids], ignore_index=True)
+    fitness = load_carbon_fitness(db_path, org_ids)
+    joined = knockouts.merge(fitness, on=['orgId', 'locusId', 'carbon_source'])
+    joined['fitness_important'] = (joined['fit'] < FITNESS_THRESHOLD) & (joined['t'] < T_THRESHOLD)
+
+    outcome = 2 * joined['fitness_important'].astype(int) + joined['model_essential'].astype(int)
+    counts = pd.crosstab(joined['orgId'], outcome).reindex(columns=range(4), fill_value=0)
+    counts.columns = ['TN', 'FP', 'FN', 'TP']
+    counts.loc['ALL'] = counts.sum()
+    agreement = counts.reset_index()
+    n = agreement[['TN', 'FP', 'FN', 'TP']].sum(axis=1)
+    agreement['n_comparisons'] = n
+    agreement['accuracy'] = (agreement['TP'] + agreement['TN']) / n
+    agreement['precision'] = agreement['TP'] / (agreement['TP'] + agreement['FP']).replace(0, np.nan)
+    agreement['recall'] = agreement['TP'] / (agreement['TP'] + agreement['FN']).replace(0, np.nan)
+    return joined, agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single-gene deletion screens compared with RB-TnSeq fitness')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel workers (default: CPU count)')
+    parser.add_argument('--organisms', nargs='+', help='Only these orgIds')
+    parser.add_argument('--force', action='store_true', help='Re-run organisms with up-to-date results')
+    parser.add_argument('--compare-only', action='store_true', help='Skip simulation, only join to fitness data')
+    parser.add_argument('--fitness-db', default=str(FITNESS_DB), help='Fitness Browser database (feba.db)')
+    add_solver_arguments(parser)
+    args = parser.parse_args()
+    solver_config = SolverConfig.from_args(args)
+
+    start_time = time.time()
+    simulatable = pd.read_csv(SIMULATABLE_FILE)
+    organism_metadata = pd.read_csv(ORGANISM_METADATA_FILE)
+    org_ids = args.organisms or organism_metadata['orgId'].tolist()
+    media = load_media(simulatable)
+
+    model_paths = {org_id: MODELS_DIR / f"{org_id}_gapfilled.json" for org_id in org_ids}
+    for org_id, model_path in list(model_paths.items()):
+        if not model_path.exists():
+            print(f"  WARNING: Gap-filled model not found for {org_id}")
+            del model_paths[org_id]
+
+    if not args.compare_only:
+        to_run = [org_id for org_id, model_path in model_paths.items()
+                  if args.force or not is_up_to_date(org_id, model_path, media, solver_config)]
+        print(f"Organisms: {len(model_paths)} ({len(model_paths) - len(to_run)} up to date)")
+        print(f"Media: {len(media)}")
+        print(f"Solver: {solver_config.describe()}")
+        print()
+
+        stats = []
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(screen_organism, org_id, model_paths[org_id], media, solver_config): org_id
+                       for org_id in to_run}
+            for i, future in enumerate(as_completed(futures), 1):
+                org_id = futures[future]
+                try:
+                    s = future.result()
+                except Exception as e:
+                    print(f"[{i}/{len(to_run)}] {org_id}: ERROR {e}")
+                    continue
+                stats.append(s)
+                print(f"[{i}/{len(to_run)}] {org_id}: {s['genes']} genes x {s['media_growing']} growing media, "
+                      f"{s['knockouts_solved']:,}/{s['knockouts']:,} knockouts solved, "
+                      f"{s['essential_calls']:,} essential calls ({s['elapsed_seconds']:.1f} s)")
+
+        if stats:
+            total = sum(s['knockouts'] for s in stats)
+            solved = sum(s['knockouts_solved'] for s in stats)
+            print(f"\nKnockouts: {total:,} ({solved:,} solved, {total - solved:,} decided from the wild-type solution)")
+
+    if not Path(args.fitness_db).exists():
+        print(f"\nFitness database not found: {args.fitness_db} (skipping comparison)")
+    else:
+        screened = [org_id for org_id in model_paths if output_path(org_id).exists()]
+        joined, agreement = compare_with_fitness(screened, args.fitness_db)
+        joined.to_csv(COMPARISON_FILE, index=False)
+        agreement.to_csv(AGREEMENT_FILE, index=False)
+        print(f"\nModel essentiality vs fitness: {len(joined):,} gene x condition pairs")
+        print(agreement[agreement['orgId'] == 'ALL'].to_string(index=False))
+        print(f"Saved: {COMPARISON_FILE}")
+        print(f"Saved: {AGREEMENT_FILE}")
+
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+FBA sweep (organism x carbon source) that only recomputes changed cells.
+
+Every cell result is cached in results/fba_cell_cache.sqlite under
+    (SHA-256 of the model file, SHA-256 of the media file, solver key)
+so a cell is only re-solved when its model or its medium changed. Models
+whose cells are all cached are not even loaded. After add_exchanges_optimized.py
+corrects three models, the corrected sweep re-solves those three organisms'
+~360 cells and takes every other cell from the cache.
+
+Simulation is the same as notebook 01: media compounds are converted to
+EX_{cpd}_e0 uptake bounds (compounds without an exchange are listed in
+missing_compounds), model.medium is set and the biomass objective optimized.
+The growth threshold is applied when writing results, so changing it never
+invalidates the cache. The solver key (solver_config.py) is the solver
+interface plus any setting that can change a solution, so switching the
+solver or its tolerances re-solves every cell.
+
+Variants (model file per organism, by genome_id):
+    draft      ../CDMSCI-198-build-models/models/{genome_id}_draft.json
+    gapfilled  ../CDMSCI-198-build-models/models/{genome_id}_gapfilled.json
+    corrected  models_missing_exchanges/{genome_id}_gapfilled_corrected.json,
+               falling back to the gapfilled model (as in notebook 04)
+
+Output: the notebook 01 columns (organism, orgId, carbon_source,
+media_filename, biomass_flux, status, prediction, missing_compounds,
+num_missing) plus model_file and cached, in OUTPUT_FILES[variant]; the rows
+are also appended to the results store (results_store.py).
+
+Usage:
+    python run_incremental_fba.py --variant corrected
+    python run_incremental_fba.py --variant gapfilled --organisms ANA3 Keio --output /tmp/subset.csv
+    python run_incremental_fba.py --variant corrected --dry-run     # count invalidated cells only
+    python run_incremental_fba.py --variant corrected --solver glpk_exact
+    python run_incremental_fba.py --cache-info
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from tqdm import tqdm
+
+from media_format import convert_media_to_model_format
+from results_store import ResultsStore
+from solver_config import SolverConfig, add_solver_arguments
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import file_sha256
+
+# Paths
+MODELS_DIR = Path('../CDMSCI-198-build-models/models')
+CORRECTED_DIR = Path('models_missing_exchanges')
+MEDIA_DIR = Path('../CDMSCI-197-media-formulations/media')
+SIMULATABLE_FILE = Path('results/simulatable_carbon_sources.csv')
+ORGANISM_METADATA_FILE = Path('results/organism_metadata.csv')
+CACHE_FILE = Path('results/fba_cell_cache.sqlite')
+OUTPUT_FILES = {
+    'draft': Path('results/draft_model_fba_incremental_results.csv'),
+    'gapfilled': Path('results/fba_simulation_results.csv'),
+    'corrected': Path('results/fba_simulation_results_corrected.csv'),
+}
+
+GROWTH_THRESHOLD = 0.001  # h^-1
+
+def model_path_for(genome_id, variant):
+    """Model file of one organism for a variant, or None if it does not exist"""
+    if variant == 'corrected':
+        corrected = CORRECTED_DIR / f'{genome_id}_gapfilled_corrected.json'
+        if corrected.exists():
+            return corrected
+        variant = 'gapfilled'
+    path = MODELS_DIR / f'{genome_id}_{variant}.json'
+    return path if path.exists() else None
+
+
+class CellCache:
+    """SQLite cache of FBA results keyed by (model SHA-256, medium SHA-256, solver key)"""
+
+    def __init__(self, path=CACHE_FILE):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS cells (
+                    model_sha256 TEXT NOT NULL,
+                    medium_sha256 TEXT NOT NULL,
+                    solver TEXT NOT NULL,
+                    biomass_flux REAL,
+                    status TEXT,
+                    missing_compounds TEXT,
+                    created_at TEXT,
+                    PRIMARY KEY (model_sha256, medium_sha256, solver)
+                )""")
+
+    def lookup(self, model_sha, solver):
+        """{medium SHA-256: (biomass_flux, status, missing_compounds)} cached for one model"""
+        rows = self.conn.execute(
+            "SELECT medium_sha256, biomass_flux, status, missing_compounds FROM cells "
+            "WHERE model_sha256 = ? AND solver = ?", (model_sha, solver))
+        return {medium_sha: tuple(values) for medium_sha, *values in rows}
+
+    def store(self, model_sha, solver, cells):
+        """Save {medium SHA-256: (biomass_flux, status, missing_compounds)} for one model"""
+        created_at = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(model_sha, medium_sha, solver, *values, created_at) for medium_sha, values in cells.items()])
+
+    def info(self):
+        return pd.read_sql_query(
+            "SELECT solver, COUNT(DISTINCT model_sha256) AS models, COUNT(DISTINCT medium_sha256) AS media, "
+            "COUNT(*) AS cells, MAX(created_at) AS newest FROM cells GROUP BY solver", self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+def solve_cells(model_path, media, medium_hashes, solver_config):
+    """
+    Load one model and solve it on each medium with the configured solver.
+
+    media: {media_filename: media dict}. Returns {medium SHA-256:
+    (biomass_flux, status, missing_compounds)}.
+    """
+    model = solver_config.load_model(model_path)
+    cells = {}
+    for media_filename, media_dict in media.items():
+        model_media, missing = convert_media_to_model_format(media_dict, model)
+        model.medium = model_media
+        biomass_flux = model.slim_optimize(error_value=float('nan'))
+        cells[medium_hashes[media_filename]] = (biomass_flux, model.solver.status, ','.join(missing))
+    return cells
+
+
+def run_sweep(variant, organism_metadata, simulatable, cache, solver_config, dry_run=False):
+    """Result rows for every organism x carbon source, solving only uncached cells"""
+    media_paths = {name: MEDIA_DIR / name for name in simulatable['media_filename'].unique()}
+    missing_media = sorted(name for name, path in media_paths.items() if not path.exists())
+    if missing_media:
+        print(f"WARNING: {len(missing_media)} media files not found, e.g. {missing_media[:3]}")
+    medium_hashes = {name: file_sha256(path) for name, path in media_paths.items() if path.exists()}
+    solver = solver_config.key()
+
+    rows, stats = [], {'cells': 0, 'cached': 0, 'solved': 0, 'models_loaded': 0}
+    for _, org_row in tqdm(organism_metadata.iterrows(), total=len(organism_metadata), desc=f"FBA ({variant})"):
+        model_path = model_path_for(org_row['genome_id'], variant)
+        if model_path is None:
+            tqdm.write(f"  WARNING: No {variant} model for {org_row['orgId']}")
+            continue
+        model_sha = file_sha256(model_path)
+        cached = cache.lookup(model_sha, solver)
+        todo = {name: medium_hashes[name] for name in medium_hashes if medium_hashes[name] not in cached}
+        stats['cells'] += len(medium_hashes)
+        stats['solved'] += len(todo)
+        stats['cached'] += len(medium_hashes) - len(todo)
+        if dry_run:
+            continue
+
+        if todo:
+            media = {}
+            for name in todo:
+                with open(media_paths[name]) as f:
+                    media[name] = json.load(f)
+            try:
+                new_cells = solve_cells(model_path, media, medium_hashes, solver_config)
+            except Exception as e:
+                tqdm.write(f"  ERROR: {org_row['orgId']}: {e}")
+                continue
+            stats['models_loaded'] += 1
+            cache.store(model_sha, solver, new_cells)
+            cached.update(new_cells)
+
+        for _, cs_row in simulatable.iterrows():
+            medium_sha = medium_hashes.get(cs_row['media_filename'])
+            if medium_sha is None:
+                continue
+            biomass_flux, status, missing = cached[medium_sha]
+            missing = missing or ''
+            rows.append({
+                'organism': org_row['organism'],
+                'orgId': org_row['orgId'],
+                'carbon_source': cs_row['experimental_name'],
+                'media_filename': cs_row['media_filename'],
+                'biomass_flux': biomass_flux,
+                'status': status,
+                'prediction': 1 if biomass_flux > GROWTH_THRESHOLD else 0,
+                'missing_compounds': missing,
+                'num_missing': len(missing.split(',')) if missing else 0,
+                'model_file': model_path.name,
+                'cached': cs_row['media_filename'] not in todo,
+            })
+    return pd.DataFrame(rows), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental FBA sweep with a per-cell result cache')
+    parser.add_argument('--variant', choices=list(OUTPUT_FILES), default='corrected')
+    parser.add_argument('--organisms', nargs='+', help='Only these orgIds (needs --output unless --dry-run)')
+    parser.add_argument('--output', type=Path, help='Results CSV (default depends on --variant)')
+    parser.add_argument('--cache', type=Path, default=CACHE_FILE, help='Cell cache (SQLite)')
+    parser.add_argument('--dry-run', action='store_true', help='Only count cached and invalidated cells')
+    parser.add_argument('--cache-info', action='store_true', help='Summarize the cache and exit')
+    add_solver_arguments(parser)
+    args = parser.parse_args()
+    if args.organisms and not (args.output or args.dry_run or args.cache_info):
+        # A subset must not replace the full results that evaluate_predictions.py reads
+        parser.error(f"--organisms needs --output (would overwrite {OUTPUT_FILES[args.variant]} with a subset)")
+    solver_config = SolverConfig.from_args(args)
+
+    cache = CellCache(args.cache)
+    if args.cache_info:
+        print(cache.info().to_string(index=False))
+        cache.close()
+        return
+
+    start_time = time.time()
+    organism_metadata = pd.read_csv(ORGANISM_METADATA_FILE)
+    if args.organisms:
+        organism_metadata = organism_metadata[organism_metadata['orgId'].isin(args.organisms)]
+    simulatable = pd.read_csv(SIMULATABLE_FILE)
+    print(f"Variant: {args.variant}, {len(organism_metadata)} organisms x {len(simulatable)} carbon sources")
+    print(f"Solver: {solver_config.describe()}")
+
+    df, stats = run_sweep(args.variant, organism_metadata, simulatable, cache, solver_config, args.dry_run)
+    cache.close()
+    print(f"\nCells: {stats['cells']:,} ({stats['cached']:,} cached, {stats['solved']:,} "
+          f"{'to solve' if args.dry_run else 'solved'})")
+    if args.dry_run:
+        print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+        return
+
+    output_file = args.output or OUTPUT_FILES[args.variant]
+    df.to_csv(output_file, index=False)
+    print(f"Models loaded: {stats['models_loaded']}")
+    print(f"Growth predicted: {df['prediction'].sum():,} of {len(df):,}")
+    print(f"Saved: {output_file}")
+
+    store = ResultsStore()
+    run_id = store.start_run('fba', args.variant, source=str(output_file), parameters={
+        'growth_threshold': GROWTH_THRESHOLD,
+        'solver': solver_config.as_dict(),
+        'solver_key': solver_config.key(),
+        'incremental': True,
+        'cells_solved': stats['solved'],
+    })
+    store.append(run_id, df)
+    store.close()
+    print(f"Results store: run {run_id}")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+LP/MILP solver settings shared by the FBA and gap-filling runners.
+
+The runners used to take whatever solver cobra picked, with its default
+tolerances. They now all read the same settings, from (later wins):
+
+  1. solver_config.json next to this file, or the file named by the
+     SOLVER_CONFIG environment variable
+  2. --solver-config, --solver, --solver-timeout and --solver-threads of the
+     scripts that have a command line (add_solver_arguments)
+
+Settings (null or missing = the solver's default):
+    solver       cobra solver name: glpk, glpk_exact, hybrid (HiGHS), cplex, gurobi
+    feasibility  primal feasibility tolerance (also model.tolerance)
+    optimality   optimality (dual feasibility) tolerance
+    integrality  integer tolerance of the gap-filling MILPs
+    timeout      whole seconds per solve; a solve that hits it gets status time_limit
+    threads      solver threads
+    presolve     true, false or "auto"
+
+A setting the active solver does not have (GLPK has neither an optimality
+tolerance nor threads) is skipped with one warning per solver.
+
+The models' problem is built directly in the configured solver: load_model()
+sets cobra's default solver before loading, so no GLPK problem is built and
+then converted. gapfill() passes the integrality tolerance to cobra's
+GapFiller, which otherwise always uses 1e-6.
+
+Usage:
+    from solver_config import SolverConfig, add_solver_arguments
+
+    solver_config = SolverConfig.load()                 # or SolverConfig.from_args(args)
+    model = solver_config.load_model(model_path)
+    solutions = solver_config.gapfill(model, universal, demand_reactions=False)
+
+    python solver_config.py                             # active settings and installed solvers
+    python solver_config.py --solver glpk_exact --solver-timeout 60
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import cobra
+from cobra.util.solver import solvers
+
+CONFIG_FILE = Path(__file__).resolve().parent / 'solver_config.json'
+
+SETTINGS = ['solver', 'feasibility', 'optimality', 'integrality', 'timeout', 'threads', 'presolve']
+
+# Settings that do not change solutions and stay out of key()
+PERFORMANCE_SETTINGS = ['threads']
+
+_warned = set()
+
+
+def available_solvers():
+    """cobra solver names installed in this environment"""
+    return sorted(solvers)
+
+
+def _has_setting(configuration, name):
+    """True if an optlang solver configuration implements the setting"""
+    return isinstance(getattr(type(configuration), name, None), property)
+
+
+class SolverConfig:
+    """Solver name and settings, applied to cobra models"""
+
+    def __init__(self, **settings):
+        unknown = sorted(set(settings) - set(SETTINGS))
+        if unknown:
+            raise ValueError(f"Unknown solver settings: {unknown} (expected {SETTINGS})")
+        for name in SETTINGS:
+            setattr(self, name, settings.get(name))
+        if self.timeout is not None:
+            # GLPK only takes whole seconds
+            self.timeout = int(self.timeout)
+        if self.solver is not None and self.solver not in solvers:
+            raise ValueError(f"Solver {self.solver!r} is not installed (available: {available_solvers()})")
+
+    @classmethod
+    def load(cls, path=None):
+        """Settings from a JSON file (default: $SOLVER_CONFIG, then solver_config.json)"""
+        path = Path(path or os.environ.get('SOLVER_CONFIG') or CONFIG_FILE)
+        if not path.exists():
+            if path == CONFIG_FILE:
+                return cls()
+            raise FileNotFoundError(f"Solver config not found: {path}")
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    @classmethod
+    def from_args(cls, args):
+        """Settings file plus the command-line overrides of add_solver_arguments()"""
+        config = cls.load(args.solver_config)
+        overrides = {'solver': args.solver, 'timeout': args.solver_timeout, 'threads': args.solver_threads}
+        return config.replace(**{name: value for name, value in overrides.items() if value is not None})
+
+    def replace(self, **settings):
+        """Copy with some settings changed"""
+        return SolverConfig(**{**self.as_dict(), **settings})
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in SETTINGS}
+
+    def interface(self):
+        """optlang interface module used for new models"""
+        return solvers[self.solver] if self.solver else cobra.Configuration().solver
+
+    def key(self):
+        """
+        Identifies results this configuration can reproduce, e.g. for caches.
+
+        The optlang interface name (optlang.glpk_interface) when only the solver
+        is set, so results of the default settings keep their key; otherwise the
+        interface plus the settings that can change a solution.
+        """
+        settings = {name: value for name, value in self.as_dict().items()
+                    if value is not None and name != 'solver' and name not in PERFORMANCE_SETTINGS}
+        key = self.interface().__name__
+        return f"{key} {json.dumps(settings, sort_keys=True)}" if settings else key
+
+    def describe(self):
+        settings = ', '.join(f"{name}={value}" for name, value in self.as_dict().items()
+                             if value is not None and name != 'solver')
+        name = self.solver or self.interface().__name__.split('.')[-1]
+        return f"{name} ({settings})" if settings else name
+
+    def apply_global(self):
+        """Make the configured solver cobra's default for models created from now on"""
+        if self.solver:
+            cobra.Configuration().solver = self.solver
+
+    def apply(self, model):
+        """Switch a cobra model to the configured solver and settings; returns the model"""
+        if self.solver and model.solver.interface is not solvers[self.solver]:
+            model.solver = self.solver
+        configuration = model.solver.configuration
+        if self.feasibility is not None:
+            model.tolerance = self.feasibility
+        for name in ['optimality', 'integrality']:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            try:
+                setattr(configuration.tolerances, name, value)
+            except AttributeError:
+                self._unsupported(model, f'{name} tolerance')
+        for name in ['timeout', 'presolve', 'threads']:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if _has_setting(configuration, name):
+                setattr(configuration, name, value)
+            else:
+                self._unsupported(model, name)
+        return model
+
+    def load_model(self, path):
+        """cobra.io.load_json_model() with the problem built in the configured solver"""
+        self.apply_global()
+        return self.apply(cobra.io.load_json_model(str(path)))
+
+    def gapfill(self, model, universal, iterations=1, **kwargs):
+        """cobra.flux_analysis.gapfill() using the configured integrality tolerance"""
+        from cobra.flux_analysis.gapfilling import GapFiller
+        if self.integrality is not None:
+            kwargs.setdefault('integer_threshold', self.integrality)
+        return GapFiller(self.apply(model), universal, **kwargs).fill(iterations=iterations)
+
+    @staticmethod
+    def _unsupported(model, name):
+        interface = model.solver.interface.__name__
+        if (interface, name) not in _warned:
+            _warned.add((interface, name))
+            print(f"WARNING: {interface} has no {name} setting, using its default")
+
+
+def add_solver_arguments(parser):
+    """--solver-config, --solver, --solver-timeout, --solver-threads (see SolverConfig.from_args)"""
+    group = parser.add_argument_group('solver')
+    group.add_argument('--solver-config', type=Path,
+                       help=f'Solver settings JSON (default: $SOLVER_CONFIG or {CONFIG_FILE.name})')
+    group.add_argument('--solver', help=f'Solver to use (installed: {", ".join(available_solvers())})')
+    group.add_argument('--solver-timeout', type=int, help='Time limit per solve (s)')
+    group.add_argument('--solver-threads', type=int, help='Solver threads')
+    return group
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the solver settings the runners will use')
+    add_solver_arguments(parser)
+    args = parser.parse_args()
+
+    config = SolverConfig.from_args(args)
+    print(f"Solver: {config.describe()}")
+    print(f"Cache key: {config.key()}")
+    print("\nInstalled solvers:")
+    model = cobra.Model('probe')
+    for name in available_solvers():
+        model.solver = name
+        configuration = model.solver.configuration
+        supported = [f"{t} tolerance" for t in ['feasibility', 'optimality', 'integrality']
+                     if t in dir(configuration.tolerances)]
+        supported += [s for s in ['timeout', 'presolve', 'threads'] if _has_setting(configuration, s)]
+        print(f"  {name:12s} {', '.join(supported)}")
+
+
+if __name__ == "__main__":
+    main()
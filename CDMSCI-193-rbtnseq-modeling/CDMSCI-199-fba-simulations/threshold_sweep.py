@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Growth-threshold sweep and ROC / precision-recall curves from stored fluxes.
+
+The runners call growth when biomass_flux > GROWTH_THRESHOLD (0.001 h^-1).
+This script re-scores the biomass_flux column of existing results CSVs at
+any number of thresholds, so choosing a cut-off needs no new FBA.
+
+For a sorted threshold grid t_0 < t_1 < ..., np.searchsorted gives each
+cell the number of thresholds below its flux, i.e. the thresholds at which
+it is called growth. A bincount of that index per (group, observed) and a
+reverse cumulative sum then give TP and FP for every group at every
+threshold at once; FN and TN follow from the group totals. Metrics use
+evaluate_predictions.metrics_from_counts.
+
+Two grids are evaluated:
+  - a dense log-spaced grid (plus 0 and 0.001) for the threshold sweep
+  - every distinct flux value for exact ROC and PR curves, ROC AUC and
+    average precision, globally and per organism
+
+Usage:
+    python threshold_sweep.py                                   # results/fba_simulation_results.csv
+    python threshold_sweep.py --predictions results/fba_simulation_results.csv \\
+        results/draft_model_fba_results.csv --names gapfilled draft
+    python threshold_sweep.py --grid-min 1e-6 --grid-max 1 --grid-points 300
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from evaluate_predictions import EXPERIMENTAL_FILE, METRICS, OUTCOMES, PREDICTIONS_FILE, \
+    load_experimental, load_prediction_runs, metrics_from_counts
+
+GROWTH_THRESHOLD = 0.001  # h^-1, threshold used by the runners
+OUTPUT_PREFIX = 'results/threshold_sweep'
+ALL_ORGANISMS = 'ALL'
+
+
+def align_fluxes(predictions, observed, flux_column='biomass_flux'):
+    """Join the fluxes of each run to the observations (cells without either are dropped)"""
+    runs = []
+    for run, df in predictions.items():
+        df = df[['organism', 'carbon_source', flux_column]].dropna(subset=[flux_column])
+        runs.append(df.rename(columns={flux_column: 'flux'}).assign(run=run))
+    return pd.concat(runs, ignore_index=True).merge(observed, on=['organism', 'carbon_source'])
+
+
+def threshold_grid(grid_min=1e-8, grid_max=10.0, n_points=161):
+    """Log-spaced thresholds plus 0 and GROWTH_THRESHOLD"""
+    grid = np.concatenate([[0.0, GROWTH_THRESHOLD], np.logspace(np.log10(grid_min), np.log10(grid_max), n_points)])
+    return np.unique(grid)
+
+
+def sweep_counts(group_index, n_groups, flux, observed, thresholds):
+    """
+    Confusion counts (n_groups, n_thresholds, 4) for the calls flux > threshold.
+
+    `thresholds` must be sorted ascending.
+    """
+    n_thresholds = len(thresholds)
+    # A cell is called growth at thresholds[j] for every j < below
+    below = np.searchsorted(thresholds, flux, side='left')
+    index = (group_index * 2 + observed) * (n_thresholds + 1) + below
+    hist = np.bincount(index, minlength=n_groups * 2 * (n_thresholds + 1)).reshape(n_groups, 2, n_thresholds + 1)
+    # called[g, o, j] = cells with below > j
+    called = hist[:, :, ::-1].cumsum(axis=2)[:, :, ::-1][:, :, 1:]
+    totals = hist.sum(axis=2)
+
+    counts = np.empty((n_groups, n_thresholds, 4), dtype=np.int64)
+    counts[..., 1] = called[:, 0]                      # FP
+    counts[..., 3] = called[:, 1]                      # TP
+    counts[..., 0] = totals[:, 0, None] - called[:, 0]  # TN
+    counts[..., 2] = totals[:, 1, None] - called[:, 1]  # FN
+    return counts
+
+
+def _group_index(aligned, by_organism):
+    keys = ['run', 'organism'] if by_organism else ['run']
+    grouped = aligned.groupby(keys, sort=True)
+    groups = grouped.size().index.to_frame(index=False)
+    if not by_organism:
+        groups['organism'] = ALL_ORGANISMS
+    return grouped.ngroup().to_numpy(), groups[['run', 'organism']]
+
+
+def sweep(aligned, thresholds, by_organism=False):
+    """Long table: one row per run x organism x threshold with counts and metrics"""
+    group_index, groups = _group_index(aligned, by_organism)
+    counts = sweep_counts(group_index, len(groups), aligned['flux'].to_numpy(),
+                          aligned['observed'].to_numpy().astype(np.int64), thresholds)
+
+    table = groups.loc[groups.index.repeat(len(thresholds))].reset_index(drop=True)
+    table['threshold'] = np.tile(thresholds, len(groups))
+    flat = counts.reshape(-1, 4)
+    for i, outcome in enumerate(OUTCOMES):
+        table[outcome] = flat[:, i]
+    for metric, values in metrics_from_counts(flat).items():
+        table[metric] = values
+    return table
+
+
+def curves(aligned, by_organism=False):
+    """
+    Exact ROC / PR curves (thresholds at every distinct flux) and their summaries.
+
+    Returns (curve table, summary table with roc_auc and average_precision).
+    """
+    thresholds = np.unique(np.concatenate([[-np.inf], aligned['flux'].to_numpy()]))
+    group_index, groups = _group_index(aligned, by_organism)
+    counts = sweep_counts(group_index, len(groups), aligned['flux'].to_numpy(),
+                          aligned['observed'].to_numpy().astype(np.int64), thresholds)
+    tn, fp, fn, tp = (counts[..., i].astype(float) for i in range(4))
+    positives, negatives = tp + fn, tn + fp
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = np.where(positives > 0, tp / positives, np.nan)
+        fpr = np.where(negatives > 0, fp / negatives, np.nan)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+
+    # Thresholds ascend, so the curves run from (1, 1) down to (0, 0)
+    roc_auc = -np.sum(np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1)
+    # Average precision: sum over operating points of (recall step) x precision
+    average_precision = -np.sum(np.diff(tpr, axis=1) * precision[:, :-1], axis=1)
+
+    n = len(thresholds)
+    curve = groups.loc[groups.index.repeat(n)].reset_index(drop=True)
+    curve['threshold'] = np.tile(thresholds, len(groups))
+    curve['tpr'] = tpr.ravel()
+    curve['fpr'] = fpr.ravel()
+    curve['precision'] = precision.ravel()
+    # Keep only the points where the curve moves
+    moved = np.ones_like(tpr, dtype=bool)
+    moved[:, 1:] = (np.diff(tp, axis=1) != 0) | (np.diff(fp, axis=1) != 0)
+    curve = curve[moved.ravel()].reset_index(drop=True)
+
+    summary = groups.copy()
+    summary['positives'] = positives[:, 0].astype(int)
+    summary['negatives'] = negatives[:, 0].astype(int)
+    summary['roc_auc'] = roc_auc
+    summary['average_precision'] = average_precision
+    return curve, summary
+
+
+def best_thresholds(table):
+    """Per run x organism: threshold with the best F1, best Youden's J, and the metrics at 0.001"""
+    table = table.assign(youden_j=table['recall'] + table['specificity'] - 1)
+    rows = []
+    for (run, organism), group in table.groupby(['run', 'organism'], sort=True):
+        best_f1 = group.loc[group['f1_score'].idxmax()]
+        best_j = group.loc[group['youden_j'].idxmax()]
+        current = group.loc[(group['threshold'] - GROWTH_THRESHOLD).abs().idxmin()]
+        rows.append({
+            'run': run, 'organism': organism,
+            'best_f1_threshold': best_f1['threshold'], 'best_f1': best_f1['f1_score'],
+            'best_f1_accuracy': best_f1['accuracy'],
+            'best_youden_threshold': best_j['threshold'], 'best_youden_j': best_j['youden_j'],
+            'f1_at_0.001': current['f1_score'], 'accuracy_at_0.001': current['accuracy'],
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep the growth threshold over stored biomass fluxes')
+    parser.add_argument('--predictions', nargs='+', default=[str(PREDICTIONS_FILE)],
+                        help='Results CSVs with organism, carbon_source and biomass_flux, one run each')
+    parser.add_argument('--names', nargs='+', help='Run names (default: file stems)')
+    parser.add_argument('--column', default='biomass_flux', help='Flux column (default: biomass_flux)')
+    parser.add_argument('--experimental', default=str(EXPERIMENTAL_FILE), help='Experimental growth matrix')
+    parser.add_argument('--grid-min', type=float, default=1e-8, help='Smallest non-zero threshold')
+    parser.add_argument('--grid-max', type=float, default=10.0, help='Largest threshold')
+    parser.add_argument('--grid-points', type=int, default=161, help='Log-spaced thresholds in the grid')
+    parser.add_argument('--output-prefix', default=OUTPUT_PREFIX, help='Output prefix for the CSVs')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    observed = load_experimental(args.experimental)
+    aligned = align_fluxes(load_prediction_runs(args.predictions, args.names), observed, args.column)
+    thresholds = threshold_grid(args.grid_min, args.grid_max, args.grid_points)
+    print(f"Comparable cells: {len(aligned):,}; thresholds in grid: {len(thresholds)}")
+
+    sweep_table = pd.concat([sweep(aligned, thresholds), sweep(aligned, thresholds, by_organism=True)],
+                            ignore_index=True)
+    curve_parts = [curves(aligned), curves(aligned, by_organism=True)]
+    curve_table = pd.concat([part[0] for part in curve_parts], ignore_index=True)
+    summary = pd.concat([part[1] for part in curve_parts], ignore_index=True)
+    summary = summary.merge(best_thresholds(sweep_table), on=['run', 'organism'])
+    elapsed = time.time() - start_time
+
+    print("\nGlobal")
+    columns = ['run', 'roc_auc', 'average_precision', 'best_f1_threshold', 'best_f1', 'f1_at_0.001',
+               'best_youden_threshold', 'best_youden_j']
+    print(summary[summary['organism'] == ALL_ORGANISMS][columns].to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+    at_current = sweep_table[(sweep_table['organism'] == ALL_ORGANISMS)
+                             & np.isclose(sweep_table['threshold'], GROWTH_THRESHOLD)]
+    print(f"\nAt threshold {GROWTH_THRESHOLD}")
+    print(at_current[['run'] + OUTCOMES + METRICS].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    Path(args.output_prefix).parent.mkdir(parents=True, exist_ok=True)
+    outputs = {'grid': sweep_table, 'curves': curve_table, 'summary': summary}
+    for name, table in outputs.items():
+        output_file = f"{args.output_prefix}_{name}.csv"
+        table.to_csv(output_file, index=False)
+        print(f"Saved: {output_file} ({len(table):,} rows)")
+
+    print(f"\nSweep computed in {elapsed:.2f} seconds")
+    print(f"Completed in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
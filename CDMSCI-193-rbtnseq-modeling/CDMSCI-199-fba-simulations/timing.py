@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Per-phase timing for the FBA and gap-filling runners.
+
+Each job (one organism, or one organism x carbon source) records how long
+every phase took - load, medium, optimize, gapfill, add_reactions,
+reoptimize, ... - plus the solver status and simplex iteration count for
+phases that solve an LP. Records are written as:
+  - {prefix}.csv    one row per job x phase
+  - {prefix}.jsonl  one JSON object per job with all its phases
+
+Usage:
+    from timing import TimingRecorder
+
+    timings = TimingRecorder()
+    job = timings.job(orgId='ANA3', carbon_source='D-Glucose')
+    with job.phase('load'):
+        model = cobra.io.load_json_model(path)
+    with job.phase('optimize', model):
+        solution = model.optimize()
+
+    timings.write('results/draft_model_fba_timings')
+    print(timings.summary().to_string())
+
+Summarize an existing timings file:
+    python timing.py results/draft_model_fba_timings.csv
+"""
+
+import argparse
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+
+def solver_iteration_count(model):
+    """
+    Simplex iteration counter of the model's solver, or None if unknown.
+
+    GLPK keeps a running count over all solves of a problem, CPLEX and
+    Gurobi report the last solve only.
+    """
+    interface = model.solver.interface.__name__
+    problem = model.solver.problem
+    try:
+        if 'glpk' in interface:
+            import swiglpk
+            return swiglpk.glp_get_it_cnt(problem)
+        if 'cplex' in interface:
+            return problem.solution.progress.get_num_iterations()
+        if 'gurobi' in interface:
+            return int(problem.IterCount)
+    except Exception:
+        return None
+    return None
+
+
+class JobTimer:
+    """Phase timings for one job"""
+
+    def __init__(self, job_id, **fields):
+        self.job_id = job_id
+        self.fields = fields
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name, model=None):
+        """
+        Time a block. If `model` is given, the solver status and the number
+        of simplex iterations spent in the block are recorded as well.
+        """
+        cumulative = model is not None and 'glpk' in model.solver.interface.__name__
+        iterations_before = solver_iteration_count(model) if cumulative else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {'phase': name, 'seconds': time.perf_counter() - start,
+                      'status': None, 'iterations': None}
+            if model is not None:
+                record['status'] = model.solver.status
+                iterations = solver_iteration_count(model)
+                if iterations is not None and iterations_before is not None:
+                    iterations -= iterations_before
+                record['iterations'] = iterations
+            self.phases.append(record)
+
+    def as_dict(self):
+        """JSONL record: job fields, total seconds and the list of phases"""
+        return {'job_id': self.job_id, **self.fields,
+                'total_seconds': sum(p['seconds'] for p in self.phases),
+                'phases': self.phases}
+
+
+class TimingRecorder:
+    """Collects JobTimers for a run and writes them out"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def job(self, **fields):
+        """Start timing a new job identified by `fields` (orgId, carbon_source, ...)"""
+        job = JobTimer(len(self.jobs), **fields)
+        self.jobs.append(job)
+        return job
+
+    def to_dataframe(self):
+        """One row per job x phase"""
+        rows = []
+        for job in self.jobs:
+            for phase in job.phases:
+                rows.append({'job_id': job.job_id, **job.fields, **phase})
+        return pd.DataFrame(rows)
+
+    def summary(self):
+        """Per-phase totals and distribution, largest share of wall time first"""
+        return summarize_timings(self.to_dataframe())
+
+    def write(self, prefix):
+        """Write {prefix}.csv and {prefix}.jsonl; returns the two paths"""
+        prefix = Path(prefix)
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        csv_path = prefix.with_suffix('.csv')
+        jsonl_path = prefix.with_suffix('.jsonl')
+
+        self.to_dataframe().to_csv(csv_path, index=False)
+        with open(jsonl_path, 'w') as f:
+            for job in self.jobs:
+                f.write(json.dumps(job.as_dict(), default=str) + '\n')
+
+        return csv_path, jsonl_path
+
+
+def summarize_timings(timings_df):
+    """Summary table from the per-phase timings (as written to {prefix}.csv)"""
+    if len(timings_df) == 0:
+        return pd.DataFrame()
+
+    grouped = timings_df.groupby('phase', sort=False)
+    summary = pd.DataFrame({
+        'count': grouped['seconds'].count(),
+        'total_s': grouped['seconds'].sum(),
+        'mean_ms': grouped['seconds'].mean() * 1000,
+        'median_ms': grouped['seconds'].median() * 1000,
+        'max_ms': grouped['seconds'].max() * 1000,
+        'mean_iterations': grouped['iterations'].mean(),
+    })
+    summary['share'] = summary['total_s'] / summary['total_s'].sum()
+    return summary.sort_values('total_s', ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a per-phase timings CSV')
+    parser.add_argument('timings_file', type=Path, help='Timings CSV written by one of the runners')
+    args = parser.parse_args()
+
+    timings_df = pd.read_csv(args.timings_file)
+    print(f"Jobs: {timings_df['job_id'].nunique():,}")
+    if timings_df['status'].notna().any():
+        print(f"Solver status: {timings_df['status'].value_counts().to_dict()}")
+    print()
+    print(summarize_timings(timings_df).to_string(float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite work queue for running FBA and gap-filling jobs on many nodes.
+
+Jobs are (task, variant, organism, carbon source) with task 'fba' (biomass
+flux on the medium) or 'gapfill' (condition-specific gap-filling of the
+model on the medium, as in run_condition_specific_gapfilling.py, with the
+universal model of --template, GramNegModelTemplateV6 by default). The queue
+file lives on a filesystem every node can reach; each node runs one or more
+workers:
+
+  - claim:     in one BEGIN IMMEDIATE transaction a worker takes the next
+               pending job (preferring the organism whose model it already
+               has loaded) and marks it claimed with its worker ID
+  - heartbeat: the job runs in the worker's job process (a forked child
+               that keeps the last model loaded) while the worker refreshes
+               the job's heartbeat_at every --heartbeat seconds. GLPK holds
+               the GIL while it solves, so a thread next to the solve could
+               not heartbeat during a long gap-filling MILP
+  - reclaim:   claims whose heartbeat is older than --stale-after seconds
+               (worker crashed or node lost) go back to pending; after
+               --max-attempts they are marked failed
+  - complete:  the result (JSON) is written only if the job is still claimed
+               by this worker, so a reclaimed job is never recorded twice
+
+The database uses the default rollback journal (WAL does not work on network
+filesystems) and a long busy timeout; keep --stale-after well above the clock
+difference between nodes.
+
+Workers solve with the settings of solver_config.py (solver_config.json on
+the shared filesystem, or the --solver* options given to the worker).
+
+--collect writes the finished jobs to results/work_queue_{task}_{variant}.csv
+(the columns of fba_simulation_results.csv or
+condition_specific_gapfilling_results.csv) and to the results store.
+
+Usage:
+    python work_queue.py --enqueue --task fba --variant gapfilled
+    python work_queue.py --enqueue --task gapfill --variant draft                   # every organism x carbon source
+    python work_queue.py --enqueue --task gapfill --variant draft --false-negatives # only results/false_negatives.csv
+    python work_queue.py --worker                          # on each node (any number of times)
+    python work_queue.py --local 4                         # 4 local worker processes standing in for nodes
+    python work_queue.py --status
+    python work_queue.py --collect --task fba --variant gapfilled
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pandas as pd
+from cobra.exceptions import Infeasible
+
+from media_format import convert_media_to_model_format
+from results_store import ResultsStore
+from solver_config import SolverConfig, add_solver_arguments
+
+sys.path.insert(0, str(Path('../references/build_metabolic_model')))
+from template_cache import GRAMNEG_TEMPLATE_PATH, load_universal_model
+from run_incremental_fba import MEDIA_DIR, ORGANISM_METADATA_FILE, SIMULATABLE_FILE, model_path_for
+
+# Paths
+QUEUE_FILE = Path('results/work_queue.sqlite')
+FALSE_NEGATIVES_FILE = Path('results/false_negatives.csv')
+
+TASKS = ['fba', 'gapfill']
+STORE_KIND = {'fba': 'fba', 'gapfill': 'gapfilling'}
+GROWTH_THRESHOLD = 0.001  # h^-1
+HEARTBEAT_INTERVAL = 30   # seconds
+STALE_AFTER = 300         # seconds without heartbeat before a claim is reclaimed
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 5         # seconds between claim attempts when nothing is pending
+
+
+def connect(path):
+    """Autocommit connection; transactions are opened explicitly with BEGIN IMMEDIATE"""
+    conn = sqlite3.connect(str(path), timeout=120, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 120000")
+    return conn
+
+
+class WorkQueue:
+    """Job table shared by all workers"""
+
+    def __init__(self, path=QUEUE_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY,
+                task TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                orgId TEXT NOT NULL,
+                organism TEXT,
+                genome_id TEXT NOT NULL,
+                carbon_source TEXT NOT NULL,
+                media_filename TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT,
+                UNIQUE (task, variant, orgId, carbon_source)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, orgId, job_id)")
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, task, variant, cells):
+        """Add jobs for rows of (orgId, organism, genome_id, carbon_source, media_filename); existing jobs are kept"""
+        before = self.conn.total_changes
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO jobs (task, variant, orgId, organism, genome_id, carbon_source, media_filename) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(task, variant, *row) for row in cells[['orgId', 'organism', 'genome_id', 'carbon_source',
+                                                       'media_filename']].itertuples(index=False, name=None)])
+        self.conn.execute("COMMIT")
+        return self.conn.total_changes - before
+
+    def reclaim(self, stale_after=STALE_AFTER, max_attempts=MAX_ATTEMPTS):
+        """Return stale claims to pending (or failed after max_attempts); returns the number reclaimed"""
+        cutoff = time.time() - stale_after
+        self.conn.execute("BEGIN IMMEDIATE")
+        failed = self.conn.execute(
+            "UPDATE jobs SET state = 'failed', error = 'heartbeat lost after ' || attempts || ' attempts' "
+            "WHERE state = 'claimed' AND heartbeat_at < ? AND attempts >= ?", (cutoff, max_attempts)).rowcount
+        reclaimed = self.conn.execute(
+            "UPDATE jobs SET state = 'pending', worker = NULL, error = 'heartbeat lost (' || worker || ')' "
+            "WHERE state = 'claimed' AND heartbeat_at < ?", (cutoff,)).rowcount
+        self.conn.execute("COMMIT")
+        return reclaimed + failed
+
+    def claim(self, worker, prefer_org=None):
+        """Atomically claim one pending job (same organism as prefer_org if possible); None if none pending"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = None
+            if prefer_org is not None:
+                row = self.conn.execute("SELECT job_id FROM jobs WHERE state = 'pending' AND orgId = ? "
+                                        "ORDER BY job_id LIMIT 1", (prefer_org,)).fetchone()
+            if row is None:
+                row = self.conn.execute("SELECT job_id FROM jobs WHERE state = 'pending' "
+                                        "ORDER BY job_id LIMIT 1").fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute("UPDATE jobs SET state = 'claimed', worker = ?, claimed_at = ?, heartbeat_at = ?, "
+                              "attempts = attempts + 1 WHERE job_id = ?", (worker, now, now, row['job_id']))
+            job = dict(self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row['job_id'],)).fetchone())
+            self.conn.execute("COMMIT")
+            return job
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, job_id, worker):
+        self.conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND worker = ? AND state = 'claimed'",
+                          (time.time(), job_id, worker))
+
+    def complete(self, job_id, worker, result):
+        """Record a result; False if the claim was lost (job reclaimed by another worker)"""
+        return self.conn.execute(
+            "UPDATE jobs SET state = 'done', result = ?, error = NULL, finished_at = ? "
+            "WHERE job_id = ? AND worker = ? AND state = 'claimed'",
+            (json.dumps(result), time.time(), job_id, worker)).rowcount == 1
+
+    def fail(self, job_id, worker, error, max_attempts=MAX_ATTEMPTS):
+        """Return a failed job to pending, or mark it failed after max_attempts"""
+        self.conn.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, error = ?, finished_at = ? WHERE job_id = ? AND worker = ? AND state = 'claimed'",
+            (max_attempts, error, time.time(), job_id, worker))
+
+    def status(self):
+        """Job counts by task, variant and state"""
+        return pd.read_sql_query("SELECT task, variant, state, COUNT(*) AS jobs, COUNT(DISTINCT worker) AS workers "
+                                 "FROM jobs GROUP BY task, variant, state ORDER BY task, variant, state", self.conn)
+
+    def jobs(self, task, variant, states=('done', 'failed')):
+        return pd.read_sql_query(
+            f"SELECT * FROM jobs WHERE task = ? AND variant = ? AND state IN ({', '.join('?' * len(states))}) "
+            "ORDER BY job_id", self.conn, params=[task, variant, *states])
+
+
+class JobRunner:
+    """Runs jobs, keeping the last loaded model (workers prefer jobs of the same organism)"""
+
+    def __init__(self, solver_config=None, template_path=GRAMNEG_TEMPLATE_PATH):
+        self.solver_config = solver_config or SolverConfig.load()
+        self.template_path = template_path
+        self.model_path = None
+        self.model = None
+        self.universal = None
+
+    def load_model(self, job):
+        model_path = model_path_for(job['genome_id'], job['variant'])
+        if model_path is None:
+            raise FileNotFoundError(f"No {job['variant']} model for {job['genome_id']}")
+        if model_path != self.model_path:
+            self.model = self.solver_config.load_model(model_path)
+            self.model_path = model_path
+        return self.model
+
+    def run(self, job):
+        """Result dict of one job (columns of the matching results CSV)"""
+        model = self.load_model(job)
+        with open(MEDIA_DIR / job['media_filename']) as f:
+            media_dict = json.load(f)
+        base = {'organism': job['organism'], 'orgId': job['orgId'], 'carbon_source': job['carbon_source'],
+                'media_filename': job['media_filename']}
+
+        with model:
+            model_media, missing = convert_media_to_model_format(media_dict, model)
+            model.medium = model_media
+            biomass_flux = model.slim_optimize(error_value=float('nan'))
+            if job['task'] == 'fba':
+                return {**base, 'biomass_flux': biomass_flux, 'status': model.solver.status,
+                        'prediction': int(biomass_flux > GROWTH_THRESHOLD), 'missing_compounds': ','.join(missing),
+                        'num_missing': len(missing)}
+
+            pre_gapfill_flux = 0.0 if biomass_flux != biomass_flux else biomass_flux
+            if pre_gapfill_flux > GROWTH_THRESHOLD:
+                return {**base, 'pre_gapfill_flux': pre_gapfill_flux, 'post_gapfill_flux': pre_gapfill_flux,
+                        'gapfill_success': True, 'num_reactions_added': 0, 'reactions_added': '',
+                        'gapfill_solutions_count': 0}
+
+            if self.universal is None:
+                self.universal = load_universal_model(self.template_path)
+            try:
+                solutions = self.solver_config.gapfill(model, self.universal, demand_reactions=False)
+            except Infeasible:
+                # No gap-filling solution is a result, not a job to retry
+                solutions = []
+            added = list(solutions[0]) if solutions else []
+            model.add_reactions([reaction.copy() for reaction in added])
+            post_gapfill_flux = model.slim_optimize(error_value=0.0) if added else 0.0
+            return {**base, 'pre_gapfill_flux': pre_gapfill_flux, 'post_gapfill_flux': post_gapfill_flux,
+                    'gapfill_success': post_gapfill_flux > GROWTH_THRESHOLD, 'num_reactions_added': len(added),
+                    'reactions_added': ';'.join(r.id for r in added), 'gapfill_solutions_count': len(solutions)}
+
+
+# JobRunner of a worker's job process (set by _init_job_process)
+_runner = None
+
+
+def _init_job_process(solver_config, template_path):
+    global _runner
+    _runner = JobRunner(solver_config, template_path)
+
+
+def _run_job(job):
+    return _runner.run(job)
+
+
+def _job_process(solver_config, template_path):
+    """One forked process that runs a worker's jobs and keeps its loaded model between them"""
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork'),
+                               initializer=_init_job_process, initargs=(solver_config, template_path))
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker(queue_path=QUEUE_FILE, worker=None, max_jobs=None, exit_when_idle=True,
+               heartbeat_interval=HEARTBEAT_INTERVAL, stale_after=STALE_AFTER, max_attempts=MAX_ATTEMPTS,
+               solver_config=None, template_path=GRAMNEG_TEMPLATE_PATH):
+    """Claim and run jobs until the queue is drained (or max_jobs); returns the number completed"""
+    worker = worker or default_worker_id()
+    queue = WorkQueue(queue_path)
+    solver_config = solver_config or SolverConfig.load()
+    executor = _job_process(solver_config, template_path)
+    last_org = None
+    completed = 0
+    try:
+        while max_jobs is None or completed < max_jobs:
+            queue.reclaim(stale_after, max_attempts)
+            job = queue.claim(worker, prefer_org=last_org)
+            if job is None:
+                running = queue.conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'claimed'").fetchone()[0]
+                if exit_when_idle and running == 0:
+                    break
+                # Other workers still hold jobs; one may die and its job come back
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            # Solve in the job process; this process stays free to heartbeat
+            future = executor.submit(_run_job, job)
+            while not wait([future], timeout=heartbeat_interval).done:
+                try:
+                    queue.heartbeat(job['job_id'], worker)
+                except sqlite3.OperationalError as e:
+                    print(f"WARNING: {worker}: heartbeat failed: {e}", flush=True)
+            last_org = job['orgId']
+            try:
+                result = future.result()
+            except Exception as e:
+                queue.fail(job['job_id'], worker, f"{type(e).__name__}: {e}", max_attempts)
+                print(f"  ERROR: {worker}: job {job['job_id']} ({job['orgId']}, {job['carbon_source']}): {e}",
+                      flush=True)
+                if isinstance(e, BrokenProcessPool):
+                    # The job process died (e.g. out of memory); start a new one
+                    executor.shutdown(wait=False)
+                    executor = _job_process(solver_config, template_path)
+                    last_org = None
+                continue
+            if queue.complete(job['job_id'], worker, result):
+                completed += 1
+            else:
+                print(f"  WARNING: {worker}: job {job['job_id']} was reclaimed before it finished, result dropped",
+                      flush=True)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        queue.close()
+    return completed
+
+
+def _local_worker(queue_path, worker, kwargs):
+    completed = run_worker(queue_path, worker, **kwargs)
+    print(f"  {worker}: {completed} jobs", flush=True)
+
+
+def enqueue_cells(task, variant, organisms=None, false_negatives=False):
+    """Organism x carbon source rows to enqueue"""
+    organism_metadata = pd.read_csv(ORGANISM_METADATA_FILE)
+    simulatable = pd.read_csv(SIMULATABLE_FILE).rename(columns={'experimental_name': 'carbon_source'})
+    cells = organism_metadata.merge(simulatable[['carbon_source', 'media_filename']], how='cross')
+    if false_negatives:
+        fn = pd.read_csv(FALSE_NEGATIVES_FILE)[['organism', 'carbon_source']]
+        cells = cells.merge(fn, on=['organism', 'carbon_source'])
+    if organisms:
+        cells = cells[cells['orgId'].isin(organisms)]
+    return cells
+
+
+def collect(queue, task, variant, output_file=None):
+    """Write finished jobs to a CSV and the results store; returns (results, errors) DataFrames"""
+    jobs = queue.jobs(task, variant)
+    done = jobs[jobs['state'] == 'done']
+    results = pd.DataFrame([json.loads(r) for r in done['result']])
+    errors = jobs.loc[jobs['state'] == 'failed', ['orgId', 'organism', 'carbon_source', 'error']]
+
+    output_file = output_file or Path(f'results/work_queue_{task}_{variant}.csv')
+    results.to_csv(output_file, index=False)
+    store = ResultsStore()
+    run_id = store.start_run(STORE_KIND[task], variant, source=str(queue.path), parameters={
+        'growth_threshold': GROWTH_THRESHOLD, 'queue': str(queue.path),
+        'workers': sorted(done['worker'].dropna().unique().tolist()),
+    })
+    store.append(run_id, results)
+    store.append_errors(run_id, errors)
+    store.close()
+    return results, errors, output_file, run_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared SQLite work queue for FBA and gap-filling jobs')
+    parser.add_argument('--queue', type=Path, default=QUEUE_FILE, help='Queue database on a shared filesystem')
+    parser.add_argument('--enqueue', action='store_true', help='Add organism x carbon source jobs')
+    parser.add_argument('--worker', action='store_true', help='Run one worker on this node')
+    parser.add_argument('--local', type=int, metavar='N', help='Run N local worker processes')
+    parser.add_argument('--status', action='store_true', help='Job counts by state')
+    parser.add_argument('--reclaim', action='store_true', help='Return stale claims to pending now')
+    parser.add_argument('--collect', action='store_true', help='Write finished jobs to CSV and the results store')
+    parser.add_argument('--task', choices=TASKS, default='fba')
+    parser.add_argument('--variant', choices=['draft', 'gapfilled', 'corrected'], default='gapfilled')
+    parser.add_argument('--organisms', nargs='+', help='Only enqueue these orgIds')
+    parser.add_argument('--false-negatives', action='store_true', help=f'Only enqueue pairs in {FALSE_NEGATIVES_FILE}')
+    parser.add_argument('--worker-id', help='Worker name (default: hostname-pid)')
+    parser.add_argument('--max-jobs', type=int, help='Stop a worker after this many jobs')
+    parser.add_argument('--keep-polling', action='store_true', help='Keep workers waiting for new jobs')
+    parser.add_argument('--heartbeat', type=float, default=HEARTBEAT_INTERVAL, help='Heartbeat interval (s)')
+    parser.add_argument('--stale-after', type=float, default=STALE_AFTER, help='Reclaim claims older than this (s)')
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='Attempts before a job fails')
+    parser.add_argument('--output', type=Path, help='CSV for --collect')
+    parser.add_argument('--template', type=Path, default=GRAMNEG_TEMPLATE_PATH,
+                        help='ModelSEED template whose reactions gap-filling can add')
+    add_solver_arguments(parser)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    queue = WorkQueue(args.queue)
+    worker_kwargs = {'max_jobs': args.max_jobs, 'exit_when_idle': not args.keep_polling,
+                     'heartbeat_interval': args.heartbeat, 'stale_after': args.stale_after,
+                     'max_attempts': args.max_attempts, 'template_path': args.template}
+    if args.worker or args.local:
+        worker_kwargs['solver_config'] = SolverConfig.from_args(args)
+        print(f"Solver: {worker_kwargs['solver_config'].describe()}")
+
+    if args.enqueue:
+        cells = enqueue_cells(args.task, args.variant, args.organisms, args.false_negatives)
+        added = queue.enqueue(args.task, args.variant, cells)
+        print(f"Enqueued {added:,} new {args.task} ({args.variant}) jobs ({len(cells) - added:,} already queued)")
+
+    if args.reclaim:
+        print(f"Reclaimed {queue.reclaim(args.stale_after, args.max_attempts)} stale claims")
+
+    if args.worker:
+        worker = args.worker_id or default_worker_id()
+        print(f"Worker {worker} on {args.queue}")
+        print(f"  {worker}: {run_worker(args.queue, worker, **worker_kwargs)} jobs")
+
+    if args.local:
+        print(f"Starting {args.local} local workers on {args.queue}")
+        processes = [multiprocessing.Process(target=_local_worker,
+                                             args=(args.queue, f"{socket.gethostname()}-local{i}", worker_kwargs))
+                     for i in range(args.local)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    if args.collect:
+        results, errors, output_file, run_id = collect(queue, args.task, args.variant, args.output)
+        print(f"Collected {len(results):,} results and {len(errors):,} failed jobs")
+        print(f"Saved: {output_file}; results store run {run_id}")
+
+    if args.status or not (args.enqueue or args.reclaim or args.worker or args.local or args.collect):
+        status = queue.status()
+        print(status.to_string(index=False) if len(status) else f"No jobs in {args.queue}")
+
+    queue.close()
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Extract protein sequences from feba.db (Gene + ScaffoldSeq) to FASTA files.
+
+Creates one _proteins.fasta file per organism in data/raw/protein_sequences/,
+in the same format as the Fitness Browser download used for RAST annotation:
+
+    >ANA3:7022746 Shewana3_0001 16S rRNA methyltransferase GidB (RefSeq)
+
+Each organism is processed on its own (one organism's scaffolds and genes in
+memory at a time, never the whole database):
+  1. Scaffolds are encoded as uint8 arrays (A=0, C=1, G=2, T=3, other=4).
+  2. Codon start positions of every protein-coding gene (Gene.type = 1) are
+     generated at once; minus-strand genes read backwards and complemented.
+  3. Codons are translated with a 65-entry lookup table (genetic code 11;
+     codons with N etc. give X). Alternative start codons become M and the
+     final stop codon is dropped.
+Organisms are processed in parallel, one worker process per organism.
+
+Usage:
+    python extract_protein_sequences.py
+    python extract_protein_sequences.py --orgs Keio ANA3 --overwrite
+    python extract_protein_sequences.py --output-dir data/processed/protein_sequences --workers 8
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+# Paths
+DB_PATH = "data/source/feba.db"
+OUTPUT_DIR = Path("data/raw/protein_sequences")
+LINE_WIDTH = 60
+
+# Genetic code 11 in TCAG order; codon index below uses A=0, C=1, G=2, T=3
+_BASES = 'TCAG'
+_AMINO_ACIDS = 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG'
+_START_CODONS = ['TTG', 'CTG', 'ATT', 'ATC', 'ATA', 'ATG', 'GTG']
+
+BASE_CODE = np.full(256, 4, dtype=np.uint8)
+for _i, _base in enumerate(b'ACGT'):
+    BASE_CODE[_base] = _i
+    BASE_CODE[ord(chr(_base).lower())] = _i
+COMPLEMENT = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+
+
+def _codon_index(codon):
+    return sum(4 ** (2 - k) * 'ACGT'.index(base) for k, base in enumerate(codon))
+
+
+CODON_TABLE = np.full(65, ord('X'), dtype=np.uint8)
+IS_START = np.zeros(65, dtype=bool)
+for _i, _aa in enumerate(_AMINO_ACIDS):
+    CODON_TABLE[_codon_index(_BASES[_i // 16] + _BASES[_i // 4 % 4] + _BASES[_i % 4])] = ord(_aa)
+for _codon in _START_CODONS:
+    IS_START[_codon_index(_codon)] = True
+
+
+def encode_scaffolds(scaffolds):
+    """Concatenate scaffold sequences into one code array; returns (codes, {scaffoldId: offset})"""
+    offsets, parts, position = {}, [], 0
+    for scaffold_id, sequence in scaffolds:
+        offsets[scaffold_id] = position
+        parts.append(BASE_CODE[np.frombuffer(sequence.encode('ascii'), dtype=np.uint8)])
+        position += len(sequence)
+    return (np.concatenate(parts) if parts else np.empty(0, dtype=np.uint8)), offsets
+
+
+def translate_genes(codes, first_base, strand, n_codons):
+    """
+    Translate many CDSs at once.
+
+    first_base: position in `codes` of each gene's first coding base (the
+    highest coordinate for minus-strand genes). Returns (amino acid bytes,
+    protein start offsets) - protein i is aa[starts[i]:starts[i + 1]].
+    """
+    step = np.where(strand == '-', -1, 1)
+    gene = np.repeat(np.arange(len(first_base)), n_codons)
+    starts = np.concatenate([[0], np.cumsum(n_codons)])
+    codon_number = np.arange(len(gene)) - starts[:-1][gene]
+    position = first_base[gene] + 3 * step[gene] * codon_number
+
+    bases = [codes[position + k * step[gene]] for k in range(3)]
+    minus = step[gene] < 0
+    bases = [np.where(minus, COMPLEMENT[b], b) for b in bases]
+    index = np.where((bases[0] > 3) | (bases[1] > 3) | (bases[2] > 3), 64,
+                     16 * bases[0].astype(np.int64) + 4 * bases[1] + bases[2])
+
+    aa = CODON_TABLE[index]
+    aa[(codon_number == 0) & IS_START[index]] = ord('M')
+
+    # Drop the terminal stop codon of each gene
+    last = starts[1:] - 1
+    has_stop = (n_codons > 0) & (aa[np.maximum(last, 0)] == ord('*'))
+    keep = np.ones(len(aa), dtype=bool)
+    keep[last[has_stop]] = False
+    lengths = n_codons - has_stop
+    return aa[keep].tobytes(), np.concatenate([[0], np.cumsum(lengths)])
+
+
+def extract_organism(db_path, org_id, output_file):
+    """Write one organism's protein FASTA; returns summary counts"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT scaffoldId, sequence FROM ScaffoldSeq WHERE orgId = ?", (org_id,))
+        codes, offsets = encode_scaffolds(cursor.fetchall())
+        cursor.execute("""
+            SELECT locusId, sysName, desc, scaffoldId, begin, end, strand
+            FROM Gene
+            WHERE orgId = ? AND type = 1
+            ORDER BY scaffoldId, begin
+        """, (org_id,))
+        genes = cursor.fetchall()
+    finally:
+        conn.close()
+
+    n_genes = len(genes)
+    genes = [g for g in genes if g[3] in offsets]
+    n_missing_scaffold = n_genes - len(genes)
+    if not genes:
+        return {'orgId': org_id, 'proteins': 0, 'partial': 0, 'internal_stops': 0,
+                'missing_scaffold': n_missing_scaffold}
+
+    scaffold_offset = np.array([offsets[g[3]] for g in genes], dtype=np.int64)
+    begin = np.array([int(g[4]) for g in genes], dtype=np.int64)
+    end = np.array([int(g[5]) for g in genes], dtype=np.int64)
+    strand = np.array([g[6] for g in genes])
+    length = end - begin + 1
+    first_base = scaffold_offset + np.where(strand == '-', end, begin) - 1
+    aa, starts = translate_genes(codes, first_base, strand, length // 3)
+
+    tmp_file = output_file.with_suffix('.fasta.tmp')
+    with open(tmp_file, 'w') as f:
+        for i, (locus_id, sys_name, desc, *_) in enumerate(genes):
+            f.write(f">{org_id}:{locus_id} {sys_name or ''} {desc or ''}".rstrip() + '\n')
+            protein = aa[starts[i]:starts[i + 1]].decode('ascii')
+            for j in range(0, len(protein), LINE_WIDTH):
+                f.write(protein[j:j + LINE_WIDTH] + '\n')
+    os.replace(tmp_file, output_file)
+
+    return {
+        'orgId': org_id,
+        'proteins': len(genes),
+        'partial': int((length % 3 != 0).sum()),
+        'internal_stops': aa.count(b'*'),
+        'missing_scaffold': n_missing_scaffold,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract protein FASTA files from feba.db')
+    parser.add_argument('--db', default=DB_PATH, help='Fitness Browser database (feba.db)')
+    parser.add_argument('--output-dir', default=str(OUTPUT_DIR), help='Where to write {orgId}_proteins.fasta')
+    parser.add_argument('--orgs', nargs='+', help='Only these orgIds (default: all organisms with genes)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Parallel worker processes')
+    parser.add_argument('--overwrite', action='store_true', help='Replace existing FASTA files')
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    organisms = [row[0] for row in conn.execute("SELECT DISTINCT orgId FROM Gene ORDER BY orgId")]
+    conn.close()
+    if args.orgs:
+        unknown = sorted(set(args.orgs) - set(organisms))
+        if unknown:
+            print(f"WARNING: Not in feba.db Gene table: {', '.join(unknown)}")
+        organisms = [org_id for org_id in organisms if org_id in args.orgs]
+
+    jobs = {org_id: output_dir / f"{org_id}_proteins.fasta" for org_id in organisms}
+    skipped = [org_id for org_id, path in jobs.items() if path.exists() and not args.overwrite]
+    for org_id in skipped:
+        del jobs[org_id]
+    print(f"Extracting protein sequences for {len(jobs)} organisms from {args.db} "
+          f"({len(skipped)} existing files skipped)\n")
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(extract_organism, args.db, org_id, path): org_id for org_id, path in jobs.items()}
+        for i, future in enumerate(as_completed(futures), 1):
+            org_id = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"[{i}/{len(jobs)}] ERROR: {org_id}: {e}")
+                continue
+            notes = []
+            if stats['partial']:
+                notes.append(f"{stats['partial']} with length not a multiple of 3")
+            if stats['missing_scaffold']:
+                notes.append(f"{stats['missing_scaffold']} skipped, scaffold not in ScaffoldSeq")
+            if stats['internal_stops']:
+                notes.append(f"{stats['internal_stops']} internal stops")
+            print(f"[{i}/{len(jobs)}] {org_id}: {stats['proteins']:,} proteins"
+                  + (f" (WARNING: {'; '.join(notes)})" if notes else ''))
+
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
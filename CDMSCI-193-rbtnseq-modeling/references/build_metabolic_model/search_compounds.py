@@ -18,6 +18,8 @@ from pathlib import Path
 from urllib.request import urlopen, URLError
 from urllib.parse import quote
 
+from template_cache import load_template_json
+
 # Configuration
 TEMPLATE_PATH = Path(__file__).parent / 'GramNegModelTemplateV6.json'
 SOLR_URL = 'https://modelseed.org/solr/compounds/select'
@@ -29,8 +31,7 @@ def search_template_by_name(compound_name, template_path=TEMPLATE_PATH):
         print(f"Error: Template file not found at {template_path}")
         return []
 
-    with open(template_path) as f:
-        template = json.load(f)
+    template = load_template_json(template_path)
 
     matches = []
     search_lower = compound_name.lower()
@@ -62,8 +63,7 @@ def search_template_by_id(compound_id, template_path=TEMPLATE_PATH):
         print(f"Error: Template file not found at {template_path}")
         return None
 
-    with open(template_path) as f:
-        template = json.load(f)
+    template = load_template_json(template_path)
 
     for compound in template['compounds']:
         if compound['id'] == compound_id:
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Cache for ModelSEED templates and derived models
+
+Parsing GramNegModelTemplateV6.json and running
+MSTemplateBuilder.from_dict(...).build() takes far longer than loading the
+built object back from a pickle. This module stores, next to the templates
+in .template_cache/:
+
+  - the parsed template JSON              (load_template_json)
+  - the built MSTemplate                  (load_template)
+  - the universal cobra model derived from a template, used for
+    gap-filling (load_universal_model)
+
+Each entry is keyed by the SHA-256 of the source file plus the modelseedpy /
+cobra version, so editing a template or upgrading a library rebuilds it on
+the next call. Older entries for the same file are removed when a new one is
+written. Within a process, repeated calls return the same object without
+reading the file again.
+
+The universal model holds every template reaction, named like the draft
+models built by MSBuilder: rxn#####_c0 / cpd#####_e0 with " [c0]" name
+suffixes, bounds from the template reaction direction, and no biomass or
+exchange reactions (the draft models have their own exchanges).
+
+Usage from other stages:
+    sys.path.insert(0, '../references/build_metabolic_model')
+    from template_cache import load_template
+    template_gramneg = load_template('../references/build_metabolic_model/GramNegModelTemplateV6.json')
+    universal = load_universal_model()      # GramNegModelTemplateV6 as a cobra model
+
+Command line:
+    python template_cache.py --warm      # build caches for Core-V5.2, GramNegModelTemplateV6 and its universal model
+    python template_cache.py --info      # list cache entries
+    python template_cache.py --clear     # delete all cache entries
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).resolve().parent
+CACHE_DIR = TEMPLATE_DIR / '.template_cache'
+CORE_TEMPLATE_PATH = TEMPLATE_DIR / 'Core-V5.2.json'
+GRAMNEG_TEMPLATE_PATH = TEMPLATE_DIR / 'GramNegModelTemplateV6.json'
+
+# Bump when build_universal_model() changes, so old cache entries are rebuilt
+UNIVERSAL_FORMAT = 1
+
+# Bounds of template reactions by direction
+DIRECTION_BOUNDS = {'>': (0, 1000), '<': (-1000, 0), '=': (-1000, 1000)}
+
+# Objects already loaded in this process, keyed by (resolved source path, kind)
+_loaded = {}
+
+
+def file_sha256(path):
+    """SHA-256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _library_version(kind):
+    """Version string of the library that builds a cache entry of this kind"""
+    if kind == 'template':
+        import modelseedpy
+        return f"modelseedpy-{getattr(modelseedpy, '__version__', 'unknown')}"
+    if kind == 'universal':
+        import cobra
+        return f"cobra-{cobra.__version__}-universal{UNIVERSAL_FORMAT}"
+    return 'json'
+
+
+def cache_path(source_path, kind, sha256=None):
+    """Cache file for `source_path`: .template_cache/{stem}.{kind}.{key}.pkl"""
+    source_path = Path(source_path)
+    if sha256 is None:
+        sha256 = file_sha256(source_path)
+    key = hashlib.sha256(f"{sha256}:{_library_version(kind)}".encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{source_path.stem}.{kind}.{key}.pkl"
+
+
+def _cached(source_path, kind, build):
+    """Return the cached object for (source_path, kind), building it with build() if needed"""
+    memo_key = (Path(source_path).resolve(), kind)
+    if memo_key in _loaded:
+        return _loaded[memo_key]
+
+    path = cache_path(source_path, kind)
+
+    try:
+        with open(path, 'rb') as f:
+            obj = pickle.load(f)
+    except FileNotFoundError:
+        obj = build()
+        CACHE_DIR.mkdir(exist_ok=True)
+        # Other processes may be building the same entry (e.g. work_queue.py
+        # --local workers); keep theirs and never remove the current key
+        for stale in CACHE_DIR.glob(f"{Path(source_path).stem}.{kind}.*.pkl"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        if not path.exists():
+            # Write to a temp file of our own, then rename, so an interrupted
+            # or concurrent write never leaves a broken entry
+            fd, tmp_name = tempfile.mkstemp(dir=CACHE_DIR, prefix=f"{path.stem}.", suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_name, path)
+            except BaseException:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+
+    _loaded[memo_key] = obj
+    return obj
+
+
+def load_template_json(template_path=GRAMNEG_TEMPLATE_PATH):
+    """Parsed template JSON (dict)"""
+    def build():
+        with open(template_path) as f:
+            return json.load(f)
+    return _cached(template_path, 'json', build)
+
+
+def load_template(template_path=GRAMNEG_TEMPLATE_PATH):
+    """Built MSTemplate, as MSTemplateBuilder.from_dict(json).build()"""
+    def build():
+        from modelseedpy.core.mstemplate import MSTemplateBuilder
+        return MSTemplateBuilder.from_dict(load_template_json(template_path)).build()
+    return _cached(template_path, 'template', build)
+
+
+def build_universal_model(template):
+    """cobra model with every reaction of a parsed template (see module docstring)"""
+    import cobra
+
+    compartment_names = {c['id']: c['name'] for c in template['compartments']}
+    compounds = {c['id']: c for c in template['compounds']}
+    model = cobra.Model(f"{template['id']}_universal")
+    model.compartments = {f"{c}0": name for c, name in compartment_names.items()}
+
+    metabolites = {}
+    for compcompound in template['compcompounds']:
+        cpd_id, compartment = compcompound['id'].rsplit('_', 1)
+        compound = compounds.get(cpd_id, {})
+        metabolite = cobra.Metabolite(
+            f"{compcompound['id']}0", formula=compound.get('formula') or None,
+            name=f"{compound.get('name', cpd_id)} [{compartment}0]", charge=compcompound.get('charge'),
+            compartment=f"{compartment}0")
+        metabolites[compcompound['id']] = metabolite
+
+    reactions = []
+    for template_reaction in template['reactions']:
+        reaction = cobra.Reaction(f"{template_reaction['id']}0",
+                                  name=f"{template_reaction['name']} [{template_reaction['id'].rsplit('_', 1)[1]}0]")
+        reaction.bounds = DIRECTION_BOUNDS[template_reaction['direction']]
+        reaction.add_metabolites({
+            metabolites[reagent['templatecompcompound_ref'].rsplit('/', 1)[1]]: reagent['coefficient']
+            for reagent in template_reaction['templateReactionReagents']})
+        reactions.append(reaction)
+    model.add_reactions(reactions)
+    return model
+
+
+def load_universal_model(template_path=GRAMNEG_TEMPLATE_PATH):
+    """
+    Universal cobra model of a ModelSEED template, for cobra's gapfill().
+
+    Callers that modify the model should work on a copy (or inside a
+    `with model:` block) since the object is shared within the process.
+    """
+    def build():
+        return build_universal_model(load_template_json(template_path))
+    return _cached(template_path, 'universal', build)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the ModelSEED template cache')
+    parser.add_argument('--warm', action='store_true', help='Build caches for Core-V5.2, GramNegModelTemplateV6 and its universal model')
+    parser.add_argument('--info', action='store_true', help='List cache entries')
+    parser.add_argument('--clear', action='store_true', help='Delete all cache entries')
+    args = parser.parse_args()
+
+    if args.clear:
+        entries = list(CACHE_DIR.glob('*.pkl')) if CACHE_DIR.exists() else []
+        for path in entries:
+            path.unlink()
+        print(f"Deleted {len(entries)} cache entries from {CACHE_DIR}")
+
+    if args.warm:
+        for template_path in [CORE_TEMPLATE_PATH, GRAMNEG_TEMPLATE_PATH]:
+            if not template_path.exists():
+                print(f"WARNING: Template not found: {template_path}")
+                continue
+            start_time = time.time()
+            template = load_template(template_path)
+            print(f"{template_path.name}: {len(template.reactions):,} reactions "
+                  f"({time.time() - start_time:.1f} s)")
+        if GRAMNEG_TEMPLATE_PATH.exists():
+            start_time = time.time()
+            universal = load_universal_model(GRAMNEG_TEMPLATE_PATH)
+            print(f"{GRAMNEG_TEMPLATE_PATH.name} universal model: {len(universal.reactions):,} reactions "
+                  f"({time.time() - start_time:.1f} s)")
+
+    if args.info or not (args.warm or args.clear):
+        entries = sorted(CACHE_DIR.glob('*.pkl')) if CACHE_DIR.exists() else []
+        print(f"Cache: {CACHE_DIR} ({len(entries)} entries)")
+        for path in entries:
+            print(f"  {path.name}  {path.stat().st_size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
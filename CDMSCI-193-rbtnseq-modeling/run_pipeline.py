@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Run the CDMSCI-196 -> 199 pipeline, re-running only stages whose inputs changed.
+
+Each stage in STAGES declares its working directory, command, input and
+output glob patterns (relative to the repository root). A stage's script is
+always one of its inputs. Before a stage runs, the SHA-256 of every input
+file is compared with the hashes recorded after its last successful run
+(in .pipeline_state.json). The stage is skipped when nothing changed and all
+declared outputs exist. Hashes are cached by (size, mtime), so unchanged
+files are not re-read.
+
+Stages depend on each other through their files: stage B runs after stage A
+when one of B's input patterns overlaps one of A's output patterns. Stages
+whose upstream stages are finished run in parallel (--workers). Upstream
+stages that rewrite nothing (e.g. build_media.py leaves unchanged media
+files alone) do not make downstream stages stale.
+
+Partial reruns: a stage can name one input pattern as its `partition`. When
+only files matching that pattern changed, the stage runs with
+PIPELINE_PARTITIONS set to a JSON list of the changed paths (relative to the
+stage directory). run_draft_model_simulations.py uses this to re-simulate
+only the edited media and merge them into its previous results.
+
+Notebook stages are only executed with --notebooks (jupyter nbconvert
+--execute --inplace); otherwise they are reported as stale.
+
+Usage:
+    python run_pipeline.py --dry-run          # show what would run and why
+    python run_pipeline.py                    # run stale stages
+    python run_pipeline.py --stages draft_fba evaluate_predictions
+    python run_pipeline.py --force build_media --workers 4
+    python run_pipeline.py --list
+"""
+
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(ROOT / 'references' / 'build_metabolic_model'))
+from template_cache import file_sha256
+
+STATE_FILE = ROOT / '.pipeline_state.json'
+LOG_DIR = ROOT / 'logs' / 'pipeline'
+
+C196 = 'CDMSCI-196-carbon-sources'
+C197 = 'CDMSCI-197-media-formulations'
+C198 = 'CDMSCI-198-build-models'
+C199 = 'CDMSCI-199-fba-simulations'
+REFERENCES = 'references/build_metabolic_model'
+
+STAGES = [
+    {
+        'name': 'filter_growth_matrix',
+        'cwd': C196,
+        'notebook': '06-filter-growth-matrix.ipynb',
+        'inputs': [f'{C196}/results/combined_growth_matrix.csv',
+                   f'{C196}/results/carbon_source_evaluation_gpt5_full_set_analsyis.csv'],
+        'outputs': [f'{C196}/results/combined_growth_matrix_filtered.csv'],
+    },
+    {
+        'name': 'build_media',
+        'cwd': C197,
+        'command': ['build_media.py'],
+        'inputs': [f'{C197}/base_medium.json', f'{C197}/results/carbon_source_mapping.csv',
+                   f'{C197}/Manual_review_media_cpds.csv', f'{REFERENCES}/GramNegModelTemplateV6.json'],
+        'outputs': [f'{C197}/media/*.json', f'{C197}/results/media_diff_report.csv'],
+    },
+    {
+        'name': 'build_models',
+        'cwd': C198,
+        'command': ['build_models.py'],
+        'inputs': [f'{C198}/results/genomes/*', f'{REFERENCES}/Core-V5.2.json',
+                   f'{REFERENCES}/GramNegModelTemplateV6.json',
+                   f'{C196}/results/combined_growth_matrix_filtered.csv', f'{C196}/results/organism_metadata.csv'],
+        'outputs': [f'{C198}/models/*_draft.json', f'{C198}/models/*_gapfilled.json',
+                    f'{C198}/results/model_statistics.csv', f'{C198}/results/gapfill_report.csv'],
+    },
+    {
+        'name': 'blocked_reactions',
+        'cwd': C198,
+        'command': ['precompute_blocked_reactions.py'],
+        'inputs': [f'{C198}/models/*_draft.json', f'{C198}/models/*_gapfilled.json'],
+        'outputs': [f'{C198}/models/*.blocked.json', f'{C198}/results/blocked_reactions_summary.csv'],
+    },
+    {
+        'name': 'locus_index',
+        'cwd': C198,
+        'command': ['build_locus_index.py'],
+        'inputs': ['data/raw/protein_sequences/*_proteins.fasta', f'{C198}/models/*_draft.json',
+                   f'{C198}/models/*_gapfilled.json'],
+        'outputs': [f'{C198}/results/locus_index.csv.gz'],
+    },
+    {
+        'name': 'audit_exchanges',
+        'cwd': C199,
+        'command': ['audit_exchange_reactions.py'],
+        'inputs': [f'{C198}/models/*_gapfilled.json', f'{C197}/media/*.json',
+                   f'{C197}/results/carbon_source_mapping.csv', f'{C199}/results/organism_metadata.csv'],
+        'outputs': [f'{C199}/results/missing_exchanges_details.csv', f'{C199}/results/missing_exchanges_by_medium.csv',
+                    f'{C199}/results/exchange_audit_matrix.csv'],
+    },
+    {
+        'name': 'draft_fba',
+        'cwd': C199,
+        'command': ['run_draft_model_simulations.py'],
+        'inputs': [f'{C198}/models/*_draft.json', f'{C198}/models/*_draft.blocked.json', f'{C197}/media/*.json',
+                   f'{C199}/results/simulatable_carbon_sources.csv', f'{C199}/results/organism_metadata.csv',
+                   f'{C199}/timing.py', f'{C199}/results_store.py', f'{C199}/solver_config.*',
+                   f'{C199}/media_format.py'],
+        'partition': f'{C197}/media/*.json',
+        'outputs': [f'{C199}/results/draft_model_fba_results.csv'],
+    },
+    {
+        'name': 'fba_corrected',
+        'cwd': C199,
+        'command': ['run_incremental_fba.py', '--variant', 'corrected'],
+        'inputs': [f'{C198}/models/*_gapfilled.json', f'{C199}/models_missing_exchanges/*_corrected.json',
+                   f'{C197}/media/*.json', f'{C199}/results/simulatable_carbon_sources.csv',
+                   f'{C199}/results/organism_metadata.csv', f'{C199}/results_store.py', f'{C199}/solver_config.*',
+                   f'{C199}/media_format.py'],
+        'outputs': [f'{C199}/results/fba_simulation_results_corrected.csv'],
+    },
+    {
+        'name': 'evaluate_predictions',
+        'cwd': C199,
+        'command': ['evaluate_predictions.py'],
+        'inputs': [f'{C199}/results/fba_simulation_results.csv',
+                   f'{C196}/results/combined_growth_matrix_filtered.csv'],
+        'outputs': [f'{C199}/results/evaluation_*.csv'],
+    },
+    {
+        'name': 'threshold_sweep',
+        'cwd': C199,
+        'command': ['threshold_sweep.py'],
+        'inputs': [f'{C199}/results/fba_simulation_results.csv',
+                   f'{C196}/results/combined_growth_matrix_filtered.csv', f'{C199}/evaluate_predictions.py'],
+        'outputs': [f'{C199}/results/threshold_sweep_*.csv'],
+    },
+    {
+        'name': 'gene_knockouts',
+        'cwd': C199,
+        'command': ['run_gene_knockouts.py'],
+        'inputs': [f'{C198}/models/*_gapfilled.json', f'{C197}/media/*.json',
+                   f'{C199}/results/simulatable_carbon_sources.csv', f'{C199}/results/organism_metadata.csv',
+                   'data/source/feba.db', f'{C199}/gpr_compiler.py', f'{C199}/solver_config.*',
+                   f'{C199}/media_format.py'],
+        'outputs': [f'{C199}/results/gene_knockouts/*.npz', f'{C199}/results/gene_knockout_vs_fitness.csv'],
+    },
+]
+
+
+def stage_inputs(stage):
+    """Input patterns of a stage, including its own script or notebook"""
+    entry = stage.get('notebook') or stage['command'][0]
+    return [f"{stage['cwd']}/{entry}"] + stage['inputs']
+
+
+def _patterns_overlap(a, b):
+    return a == b or fnmatch.fnmatch(a, b) or fnmatch.fnmatch(b, a)
+
+
+def stage_dependencies(stages):
+    """{stage name: names of the stages producing any of its inputs}"""
+    dependencies = {}
+    for stage in stages:
+        dependencies[stage['name']] = {
+            other['name'] for other in stages if other is not stage
+            and any(_patterns_overlap(i, o) for i in stage_inputs(stage) for o in other['outputs'])
+        }
+    return dependencies
+
+
+class FileHasher:
+    """SHA-256 of files, cached by (size, mtime_ns) across runs"""
+
+    def __init__(self, cache=None):
+        self.cache = cache or {}
+
+    def hash(self, rel_path):
+        stat = (ROOT / rel_path).stat()
+        cached = self.cache.get(rel_path)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        sha256 = file_sha256(ROOT / rel_path)
+        self.cache[rel_path] = [stat.st_size, stat.st_mtime_ns, sha256]
+        return sha256
+
+    def hash_patterns(self, patterns):
+        """{path: sha256} of every file matching the patterns"""
+        paths = sorted({str(p.relative_to(ROOT)) for pattern in patterns for p in ROOT.glob(pattern) if p.is_file()})
+        return {path: self.hash(path) for path in paths}
+
+
+def check_stage(stage, hasher, state, force=False):
+    """(reason to run or None, current input hashes, changed partition paths or None for a full run)"""
+    current = hasher.hash_patterns(stage_inputs(stage))
+    # Glob patterns may match nothing (e.g. optional caches); plain paths must exist
+    missing = [p for p in stage_inputs(stage) if not glob.has_magic(p) and not (ROOT / p).exists()]
+    if missing:
+        return f"missing inputs: {', '.join(missing)}", current, None
+    previous = state.get('stages', {}).get(stage['name'])
+    if force:
+        return 'forced', current, None
+    if previous is None:
+        return 'never run', current, None
+    missing_outputs = [p for p in stage['outputs'] if not any(ROOT.glob(p))]
+    if missing_outputs:
+        return f"missing outputs: {', '.join(missing_outputs)}", current, None
+
+    old = previous['inputs']
+    changed = sorted(p for p in set(current) | set(old) if current.get(p) != old.get(p))
+    if not changed:
+        return None, current, None
+    reason = f"{len(changed)} changed input(s): {', '.join(changed[:3])}{' ...' if len(changed) > 3 else ''}"
+    partition = stage.get('partition')
+    if partition and all(fnmatch.fnmatch(p, partition) for p in changed):
+        cwd = ROOT / stage['cwd']
+        return reason, current, [os.path.relpath(ROOT / p, cwd) for p in changed]
+    return reason, current, None
+
+
+def run_stage(stage, partitions=None, notebooks=False):
+    """Run one stage as a subprocess; returns (exit code, log file)"""
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    log_file = LOG_DIR / f"{stage['name']}.log"
+    if stage.get('notebook'):
+        command = ['jupyter', 'nbconvert', '--to', 'notebook', '--execute', '--inplace', stage['notebook']]
+    else:
+        command = [sys.executable] + stage['command']
+    env = dict(os.environ)
+    env.pop('PIPELINE_PARTITIONS', None)
+    if partitions is not None:
+        env['PIPELINE_PARTITIONS'] = json.dumps(partitions)
+    with open(log_file, 'w') as log:
+        result = subprocess.run(command, cwd=ROOT / stage['cwd'], env=env, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, log_file
+
+
+def load_state():
+    if STATE_FILE.exists():
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {'stages': {}, 'file_hashes': {}}
+
+
+def save_state(state):
+    tmp_file = STATE_FILE.with_suffix('.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def run_pipeline(stages, selected, forced=(), workers=1, dry_run=False, notebooks=False):
+    """Run the selected stages in dependency order; returns {stage: outcome}"""
+    state = load_state()
+    hasher = FileHasher(state.get('file_hashes'))
+    dependencies = stage_dependencies(stages)
+    by_name = {stage['name']: stage for stage in stages}
+    pending = [name for name in by_name if name in selected]
+    outcomes = {}
+
+    def ready(name):
+        return all(dep in outcomes or dep not in selected for dep in dependencies[name])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while pending or running:
+            for name in [n for n in pending if ready(n)]:
+                pending.remove(name)
+                stage = by_name[name]
+                failed = [dep for dep in dependencies[name] if outcomes.get(dep) == 'failed']
+                if failed:
+                    outcomes[name] = 'failed'
+                    print(f"  {name}: not run, upstream failed ({', '.join(failed)})")
+                    continue
+                reason, inputs, partitions = check_stage(stage, hasher, state, force=name in forced)
+                upstream_stale = [dep for dep in dependencies[name] if outcomes.get(dep) == 'stale']
+                if reason is None and upstream_stale:
+                    outcomes[name] = 'stale'
+                    print(f"  {name}: may run after {', '.join(upstream_stale)}")
+                elif reason is None:
+                    outcomes[name] = 'up to date'
+                    print(f"  {name}: up to date")
+                elif reason.startswith('missing inputs'):
+                    outcomes[name] = 'skipped'
+                    print(f"  WARNING: {name}: {reason}")
+                elif dry_run or (stage.get('notebook') and not notebooks):
+                    outcomes[name] = 'stale'
+                    note = '' if dry_run else ' (notebook, run with --notebooks)'
+                    scope = f" [partial: {len(partitions)} file(s)]" if partitions else ''
+                    print(f"  {name}: would run - {reason}{scope}{note}")
+                else:
+                    scope = f" [partial: {len(partitions)} file(s)]" if partitions else ''
+                    print(f"  {name}: running - {reason}{scope}")
+                    future = executor.submit(run_stage, stage, partitions, notebooks)
+                    running[future] = (name, inputs, time.time())
+
+            if not running:
+                if pending and not any(ready(n) for n in pending):
+                    raise RuntimeError(f"Dependency cycle among stages: {', '.join(pending)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, inputs, started = running.pop(future)
+                returncode, log_file = future.result()
+                seconds = time.time() - started
+                if returncode == 0:
+                    outcomes[name] = 'ran'
+                    # Record the inputs the stage actually ran on (hashed before it started)
+                    state['stages'][name] = {'inputs': inputs, 'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                             'seconds': round(seconds, 1)}
+                    print(f"  {name}: done in {seconds:.1f} s")
+                else:
+                    outcomes[name] = 'failed'
+                    print(f"  ERROR: {name} failed (exit {returncode}) after {seconds:.1f} s, see {log_file}")
+                state['file_hashes'] = hasher.cache
+                save_state(state)
+
+    if not dry_run:
+        state['file_hashes'] = hasher.cache
+        save_state(state)
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run stale pipeline stages (CDMSCI-196 to CDMSCI-199)')
+    parser.add_argument('--stages', nargs='+', help='Only these stages (default: all)')
+    parser.add_argument('--force', nargs='+', default=[], metavar='STAGE', help='Run these stages even if up to date')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Stages run in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would run and why')
+    parser.add_argument('--notebooks', action='store_true', help='Also execute stale notebook stages')
+    parser.add_argument('--list', action='store_true', help='List stages and their dependencies')
+    args = parser.parse_args()
+
+    names = [stage['name'] for stage in STAGES]
+    unknown = sorted((set(args.stages or []) | set(args.force)) - set(names))
+    if unknown:
+        print(f"ERROR: Unknown stage(s): {', '.join(unknown)}. Stages: {', '.join(names)}")
+        sys.exit(1)
+
+    if args.list:
+        dependencies = stage_dependencies(STAGES)
+        for stage in STAGES:
+            entry = stage.get('notebook') or ' '.join(stage['command'])
+            after = ', '.join(sorted(dependencies[stage['name']])) or '-'
+            print(f"{stage['name']:22s} {stage['cwd']}/{entry}  (after: {after})")
+        return
+
+    start_time = time.time()
+    selected = set(args.stages or names)
+    print(f"Pipeline: {len(selected)} stages{' (dry run)' if args.dry_run else ''}")
+    outcomes = run_pipeline(STAGES, selected, set(args.force), args.workers, args.dry_run, args.notebooks)
+
+    counts = {}
+    for outcome in outcomes.values():
+        counts[outcome] = counts.get(outcome, 0) + 1
+    print(f"\n{', '.join(f'{n} {outcome}' for outcome, n in sorted(counts.items()))}")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+    if counts.get('failed'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
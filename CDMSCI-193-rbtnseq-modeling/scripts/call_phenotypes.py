@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Call significant gene phenotypes for every organism and experiment in feba.db.
+
+GeneFitness is read in chunks (no full-table load). Each chunk is thresholded
+with array comparisons:
+    important   (-1): fit < -FIT and t < -T   (mutants grow worse)
+    detrimental (+1): fit >  FIT and t >  T   (mutants grow better)
+with FIT = 2 and T = 4 by default (docs/01-understanding-statistical-thresholds.md).
+Rows of carbon-source experiments are also aggregated per
+(orgId, carbon source, locusId) so replicate experiments can be combined.
+
+Output (in ../data/processed/phenotypes/):
+    calls/{orgId}.npz            sparse gene x experiment call matrix (COO):
+                                 locusIds, expNames, row, col, call (int8), fit, t
+    carbon_source_phenotypes.csv one row per (orgId, carbon_source, locusId) with
+                                 at least one call: n_experiments, n_important,
+                                 n_detrimental, mean_fit, call
+    thresholds.json              thresholds and source database
+
+A carbon-source call is 'important' ('detrimental') when at least
+--min-fraction of that carbon source's experiments give the call.
+
+Usage:
+    python call_phenotypes.py --db ../data/source/feba.db
+    python call_phenotypes.py --db ../data/source/feba.db --fit-threshold 1 --t-threshold 5
+    python call_phenotypes.py --carbon-source D-Glucose                # query saved calls
+    python call_phenotypes.py --carbon-source D-Glucose --call detrimental
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DB_PATH = Path('../data/source/feba.db')
+OUTPUT_DIR = Path('../data/processed/phenotypes')
+SUMMARY_FILE = 'carbon_source_phenotypes.csv'
+
+FIT_THRESHOLD = 2.0
+T_THRESHOLD = 4.0
+CHUNK_SIZE = 2_000_000
+
+
+def call_chunk(fit, t, fit_threshold=FIT_THRESHOLD, t_threshold=T_THRESHOLD):
+    """int8 calls for arrays of fit and t: -1 important, +1 detrimental, 0 none"""
+    calls = np.zeros(len(fit), dtype=np.int8)
+    calls[(fit < -fit_threshold) & (t < -t_threshold)] = -1
+    calls[(fit > fit_threshold) & (t > t_threshold)] = 1
+    return calls
+
+
+def load_carbon_experiments(conn):
+    """expName -> carbon source (condition_1) for every carbon-source experiment"""
+    return pd.read_sql_query(
+        "SELECT orgId, expName, condition_1 AS carbon_source FROM Experiment "
+        "WHERE expGroup = 'carbon source' AND condition_1 IS NOT NULL AND TRIM(condition_1) != ''", conn)
+
+
+def stream_calls(db_path, fit_threshold=FIT_THRESHOLD, t_threshold=T_THRESHOLD, chunk_size=CHUNK_SIZE):
+    """
+    One pass over GeneFitness.
+
+    Returns (significant rows DataFrame, per (orgId, carbon_source, locusId)
+    aggregate DataFrame, number of rows read).
+    """
+    conn = sqlite3.connect(str(db_path))
+    carbon_experiments = load_carbon_experiments(conn)
+
+    significant, carbon_parts = [], []
+    n_rows = 0
+    try:
+        chunks = pd.read_sql_query("SELECT orgId, locusId, expName, fit, t FROM GeneFitness", conn,
+                                   chunksize=chunk_size)
+        for chunk in chunks:
+            n_rows += len(chunk)
+            calls = call_chunk(chunk['fit'].to_numpy(), chunk['t'].to_numpy(), fit_threshold, t_threshold)
+            chunk['call'] = calls
+            significant.append(chunk[calls != 0])
+
+            carbon = chunk.merge(carbon_experiments, on=['orgId', 'expName'])
+            carbon_parts.append(carbon.assign(important=carbon['call'] == -1, detrimental=carbon['call'] == 1)
+                                .groupby(['orgId', 'carbon_source', 'locusId'])
+                                .agg(n_experiments=('fit', 'size'), sum_fit=('fit', 'sum'),
+                                     n_important=('important', 'sum'), n_detrimental=('detrimental', 'sum'))
+                                .reset_index())
+            print(f"  {n_rows:,} rows read, {sum(len(s) for s in significant):,} calls")
+    finally:
+        conn.close()
+
+    significant = pd.concat(significant, ignore_index=True)
+    carbon = (pd.concat(carbon_parts, ignore_index=True)
+              .groupby(['orgId', 'carbon_source', 'locusId'], as_index=False).sum())
+    return significant, carbon, n_rows
+
+
+def summarize_carbon_sources(carbon, min_fraction=0.5):
+    """Carbon-source calls for genes with at least one significant experiment"""
+    summary = carbon[(carbon['n_important'] > 0) | (carbon['n_detrimental'] > 0)].copy()
+    summary['mean_fit'] = summary.pop('sum_fit') / summary['n_experiments']
+    needed = np.ceil(min_fraction * summary['n_experiments'] - 1e-9)
+    summary['call'] = np.select([summary['n_important'] >= needed, summary['n_detrimental'] >= needed],
+                                ['important', 'detrimental'], default='inconsistent')
+    return summary.sort_values(['orgId', 'carbon_source', 'locusId'], ignore_index=True)
+
+
+def save_call_matrices(significant, output_dir):
+    """Per organism: sparse (COO) gene x experiment matrix of calls"""
+    calls_dir = Path(output_dir) / 'calls'
+    calls_dir.mkdir(parents=True, exist_ok=True)
+    for org_id, rows in significant.groupby('orgId'):
+        gene_codes, loci = pd.factorize(rows['locusId'], sort=True)
+        exp_codes, exps = pd.factorize(rows['expName'], sort=True)
+        np.savez_compressed(calls_dir / f"{org_id}.npz",
+                            locusIds=np.asarray(loci, dtype=str), expNames=np.asarray(exps, dtype=str),
+                            row=gene_codes.astype(np.int32), col=exp_codes.astype(np.int32),
+                            call=rows['call'].to_numpy(np.int8), fit=rows['fit'].to_numpy(np.float32),
+                            t=rows['t'].to_numpy(np.float32))
+
+
+def load_call_matrix(org_id, output_dir=OUTPUT_DIR):
+    """Calls of one organism as a locusId x expName DataFrame (0 = no call)"""
+    with np.load(Path(output_dir) / 'calls' / f"{org_id}.npz") as data:
+        matrix = np.zeros((len(data['locusIds']), len(data['expNames'])), dtype=np.int8)
+        matrix[data['row'], data['col']] = data['call']
+        return pd.DataFrame(matrix, index=data['locusIds'], columns=data['expNames'])
+
+
+def genes_for_carbon_source(carbon_source, call='important', output_dir=OUTPUT_DIR):
+    """Rows of the carbon-source summary with this call (case-insensitive name match)"""
+    summary = pd.read_csv(Path(output_dir) / SUMMARY_FILE)
+    return summary[(summary['carbon_source'].str.lower() == carbon_source.lower()) & (summary['call'] == call)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Call significant phenotypes from GeneFitness')
+    parser.add_argument('--db', default=str(DB_PATH), help='Fitness Browser database (feba.db)')
+    parser.add_argument('--fit-threshold', type=float, default=FIT_THRESHOLD, help='|fit| cut-off (default: 2)')
+    parser.add_argument('--t-threshold', type=float, default=T_THRESHOLD, help='|t| cut-off (default: 4)')
+    parser.add_argument('--min-fraction', type=float, default=0.5,
+                        help='Fraction of a carbon source\'s experiments needed for a call (default: 0.5)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='GeneFitness rows per chunk')
+    parser.add_argument('--output-dir', default=str(OUTPUT_DIR), help='Output directory')
+    parser.add_argument('--carbon-source', help='Query saved calls: genes with --call on this carbon source')
+    parser.add_argument('--call', choices=['important', 'detrimental', 'inconsistent'], default='important')
+    args = parser.parse_args()
+
+    if args.carbon_source:
+        hits = genes_for_carbon_source(args.carbon_source, args.call, args.output_dir)
+        print(f"{args.carbon_source}: {len(hits)} {args.call} genes in {hits['orgId'].nunique()} organisms")
+        for org_id, genes in hits.groupby('orgId')['locusId']:
+            print(f"  {org_id}: {', '.join(genes)}")
+        return
+
+    start_time = time.time()
+    print(f"Streaming GeneFitness from {args.db}")
+    significant, carbon, n_rows = stream_calls(args.db, args.fit_threshold, args.t_threshold, args.chunk_size)
+    summary = summarize_carbon_sources(carbon, args.min_fraction)
+
+    output_dir = Path(args.output_dir)
+    save_call_matrices(significant, output_dir)
+    summary.to_csv(output_dir / SUMMARY_FILE, index=False)
+    with open(output_dir / 'thresholds.json', 'w') as f:
+        json.dump({'db': str(args.db), 'fit_threshold': args.fit_threshold, 't_threshold': args.t_threshold,
+                   'min_fraction': args.min_fraction, 'rows_read': n_rows}, f, indent=2)
+
+    print(f"\nRows read: {n_rows:,}")
+    print(f"Significant calls: {len(significant):,} "
+          f"({(significant['call'] == -1).sum():,} important, {(significant['call'] == 1).sum():,} detrimental) "
+          f"in {significant['orgId'].nunique()} organisms")
+    print(f"Carbon-source calls: {len(summary):,} "
+          + ", ".join(f"{n:,} {call}" for call, n in summary['call'].value_counts().items()))
+    print(f"Saved: {output_dir}/calls/{{orgId}}.npz, {output_dir / SUMMARY_FILE}")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Compute cofitness for one organism from the GeneFitness table.
+
+feba.db's Cofit table only keeps the top hits over all experiments. This
+script recomputes cofitness for any experiment subset (e.g. carbon-source
+experiments only):
+
+  1. Load the organism's fitness values into a dense genes x experiments
+     float32 matrix (missing values = 0, i.e. neutral fitness).
+  2. Center and scale each gene's row to unit norm, so the Pearson
+     correlation of two genes is the dot product of their rows
+     (--method spearman ranks each row first).
+  3. Multiply blocks of rows against the full matrix (block x genes at a
+     time, never the full genes x genes matrix) and keep the top-k
+     partners of every gene with np.argpartition.
+
+Output (memory-mapped .npy files, read back with np.load(mmap_mode='r')):
+    {output_dir}/{prefix}.partners.npy   int32  genes x k  (row index of partner)
+    {output_dir}/{prefix}.cofit.npy      float32 genes x k  (correlation, descending)
+    {output_dir}/{prefix}.json           locusIds, experiments, method
+
+prefix is {orgId}[_{expGroup}][_exp{hash}][_spearman]: the hash is the first
+8 hex digits of the SHA-256 of the sorted --experiments list, so every subset
+gets its own files. --query takes the same options to find them.
+
+Usage:
+    python compute_cofitness.py --db ../data/source/feba.db --org Keio
+    python compute_cofitness.py --db ../data/source/feba.db --org Keio --exp-group "carbon source" --top-k 50
+    python compute_cofitness.py --org Keio --exp-group "carbon source" --query b0001
+    python compute_cofitness.py --org Keio --experiments set1IT003 set1IT004 set1IT005 --query b0001
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DB_PATH = Path('../data/source/feba.db')
+OUTPUT_DIR = Path('../data/processed/cofitness')
+
+
+def load_fitness_matrix(db_path, org_id, exp_group=None, experiments=None):
+    """(locusIds, expNames, genes x experiments float32 matrix) from GeneFitness"""
+    query = "SELECT gf.locusId, gf.expName, gf.fit FROM GeneFitness gf"
+    params = [org_id]
+    conditions = ["gf.orgId = ?"]
+    if exp_group:
+        query += " JOIN Experiment e ON gf.orgId = e.orgId AND gf.expName = e.expName"
+        conditions.append("e.expGroup = ?")
+        params.append(exp_group)
+    if experiments:
+        conditions.append(f"gf.expName IN ({', '.join('?' * len(experiments))})")
+        params.extend(experiments)
+    query += " WHERE " + " AND ".join(conditions)
+
+    conn = sqlite3.connect(str(db_path))
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+    gene_codes, loci = pd.factorize(df['locusId'], sort=True)
+    exp_codes, exps = pd.factorize(df['expName'], sort=True)
+    matrix = np.zeros((len(loci), len(exps)), dtype=np.float32)
+    matrix[gene_codes, exp_codes] = df['fit'].to_numpy(dtype=np.float32)
+    n_missing = len(loci) * len(exps) - len(df)
+    return np.asarray(loci), np.asarray(exps), matrix, n_missing
+
+
+def normalize_rows(matrix, method='pearson'):
+    """Rows centered and scaled to unit norm (rank-transformed first for Spearman)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if method == 'spearman':
+        matrix = pd.DataFrame(matrix).rank(axis=1).to_numpy(dtype=np.float32)
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    # Constant rows correlate with nothing
+    return np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+
+
+def top_k_cofitness(matrix, k=20, block_size=2048, method='pearson'):
+    """(partners int32, cofit float32), both genes x k, partners sorted by descending cofitness"""
+    z = normalize_rows(matrix, method)
+    n_genes = len(z)
+    k = min(k, n_genes - 1)
+    partners = np.empty((n_genes, k), dtype=np.int32)
+    cofit = np.empty((n_genes, k), dtype=np.float32)
+    for start in range(0, n_genes, block_size):
+        stop = min(start + block_size, n_genes)
+        block = z[start:stop] @ z.T
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # no self-pairs
+        top = np.argpartition(block, -k, axis=1)[:, -k:]
+        scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-scores, axis=1)
+        partners[start:stop] = np.take_along_axis(top, order, axis=1)
+        cofit[start:stop] = np.take_along_axis(scores, order, axis=1)
+    return partners, cofit
+
+
+def experiments_tag(experiments):
+    """Short, order-independent tag of an experiment list"""
+    return hashlib.sha256('\n'.join(sorted(set(experiments))).encode()).hexdigest()[:8]
+
+
+def output_prefix(output_dir, org_id, exp_group=None, experiments=None, method='pearson'):
+    """Output path without extension; differs for every exp group, experiment subset and method"""
+    parts = [org_id]
+    if exp_group:
+        parts.append(re.sub(r'[^A-Za-z0-9]+', '_', exp_group))
+    if experiments:
+        parts.append(f"exp{experiments_tag(experiments)}")
+    if method != 'pearson':
+        parts.append(method)
+    return Path(output_dir) / '_'.join(parts)
+
+
+def save_cofitness(prefix, loci, experiments, partners, cofit, metadata):
+    """Write partners/cofit as .npy (memory-mappable) plus a JSON sidecar"""
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    for name, array in [('partners', partners), ('cofit', cofit)]:
+        out = np.lib.format.open_memmap(f"{prefix}.{name}.npy", mode='w+', dtype=array.dtype, shape=array.shape)
+        out[:] = array
+        out.flush()
+        del out
+    with open(f"{prefix}.json", 'w') as f:
+        json.dump({**metadata, 'locusIds': list(map(str, loci)), 'experiments': list(map(str, experiments))},
+                  f, indent=1)
+
+
+class CofitnessIndex:
+    """Read-only access to saved top-k cofitness (arrays are memory-mapped)"""
+
+    def __init__(self, prefix):
+        with open(f"{prefix}.json") as f:
+            self.metadata = json.load(f)
+        self.loci = self.metadata['locusIds']
+        self.row = {locus: i for i, locus in enumerate(self.loci)}
+        self.partners = np.load(f"{prefix}.partners.npy", mmap_mode='r')
+        self.cofit = np.load(f"{prefix}.cofit.npy", mmap_mode='r')
+
+    def top_partners(self, locus_id, n=None):
+        """Top cofit partners of one gene as a DataFrame (rank, locusId, cofit)"""
+        i = self.row[locus_id]
+        n = n or self.partners.shape[1]
+        return pd.DataFrame({
+            'rank': np.arange(1, n + 1),
+            'locusId': [self.loci[j] for j in self.partners[i, :n]],
+            'cofit': self.cofit[i, :n],
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute top-k cofitness for one organism from GeneFitness')
+    parser.add_argument('--db', default=str(DB_PATH), help='Fitness Browser database (feba.db)')
+    parser.add_argument('--org', required=True, help='orgId, e.g. Keio')
+    parser.add_argument('--exp-group', help='Only experiments of this expGroup, e.g. "carbon source"')
+    parser.add_argument('--experiments', nargs='+', help='Only these expNames')
+    parser.add_argument('--method', choices=['pearson', 'spearman'], default='pearson')
+    parser.add_argument('--top-k', type=int, default=20, help='Partners kept per gene (default: 20)')
+    parser.add_argument('--block-size', type=int, default=2048, help='Genes per matrix block')
+    parser.add_argument('--output-dir', default=str(OUTPUT_DIR), help='Where to write the cofitness files')
+    parser.add_argument('--query', nargs='+', help='Print top partners of these locusIds from saved results')
+    args = parser.parse_args()
+
+    prefix = output_prefix(args.output_dir, args.org, args.exp_group, args.experiments, args.method)
+    if args.query:
+        if not Path(f"{prefix}.json").exists():
+            print(f"ERROR: No saved cofitness at {prefix}.json (run without --query first, with the same "
+                  f"--exp-group / --experiments / --method)")
+            return
+        index = CofitnessIndex(prefix)
+        for locus_id in args.query:
+            print(f"\n{args.org}:{locus_id}")
+            print(index.top_partners(locus_id).to_string(index=False))
+        return
+
+    start_time = time.time()
+    loci, experiments, matrix, n_missing = load_fitness_matrix(args.db, args.org, args.exp_group, args.experiments)
+    load_seconds = time.time() - start_time
+    print(f"{args.org}: {len(loci):,} genes x {len(experiments):,} experiments "
+          f"({n_missing:,} missing values set to 0; loaded in {load_seconds:.1f} s)")
+    if len(experiments) < 3:
+        print("ERROR: Need at least 3 experiments to compute cofitness")
+        return
+
+    compute_start = time.time()
+    partners, cofit = top_k_cofitness(matrix, args.top_k, args.block_size, args.method)
+    compute_seconds = time.time() - compute_start
+
+    save_cofitness(prefix, loci, experiments, partners, cofit, {
+        'orgId': args.org,
+        'exp_group': args.exp_group,
+        'experiments_requested': sorted(set(args.experiments)) if args.experiments else None,
+        'method': args.method,
+        'top_k': int(partners.shape[1]),
+        'missing_values': int(n_missing),
+    })
+    print(f"Cofitness computed in {compute_seconds:.1f} s; "
+          f"{(cofit[:, 0] > 0.75).sum():,} genes with a partner above 0.75")
+    print(f"Saved: {prefix}.partners.npy, {prefix}.cofit.npy, {prefix}.json")
+    print(f"\nCompleted in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()